@@ -1,7 +1,8 @@
 from fastapi import APIRouter, Depends, HTTPException, Query, BackgroundTasks
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from typing import List, Optional, Dict, Any
-from ..core.database import get_db
+from ..core.database import get_db, get_read_db, run_read, run_write, storage_profile
 from ..models.mikrotik import MikrotikDevice, DeviceLog, DeviceInterface, DeviceCommand, Credential, Subnet, Group
 from ..schemas.mikrotik import (
     MikrotikDevice as MikrotikDeviceSchema,
@@ -23,23 +24,41 @@ from ..schemas.mikrotik import (
     SubnetUpdate,
     Group as GroupSchema,
     GroupCreate,
-    GroupUpdate
+    GroupUpdate,
+    MetricSeries
 )
-from ..services.mikrotik_service import MikrotikService
+from ..services.mikrotik_service import MikrotikService, connection_pool
+from ..services.scheduler import poll_scheduler
+from ..services.circuit_breaker import device_breakers
+from ..services.metrics_store import metric_store, AGGREGATES
+from ..services.traffic_rates import traffic_rates
+from ..services.log_writer import log_writer
+from ..services.log_retention import log_retention
+from ..services.log_archive import log_archive
+from ..services.device_state import device_state
+from ..services.state_writer import DeviceTarget, state_writer
+from ..services.fleet_stats import fleet_stats
+from ..services.broadcast import broadcast_hub
+from ..services.device_feed import FEED_FIELDS, device_feed
+from ..services.live_watch import live_watch
+import anyio
 import asyncio
-from datetime import datetime, timedelta
+import functools
+import json
+from datetime import datetime, timedelta, timezone
+from itertools import islice
 
 router = APIRouter(prefix="/mikrotik", tags=["mikrotik"])
 
 # Credential endpoints
 @router.get("/credentials", response_model=List[CredentialSchema])
-async def get_credentials(db: Session = Depends(get_db)):
+def get_credentials(db: Session = Depends(get_read_db)):
     """Get all saved credentials"""
     credentials = db.query(Credential).all()
     return credentials
 
 @router.get("/credentials/{credential_id}", response_model=CredentialSchema)
-async def get_credential(credential_id: int, db: Session = Depends(get_db)):
+def get_credential(credential_id: int, db: Session = Depends(get_read_db)):
     """Get specific credential"""
     credential = db.query(Credential).filter(Credential.id == credential_id).first()
     if not credential:
@@ -47,7 +66,7 @@ async def get_credential(credential_id: int, db: Session = Depends(get_db)):
     return credential
 
 @router.post("/credentials", response_model=CredentialSchema)
-async def create_credential(credential: CredentialCreate, db: Session = Depends(get_db)):
+def create_credential(credential: CredentialCreate, db: Session = Depends(get_db)):
     """Create new credential"""
     # Check if name already exists
     existing = db.query(Credential).filter(Credential.name == credential.name).first()
@@ -66,7 +85,7 @@ async def create_credential(credential: CredentialCreate, db: Session = Depends(
     return db_credential
 
 @router.put("/credentials/{credential_id}", response_model=CredentialSchema)
-async def update_credential(
+def update_credential(
     credential_id: int, 
     credential: CredentialUpdate, 
     db: Session = Depends(get_db)
@@ -96,7 +115,7 @@ async def update_credential(
     return db_credential
 
 @router.delete("/credentials/{credential_id}")
-async def delete_credential(credential_id: int, db: Session = Depends(get_db)):
+def delete_credential(credential_id: int, db: Session = Depends(get_db)):
     """Delete credential"""
     db_credential = db.query(Credential).filter(Credential.id == credential_id).first()
     if not db_credential:
@@ -115,13 +134,13 @@ async def delete_credential(credential_id: int, db: Session = Depends(get_db)):
     return {"detail": "Credential deleted successfully"}
 
 @router.get("/devices", response_model=List[MikrotikDeviceSchema])
-async def get_devices(
+def get_devices(
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
     group_name: Optional[str] = Query(None),
     is_online: Optional[bool] = Query(None),
     search: Optional[str] = Query(None),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Get MikroTik devices with filtering and pagination"""
     query = db.query(MikrotikDevice)
@@ -143,15 +162,21 @@ async def get_devices(
     return devices
 
 @router.get("/devices/{device_id}", response_model=MikrotikDeviceSchema)
-async def get_device(device_id: int, db: Session = Depends(get_db)):
+def get_device(device_id: int, db: Session = Depends(get_read_db)):
     """Get specific MikroTik device"""
     device = db.query(MikrotikDevice).filter(MikrotikDevice.id == device_id).first()
     if not device:
         raise HTTPException(status_code=404, detail="Device not found")
     return device
 
+def _feed_device(device: MikrotikDevice):
+    """Announce an added or edited device to WebSocket clients (from a sync handler's thread)"""
+    values = {field: getattr(device, field) for field in FEED_FIELDS}
+    # Akış durumu event loop'a ait, flush() ile yarışmaması için güncelleme loop'ta yapılır
+    anyio.from_thread.run_sync(functools.partial(device_feed.update, device.id, **values))
+
 @router.post("/devices", response_model=MikrotikDeviceSchema)
-async def create_device(device: MikrotikDeviceCreate, db: Session = Depends(get_db)):
+def create_device(device: MikrotikDeviceCreate, db: Session = Depends(get_db)):
     """Create new MikroTik device"""
     # Check if IP already exists
     existing = db.query(MikrotikDevice).filter(
@@ -164,10 +189,12 @@ async def create_device(device: MikrotikDeviceCreate, db: Session = Depends(get_
     db.add(db_device)
     db.commit()
     db.refresh(db_device)
+    fleet_stats.upsert_device(db_device)
+    _feed_device(db_device)
     return db_device
 
 @router.put("/devices/{device_id}", response_model=MikrotikDeviceSchema)
-async def update_device(
+def update_device(
     device_id: int,
     device_update: MikrotikDeviceUpdate,
     db: Session = Depends(get_db)
@@ -199,27 +226,54 @@ async def update_device(
     device.updated_at = datetime.utcnow()
     db.commit()
     db.refresh(device)
+    fleet_stats.upsert_device(device)
+    _feed_device(device)
+    if update_data.keys() & {"ip_address", "port", "username", "password"}:
+        # Eski adres/kimlik bilgisiyle açılmış oturumlar kapatılır (havuz event loop'ta)
+        anyio.from_thread.run(connection_pool.close_device, device_id)
     return device
 
 @router.delete("/devices/{device_id}")
-async def delete_device(device_id: int, db: Session = Depends(get_db)):
+async def delete_device(device_id: int):
     """Delete MikroTik device"""
-    device = db.query(MikrotikDevice).filter(MikrotikDevice.id == device_id).first()
-    if not device:
+    def delete(db: Session) -> bool:
+        device = db.query(MikrotikDevice).filter(MikrotikDevice.id == device_id).first()
+        if device:
+            db.delete(device)
+        return device is not None
+    
+    # Bellekteki durum event loop'ta temizlenir, DB işi yazıcı thread'inde
+    if not await run_write(delete):
         raise HTTPException(status_code=404, detail="Device not found")
-    
-    db.delete(device)
-    db.commit()
+    await connection_pool.close_device(device_id)
+    await metric_store.remove_device(device_id)
+    traffic_rates.remove_device(device_id)
+    device_state.remove_device(device_id)
+    state_writer.remove_device(device_id)
+    fleet_stats.remove_device(device_id)
+    device_feed.remove(device_id)
     return {"message": "Device deleted successfully"}
 
+async def _get_target(device_id: int) -> DeviceTarget:
+    """Load a device for router calls without querying on the event loop"""
+    target = await run_read(DeviceTarget.load, device_id)
+    if target is None:
+        raise HTTPException(status_code=404, detail="Device not found")
+    return target
+
+async def _ensure_device(device_id: int):
+    exists = await run_read(
+        lambda db: db.query(MikrotikDevice.id).filter(MikrotikDevice.id == device_id).first() is not None
+    )
+    if not exists:
+        raise HTTPException(status_code=404, detail="Device not found")
+
 @router.post("/devices/{device_id}/test-connection", response_model=ConnectionTestResult)
-async def test_connection(device_id: int, db: Session = Depends(get_db)):
+async def test_connection(device_id: int):
     """Test connection to MikroTik device"""
-    device = db.query(MikrotikDevice).filter(MikrotikDevice.id == device_id).first()
-    if not device:
-        raise HTTPException(status_code=404, detail="Device not found")
+    device = await _get_target(device_id)
     
-    service = MikrotikService(db)
+    service = MikrotikService()
     success = await service.test_connection(device)
     
     if success:
@@ -235,17 +289,17 @@ async def test_connection(device_id: int, db: Session = Depends(get_db)):
         )
 
 @router.post("/devices/bulk-test", response_model=BulkOperationResult)
-async def bulk_test_connections(
-    device_ids: List[int],
-    db: Session = Depends(get_db)
-):
+async def bulk_test_connections(device_ids: List[int]):
     """Test connections to multiple devices"""
-    devices = db.query(MikrotikDevice).filter(MikrotikDevice.id.in_(device_ids)).all()
+    devices = await run_read(lambda db: [
+        DeviceTarget.from_device(device)
+        for device in db.query(MikrotikDevice).filter(MikrotikDevice.id.in_(device_ids)).all()
+    ])
     
     if len(devices) != len(device_ids):
         raise HTTPException(status_code=400, detail="Some devices not found")
     
-    service = MikrotikService(db)
+    service = MikrotikService()
     results = []
     success_count = 0
     
@@ -281,46 +335,93 @@ async def bulk_test_connections(
     )
 
 @router.get("/devices/{device_id}/interfaces", response_model=List[DeviceInterfaceSchema])
-async def get_device_interfaces(device_id: int, db: Session = Depends(get_db)):
+async def get_device_interfaces(device_id: int):
     """Get device interfaces"""
-    device = db.query(MikrotikDevice).filter(MikrotikDevice.id == device_id).first()
-    if not device:
-        raise HTTPException(status_code=404, detail="Device not found")
+    device = await _get_target(device_id)
     
-    service = MikrotikService(db)
+    service = MikrotikService()
     try:
         interfaces = await service.get_interfaces(device)
         # Return from database
-        db_interfaces = db.query(DeviceInterface).filter(
+        db_interfaces = await run_read(lambda db: db.query(DeviceInterface).filter(
             DeviceInterface.device_id == device_id
-        ).all()
+        ).all())
         return db_interfaces
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get interfaces: {str(e)}")
 
 @router.get("/devices/{device_id}/logs", response_model=List[DeviceLogSchema])
-async def get_device_logs(
+def get_device_logs(
     device_id: int,
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
     level: Optional[str] = Query(None),
-    db: Session = Depends(get_db)
+    from_: Optional[datetime] = Query(None, alias="from"),
+    to: Optional[datetime] = Query(None),
+    db: Session = Depends(get_read_db)
 ):
-    """Get device logs"""
+    """Get device logs; pages past the live table continue from the log archive"""
     device = db.query(MikrotikDevice).filter(MikrotikDevice.id == device_id).first()
     if not device:
         raise HTTPException(status_code=404, detail="Device not found")
     
-    query = db.query(DeviceLog).filter(DeviceLog.device_id == device_id)
+    start, end = _naive_utc(from_), _naive_utc(to)
+    query = _device_log_query(db, device_id, level, start, end)
+    logs = query.order_by(DeviceLog.timestamp.desc()).offset(skip).limit(limit).all()
+    
+    if len(logs) < limit and log_archive.segments:
+        # Canlı tablo bitti, arşivdeki daha eski kayıtlarla devam et
+        archive_skip = 0 if logs else max(0, skip - query.count())
+        archived = list(islice(
+            log_archive.iter_logs(device_id, start, end, level),
+            archive_skip, archive_skip + limit - len(logs)
+        ))
+        logs = logs + archived
+    return logs
+
+@router.get("/devices/{device_id}/logs/export")
+def export_device_logs(
+    device_id: int,
+    level: Optional[str] = Query(None),
+    from_: Optional[datetime] = Query(None, alias="from"),
+    to: Optional[datetime] = Query(None),
+    db: Session = Depends(get_read_db)
+):
+    """Stream all device logs in a time range (live and archived) as NDJSON, newest first"""
+    device = db.query(MikrotikDevice).filter(MikrotikDevice.id == device_id).first()
+    if not device:
+        raise HTTPException(status_code=404, detail="Device not found")
+    
+    start, end = _naive_utc(from_), _naive_utc(to)
     
+    def generate():
+        # Yanıt akarken istek session'ı kapanmış olabilir, kendi session'ımızı kullanırız
+        from ..core.database import ReadSessionLocal
+        export_db = ReadSessionLocal()
+        try:
+            live = _device_log_query(export_db, device_id, level, start, end)
+            for log in live.order_by(DeviceLog.timestamp.desc()).yield_per(1000):
+                yield DeviceLogSchema.model_validate(log).model_dump_json() + "\n"
+        finally:
+            export_db.close()
+        for record in log_archive.iter_logs(device_id, start, end, level):
+            yield DeviceLogSchema.model_validate(record).model_dump_json() + "\n"
+    
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
+
+def _device_log_query(db: Session, device_id: int, level: Optional[str],
+                      start: Optional[datetime], end: Optional[datetime]):
+    query = db.query(DeviceLog).filter(DeviceLog.device_id == device_id)
     if level:
         query = query.filter(DeviceLog.log_level == level)
-    
-    logs = query.order_by(DeviceLog.timestamp.desc()).offset(skip).limit(limit).all()
-    return logs
+    if start:
+        query = query.filter(DeviceLog.timestamp >= start)
+    if end:
+        query = query.filter(DeviceLog.timestamp < end)
+    return query
 
 @router.post("/devices/{device_id}/execute", response_model=DeviceCommandSchema)
-async def execute_command(
+def execute_command(
     device_id: int,
     command: DeviceCommandCreate,
     background_tasks: BackgroundTasks,
@@ -348,48 +449,43 @@ async def execute_command(
     
     return db_command
 
+def _update_command(db: Session, command_id: int, values: Dict[str, Any]):
+    db.query(DeviceCommand).filter(DeviceCommand.id == command_id).update(values)
+
 async def execute_command_task(command_id: int):
     """Background task to execute command"""
-    from ..core.database import SessionLocal
-    db = SessionLocal()
-    
-    try:
+    def load(db: Session):
         command = db.query(DeviceCommand).filter(DeviceCommand.id == command_id).first()
         if not command:
-            return
-        
-        device = db.query(MikrotikDevice).filter(MikrotikDevice.id == command.device_id).first()
-        if not device:
-            return
-        
-        service = MikrotikService(db)
-        
-        command.status = "running"
-        command.started_at = datetime.utcnow()
-        db.commit()
-        
-        try:
-            result = await service.execute_command(device, command.command)
-            command.result = result
-            command.status = "completed"
-        except Exception as e:
-            command.error_message = str(e)
-            command.status = "failed"
-        
-        command.completed_at = datetime.utcnow()
-        db.commit()
-        
-    finally:
-        db.close()
+            return None
+        return command.command, DeviceTarget.load(db, command.device_id)
+    
+    loaded = await run_read(load)
+    if not loaded or loaded[1] is None:
+        return
+    command_path, device = loaded
+    
+    service = MikrotikService()
+    
+    await run_write(_update_command, command_id, {"status": "running", "started_at": datetime.utcnow()})
+    
+    values = {}
+    try:
+        values["result"] = await service.execute_command(device, command_path)
+        values["status"] = "completed"
+    except Exception as e:
+        values["error_message"] = str(e)
+        values["status"] = "failed"
+    
+    values["completed_at"] = datetime.utcnow()
+    await run_write(_update_command, command_id, values)
 
 @router.get("/devices/{device_id}/reboot")
-async def reboot_device(device_id: int, db: Session = Depends(get_db)):
+async def reboot_device(device_id: int):
     """Reboot MikroTik device"""
-    device = db.query(MikrotikDevice).filter(MikrotikDevice.id == device_id).first()
-    if not device:
-        raise HTTPException(status_code=404, detail="Device not found")
+    device = await _get_target(device_id)
     
-    service = MikrotikService(db)
+    service = MikrotikService()
     result = await service.reboot_device(device)
     
     if result["success"]:
@@ -398,13 +494,11 @@ async def reboot_device(device_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail=result["error"])
 
 @router.get("/devices/{device_id}/system-info")
-async def get_device_system_info(device_id: int, db: Session = Depends(get_db)):
+async def get_device_system_info(device_id: int):
     """Get device system information including CPU, RAM, and identity"""
-    device = db.query(MikrotikDevice).filter(MikrotikDevice.id == device_id).first()
-    if not device:
-        raise HTTPException(status_code=404, detail="Device not found")
+    device = await _get_target(device_id)
     
-    service = MikrotikService(db)
+    service = MikrotikService()
     try:
         system_info = await service.get_device_info(device)
         return {
@@ -416,62 +510,197 @@ async def get_device_system_info(device_id: int, db: Session = Depends(get_db)):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get system info: {str(e)}")
 
-@router.get("/stats", response_model=DeviceStats)
-async def get_device_stats(db: Session = Depends(get_db)):
-    """Get device statistics"""
-    total_devices = db.query(MikrotikDevice).count()
-    online_devices = db.query(MikrotikDevice).filter(MikrotikDevice.is_online == True).count()
-    offline_devices = total_devices - online_devices
-    
-    # Group statistics
-    groups = {}
-    group_data = db.query(MikrotikDevice.group_name).all()
-    for group in group_data:
-        groups[group[0]] = groups.get(group[0], 0) + 1
-    
-    # Recent logs
-    recent_logs = db.query(DeviceLog).order_by(
-        DeviceLog.timestamp.desc()
-    ).limit(10).all()
-    
-    # High CPU devices - CPU load'u sayısal olarak sıralayabilmek için çevirip sıralama
-    def parse_cpu_load(cpu_str):
-        """CPU load string'ini sayısal değere çevirir"""
-        if not cpu_str or cpu_str == 'N/A':
-            return 0
-        try:
-            # '%' karakterini kaldır ve sayıya çevir
-            return float(cpu_str.replace('%', ''))
-        except:
-            return 0
-    
-    # Online olan ve CPU load'u olan cihazları al
-    high_cpu_candidates = db.query(MikrotikDevice).filter(
-        MikrotikDevice.is_online == True,
-        MikrotikDevice.cpu_load.isnot(None),
-        MikrotikDevice.cpu_load != 'N/A',
-        MikrotikDevice.cpu_load != ''
-    ).all()
-    
-    # CPU load'a göre sırala ve top 10'u al
-    high_cpu_devices = sorted(
-        high_cpu_candidates,
-        key=lambda device: parse_cpu_load(device.cpu_load),
-        reverse=True
-    )[:10]
-    
-    return DeviceStats(
-        total_devices=total_devices,
-        online_devices=online_devices,
-        offline_devices=offline_devices,
-        groups=groups,
-        recent_logs=recent_logs,
-        high_cpu_devices=high_cpu_devices
+def _naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """Timezone'lu datetime'ı DB'deki naive UTC biçimine çevirir"""
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+def _epoch(value: Optional[datetime]) -> Optional[float]:
+    """Naive datetime'lar UTC kabul edilir (DB'deki utcnow ile uyumlu)"""
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+@router.get("/devices/{device_id}/metrics", response_model=MetricSeries)
+async def get_device_metrics(
+    device_id: int,
+    metric: str = Query(..., description="cpu_load, memory_used_pct, uptime, if:<name>:rx_bytes, ..."),
+    from_: Optional[datetime] = Query(None, alias="from"),
+    to: Optional[datetime] = Query(None),
+    step: Optional[float] = Query(None, gt=0, description="Bucket size in seconds"),
+    agg: str = Query("avg", description="avg, min, max, last or count")
+):
+    """Get time series of a device metric; the rollup tier is chosen from step"""
+    await _ensure_device(device_id)
+    if agg not in AGGREGATES:
+        raise HTTPException(status_code=400, detail=f"agg must be one of {', '.join(AGGREGATES)}")
+    
+    start, end = _epoch(from_), _epoch(to)
+    # Bellekteki veri loop'ta kopyalanır, dosya okumaları thread'de
+    tier, ts, values = await metric_store.query_range(device_id, metric, start, end, step, agg)
+    
+    return MetricSeries(
+        device_id=device_id,
+        metric=metric,
+        start=start,
+        end=end,
+        step=step,
+        tier=tier,
+        agg=agg,
+        timestamps=ts.tolist(),
+        values=values.tolist()
     )
 
+@router.get("/groups/{group_id}/metrics", response_model=List[MetricSeries])
+async def get_group_metrics(
+    group_id: int,
+    metric: str = Query(...),
+    from_: Optional[datetime] = Query(None, alias="from"),
+    to: Optional[datetime] = Query(None),
+    step: Optional[float] = Query(None, gt=0, description="Bucket size in seconds"),
+    agg: str = Query("avg", description="avg, min, max, last or count")
+):
+    """Get one metric for every device of a group (e.g. 30-day CPU chart)"""
+    def load_device_ids(db: Session) -> Optional[List[int]]:
+        if not db.query(Group.id).filter(Group.id == group_id).first():
+            return None
+        return [row[0] for row in db.query(MikrotikDevice.id).filter(MikrotikDevice.group_id == group_id).all()]
+    
+    device_ids = await run_read(load_device_ids)
+    if device_ids is None:
+        raise HTTPException(status_code=404, detail="Group not found")
+    if agg not in AGGREGATES:
+        raise HTTPException(status_code=400, detail=f"agg must be one of {', '.join(AGGREGATES)}")
+    
+    start, end = _epoch(from_), _epoch(to)
+    
+    # Grup başına cihaz sayısı kadar dosya okunur, hepsi tek bir thread çağrısında
+    series = await metric_store.query_many(device_ids, metric, start, end, step, agg)
+    return [
+        MetricSeries(
+            device_id=device_id,
+            metric=metric,
+            start=start,
+            end=end,
+            step=step,
+            tier=tier,
+            agg=agg,
+            timestamps=ts.tolist(),
+            values=values.tolist()
+        )
+        for device_id, (tier, ts, values) in zip(device_ids, series)
+    ]
+
+@router.get("/devices/{device_id}/metrics/series")
+async def get_device_metric_names(device_id: int):
+    """List recorded metric names of a device"""
+    await _ensure_device(device_id)
+    
+    return {"device_id": device_id, "metrics": await metric_store.list_metrics(device_id)}
+
+@router.get("/stats", response_model=DeviceStats)
+async def get_device_stats():
+    """Get device statistics (in-memory fleet snapshot, see FleetStats)"""
+    return fleet_stats.snapshot()
+
+@router.get("/monitor/websocket")
+async def get_websocket_stats():
+    """Get WebSocket fan-out metrics (per-client queue depth, dropped messages)"""
+    return broadcast_hub.stats()
+
+@router.get("/monitor/device-feed")
+async def get_device_feed_stats():
+    """Get delta feed metrics (sequence, frames, updates without changes)"""
+    return device_feed.stats()
+
+@router.get("/monitor/live-watch")
+async def get_live_watch_stats():
+    """Get live collectors of watched devices (watchers per device, collections)"""
+    return live_watch.stats()
+
+@router.get("/monitor/fleet-stats")
+async def get_fleet_stats_info():
+    """Get fleet statistics bookkeeping (version, heap size, rebuilds)"""
+    return fleet_stats.stats()
+
+@router.get("/monitor/scheduler")
+async def get_scheduler_stats():
+    """Get poll scheduler metrics (lag, in-flight polls, throughput)"""
+    return poll_scheduler.stats()
+
+@router.get("/monitor/pool")
+async def get_pool_stats():
+    """Get connection pool metrics (open/idle/in-use connections, reconnects)"""
+    return connection_pool.stats()
+
+@router.get("/monitor/breakers")
+async def get_breaker_stats():
+    """Get circuit breaker states (devices in backoff)"""
+    return device_breakers.stats()
+
+@router.get("/monitor/metrics-store")
+async def get_metric_store_stats():
+    """Get time series store metrics (series, pending and flushed samples)"""
+    return metric_store.stats()
+
+@router.get("/monitor/log-writer")
+async def get_log_writer_stats():
+    """Get device log writer metrics (buffered, written and dropped records)"""
+    return log_writer.stats()
+
+@router.get("/monitor/log-retention")
+async def get_log_retention_stats():
+    """Get device log retention settings and the last pruning report"""
+    return log_retention.stats()
+
+@router.post("/monitor/log-retention/run")
+async def run_log_retention():
+    """Run a retention pass now and return its report"""
+    return await log_retention.run()
+
+@router.get("/monitor/log-archive")
+async def get_log_archive_stats():
+    """Get log archive metrics (segments, archived rows, compressed size)"""
+    return log_archive.stats()
+
+@router.post("/monitor/log-archive/run")
+async def run_log_archive():
+    """Drop archive segments past their level's retention now and return the run summary"""
+    return await log_archive.run()
+
+@router.get("/monitor/device-state")
+async def get_device_state_stats():
+    """Get change-detection metrics (info diffs, batched heartbeats)"""
+    return device_state.stats()
+
+@router.get("/monitor/state-writer")
+async def get_state_writer_stats():
+    """Get poll result writer metrics (pending devices, commits, batch size)"""
+    return state_writer.stats()
+
+@router.get("/monitor/rates")
+async def get_rate_engine_stats():
+    """Get interface rate engine metrics (batch size and duration, wraps, resets)"""
+    return traffic_rates.stats()
+
+@router.get("/monitor/db")
+async def get_storage_stats():
+    """Get SQLite profile in effect, pool status and write queue metrics"""
+    return await asyncio.to_thread(storage_profile)
+
+@router.get("/devices/{device_id}/breaker")
+async def get_device_breaker(device_id: int):
+    """Get circuit breaker state of a device"""
+    await _ensure_device(device_id)
+    
+    return {"device_id": device_id, **device_breakers.state_of(device_id)}
+
 # Subnet endpoints
 @router.get("/subnets")
-async def get_subnets(db: Session = Depends(get_db)):
+def get_subnets(db: Session = Depends(get_read_db)):
     """Get all saved subnets with their group information"""
     subnets = db.query(Subnet).filter(Subnet.is_active == True).all()
     
@@ -501,7 +730,7 @@ async def get_subnets(db: Session = Depends(get_db)):
     return result
 
 @router.get("/subnets/{subnet_id}", response_model=SubnetSchema)
-async def get_subnet(subnet_id: int, db: Session = Depends(get_db)):
+def get_subnet(subnet_id: int, db: Session = Depends(get_read_db)):
     """Get specific subnet"""
     subnet = db.query(Subnet).filter(Subnet.id == subnet_id).first()
     if not subnet:
@@ -509,7 +738,7 @@ async def get_subnet(subnet_id: int, db: Session = Depends(get_db)):
     return subnet
 
 @router.post("/subnets", response_model=SubnetSchema)
-async def create_subnet(subnet: SubnetCreate, db: Session = Depends(get_db)):
+def create_subnet(subnet: SubnetCreate, db: Session = Depends(get_db)):
     """Create new subnet"""
     # Check if name already exists
     existing = db.query(Subnet).filter(Subnet.name == subnet.name).first()
@@ -531,7 +760,7 @@ async def create_subnet(subnet: SubnetCreate, db: Session = Depends(get_db)):
     return db_subnet
 
 @router.put("/subnets/{subnet_id}", response_model=SubnetSchema)
-async def update_subnet(
+def update_subnet(
     subnet_id: int, 
     subnet: SubnetUpdate, 
     db: Session = Depends(get_db)
@@ -568,7 +797,7 @@ async def update_subnet(
     return db_subnet
 
 @router.delete("/subnets/{subnet_id}")
-async def delete_subnet(subnet_id: int, db: Session = Depends(get_db)):
+def delete_subnet(subnet_id: int, db: Session = Depends(get_db)):
     """Delete subnet"""
     db_subnet = db.query(Subnet).filter(Subnet.id == subnet_id).first()
     if not db_subnet:
@@ -579,7 +808,7 @@ async def delete_subnet(subnet_id: int, db: Session = Depends(get_db)):
     return {"detail": "Subnet deleted successfully"}
 
 @router.get("/subnets/{subnet_id}/available-ips")
-async def get_available_ips(subnet_id: int, db: Session = Depends(get_db)):
+def get_available_ips(subnet_id: int, db: Session = Depends(get_read_db)):
     """Get available IP addresses in subnet"""
     subnet = db.query(Subnet).filter(Subnet.id == subnet_id).first()
     if not subnet:
@@ -622,13 +851,13 @@ async def get_available_ips(subnet_id: int, db: Session = Depends(get_db)):
 
 # Group endpoints
 @router.get("/groups", response_model=List[GroupSchema])
-async def get_groups(db: Session = Depends(get_db)):
+def get_groups(db: Session = Depends(get_read_db)):
     """Get all groups"""
     groups = db.query(Group).all()
     return groups
 
 @router.get("/groups/{group_id}", response_model=GroupSchema)
-async def get_group(group_id: int, db: Session = Depends(get_db)):
+def get_group(group_id: int, db: Session = Depends(get_read_db)):
     """Get specific group"""
     group = db.query(Group).filter(Group.id == group_id).first()
     if not group:
@@ -636,7 +865,7 @@ async def get_group(group_id: int, db: Session = Depends(get_db)):
     return group
 
 @router.post("/groups", response_model=GroupSchema)
-async def create_group(group: GroupCreate, db: Session = Depends(get_db)):
+def create_group(group: GroupCreate, db: Session = Depends(get_db)):
     """Create new group"""
     # Check if name already exists
     existing = db.query(Group).filter(Group.name == group.name).first()
@@ -656,7 +885,7 @@ async def create_group(group: GroupCreate, db: Session = Depends(get_db)):
     return db_group
 
 @router.put("/groups/{group_id}", response_model=GroupSchema)
-async def update_group(
+def update_group(
     group_id: int, 
     group: GroupUpdate, 
     db: Session = Depends(get_db)
@@ -684,7 +913,7 @@ async def update_group(
     return db_group
 
 @router.delete("/groups/{group_id}")
-async def delete_group(group_id: int, db: Session = Depends(get_db)):
+def delete_group(group_id: int, db: Session = Depends(get_db)):
     """Delete group"""
     db_group = db.query(Group).filter(Group.id == group_id).first()
     if not db_group:
@@ -704,7 +933,7 @@ async def delete_group(group_id: int, db: Session = Depends(get_db)):
 
 # Group-Subnet management endpoints
 @router.get("/groups/{group_id}/subnets")
-async def get_group_subnets(group_id: int, db: Session = Depends(get_db)):
+def get_group_subnets(group_id: int, db: Session = Depends(get_read_db)):
     """Get all subnets assigned to a group"""
     group = db.query(Group).filter(Group.id == group_id).first()
     if not group:
@@ -726,7 +955,7 @@ async def get_group_subnets(group_id: int, db: Session = Depends(get_db)):
     return result
 
 @router.post("/groups/{group_id}/subnets/{subnet_id}")
-async def add_subnet_to_group(group_id: int, subnet_id: int, db: Session = Depends(get_db)):
+def add_subnet_to_group(group_id: int, subnet_id: int, db: Session = Depends(get_db)):
     """Add a subnet to a group"""
     group = db.query(Group).filter(Group.id == group_id).first()
     if not group:
@@ -745,7 +974,7 @@ async def add_subnet_to_group(group_id: int, subnet_id: int, db: Session = Depen
     return {"message": "Subnet added to group successfully"}
 
 @router.delete("/groups/{group_id}/subnets/{subnet_id}")
-async def remove_subnet_from_group(group_id: int, subnet_id: int, db: Session = Depends(get_db)):
+def remove_subnet_from_group(group_id: int, subnet_id: int, db: Session = Depends(get_db)):
     """Remove a subnet from a group"""
     group = db.query(Group).filter(Group.id == group_id).first()
     if not group:
@@ -764,7 +993,7 @@ async def remove_subnet_from_group(group_id: int, subnet_id: int, db: Session =
     return {"message": "Subnet removed from group successfully"}
 
 @router.get("/subnets/{subnet_id}/groups", response_model=List[GroupSchema])
-async def get_subnet_groups(subnet_id: int, db: Session = Depends(get_db)):
+def get_subnet_groups(subnet_id: int, db: Session = Depends(get_read_db)):
     """Get all groups that a subnet is assigned to"""
     subnet = db.query(Subnet).filter(Subnet.id == subnet_id).first()
     if not subnet:
@@ -773,7 +1002,7 @@ async def get_subnet_groups(subnet_id: int, db: Session = Depends(get_db)):
     return subnet.groups
 
 @router.post("/groups/{group_id}/scan")
-async def scan_group_subnets(group_id: int, db: Session = Depends(get_db)):
+def scan_group_subnets(group_id: int, db: Session = Depends(get_db)):
     """Scan all subnets in a group for devices"""
     import ipaddress
     import asyncio
@@ -869,7 +1098,7 @@ async def scan_group_subnets(group_id: int, db: Session = Depends(get_db)):
     }
 
 @router.post("/groups/{group_id}/register-devices")
-async def register_discovered_devices(
+def register_discovered_devices(
     group_id: int, 
     devices: List[dict],
     db: Session = Depends(get_db)
@@ -914,6 +1143,8 @@ async def register_discovered_devices(
             db.add(new_device)
             db.commit()
             db.refresh(new_device)
+            fleet_stats.upsert_device(new_device)
+            _feed_device(new_device)
             
             registered_devices.append({
                 "id": new_device.id,
@@ -9,6 +9,17 @@ class Settings(BaseSettings):
     # Database - SQLite kullanıyoruz
     DATABASE_URL: str = os.getenv("DATABASE_URL", "sqlite:///./mikrotik_devices.db")
     
+    # SQLite profili - her bağlantıda uygulanan PRAGMA'lar
+    SQLITE_PRAGMAS: dict = {
+        "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),  # okuyucular yazıcıyı beklemez
+        "synchronous": "NORMAL",  # WAL ile güvenli, her commit'te fsync yok
+        "mmap_size": 256 * 1024 * 1024,  # byte
+        "cache_size": -64000,  # negatif = KiB (~64 MB, bağlantı başına)
+        "busy_timeout": 10000,  # kilitliyse hata yerine bu kadar bekle (ms)
+        "temp_store": "MEMORY",
+    }
+    SQLITE_READ_POOL_SIZE: int = int(os.getenv("SQLITE_READ_POOL_SIZE", "8"))  # API okumaları için bağlantı sayısı
+    
     # Security
     SECRET_KEY: str = os.getenv("SECRET_KEY", "your-secret-key-here-change-in-production")
     ALGORITHM: str = os.getenv("ALGORITHM", "HS256")
@@ -41,6 +52,91 @@ class Settings(BaseSettings):
     CONNECTION_TIMEOUT: int = 10
     MAX_CONCURRENT_CONNECTIONS: int = 50
     
+    # Connection pool
+    POOL_MAX_CONNECTIONS: int = int(os.getenv("POOL_MAX_CONNECTIONS", "500"))  # aynı anda açık soket limiti
+    POOL_IDLE_TTL: int = 300  # bu süreden uzun boşta kalan bağlantı kapatılır (saniye)
+    POOL_PROBE_AFTER: int = 60  # bu süreden uzun boşta kalan bağlantı kullanılmadan önce test edilir
+    TCP_PROBE_TIMEOUT: float = float(os.getenv("TCP_PROBE_TIMEOUT", "2"))  # login öncesi TCP kontrolü, 0 = kapalı
+    
+    # Monitoring - poll zamanlayıcısı
+    POLL_INTERVAL: int = int(os.getenv("POLL_INTERVAL", "30"))  # saniye
+    POLL_JITTER: float = 0.1  # interval'in ±%10'u kadar rastgele kaydırma
+    POLL_GROUP_INTERVALS: dict = {}  # grup adına göre interval, örn. {"Router'lar": 15}
+    DEVICE_SYNC_INTERVAL: int = 30  # cihaz listesinin DB'den yenilenme sıklığı
+    DEVICE_HEARTBEAT_INTERVAL: int = 30  # last_seen/uptime/cpu_load toplu yazılma aralığı
+    STATE_WRITER_BATCH_SIZE: int = 200  # bu kadar cihazın sonucu birikince hemen yazılır
+    STATE_WRITER_FLUSH_INTERVAL: float = 1  # poll sonuçları en geç bu aralıkla tek transaction'da yazılır
+    
+    # /stats filo özeti - bellekte artımlı tutulur, her istekte sorgu çalışmaz
+    FLEET_STATS_TOP_K: int = 10  # yüksek CPU listesindeki cihaz sayısı
+    FLEET_STATS_RECENT_LOGS: int = 10  # son loglar halkasının boyu
+    
+    # WebSocket yayını - her istemcinin kendi kuyruğu ve gönderici task'ı var
+    WS_CLIENT_QUEUE_SIZE: int = 256  # istemci başına bekleyen en fazla mesaj, dolunca en eskisi atılır
+    WS_SEND_TIMEOUT: float = 10  # tek gönderim bundan uzun sürerse istemci kapatılır (saniye)
+    WS_STALL_TIMEOUT: float = 30  # kuyruk bu kadar süre taşmaya devam ederse istemci kapatılır (saniye)
+    WS_TICK_INTERVAL: float = 1  # cihaz değişiklikleri bu aralıkta tek delta frame'de gönderilir (saniye)
+    WS_LAST_SEEN_RESOLUTION: int = 300  # last_seen bundan az ilerlediyse delta'ya girmez (saniye)
+    WS_CPU_RESOLUTION: float = 5  # cpu_load bu kadar puan değişmediyse delta'ya girmez
+    WS_REPLAY_FRAMES: int = 300  # yeniden bağlanan istemciler için saklanan son delta frame sayısı
+    LIVE_WATCH_INTERVAL: float = 2  # detay sayfasında izlenen cihazın toplanma aralığı (saniye)
+    LIVE_WATCH_MAX_DEVICES: int = 50  # aynı anda canlı toplanan en fazla cihaz
+    
+    # Zaman serisi metrikleri (CPU, bellek, uptime, interface sayaçları)
+    METRICS_DIR: str = os.getenv("METRICS_DIR", "./metrics_data")
+    METRICS_RING_SIZE: int = 120  # seri başına bellekte tutulan son örnek sayısı
+    METRICS_FLUSH_INTERVAL: int = 60  # bekleyen örneklerin diske yazılma aralığı (saniye)
+    METRICS_RETENTION: dict = {  # tier başına saklama süresi (saniye)
+        "raw": 2 * 86400,
+        "1m": 7 * 86400,
+        "5m": 30 * 86400,
+        "1h": 365 * 86400,
+        "1d": 5 * 365 * 86400,
+    }
+    
+    # DeviceLog yazıcısı - loglar toplu INSERT ile yazılır
+    LOG_BATCH_SIZE: int = 500  # bu kadar kayıt birikince hemen yazılır
+    LOG_FLUSH_INTERVAL: float = 2  # en geç bu kadar saniyede bir yazılır
+    LOG_MAX_BUFFER: int = 20000  # bellekte bekleyebilecek en fazla kayıt
+    LOG_OVERFLOW_POLICY: str = "drop_info"  # drop_oldest, drop_newest veya drop_info
+    
+    # DeviceLog retention - seviye başına saklama süresi (saniye)
+    LOG_RETENTION: dict = {
+        "debug": 1 * 86400,
+        "info": 7 * 86400,
+        "warning": 30 * 86400,
+        "error": 90 * 86400,
+        "default": 30 * 86400,  # yukarıda olmayan seviyeler
+    }
+    LOG_COLLAPSE_AFTER: int = 3600  # bundan eski tekrarlanan info mesajları birleştirilir, 0 = kapalı
+    LOG_COLLAPSE_BUCKET: int = 3600  # birleştirme penceresi (saniye)
+    LOG_PRUNE_INTERVAL: int = 600  # retention çalışma aralığı (saniye)
+    LOG_PRUNE_CHUNK: int = 2000  # tek transaction'da silinen en fazla satır
+    LOG_PRUNE_PAUSE: float = 0.05  # parçalar arası bekleme, yazıcılara sıra verir
+    
+    # DeviceLog soğuk arşivi - LOG_RETENTION süresi dolan loglar silinmek yerine
+    # günlük sıkıştırılmış segmentlere taşınır
+    LOG_ARCHIVE_DIR: str = os.getenv("LOG_ARCHIVE_DIR", "./log_archive")
+    LOG_ARCHIVE_ENABLED: bool = True  # False = süresi dolan loglar doğrudan silinir
+    LOG_ARCHIVE_INTERVAL: int = 3600  # süresi dolan segmentlerin temizlenme aralığı (saniye)
+    # Arşivde seviye başına saklama süresi (logun yaşı, saniye), 0 = sınırsız
+    LOG_ARCHIVE_RETENTION: dict = {
+        "debug": 7 * 86400,
+        "info": 90 * 86400,
+        "warning": 365 * 86400,
+        "error": 365 * 86400,
+        "default": 365 * 86400,
+    }
+    
+    # Interface trafik oranları (bps/pps)
+    RATE_INTERVAL: int = 5  # sıradaki sayaç snapshot'larının toplu hesaplanma aralığı (saniye)
+    RATE_MAX_BPS: float = 400e9  # bundan hızlı görünen bir 32-bit wrap sayaç sıfırlaması kabul edilir
+    
+    # Circuit breaker - erişilemeyen cihazlar için
+    BREAKER_FAILURE_THRESHOLD: int = 3  # art arda bu kadar hatadan sonra devre açılır
+    BREAKER_BASE_BACKOFF: int = 60  # ilk backoff süresi (saniye), her açılışta ikiye katlanır
+    BREAKER_MAX_BACKOFF: int = 900  # backoff üst sınırı (saniye)
+    
     class Config:
         env_file = ".env"
         case_sensitive = True
@@ -1,21 +1,184 @@
+import asyncio
 import os
-from sqlalchemy import create_engine
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import bindparam, create_engine, event, text
+from sqlalchemy.engine import Engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+
+from .config import settings
 
 # SQLite konfigürasyonu - çok daha hızlı ve kolay yönetim
 SQLALCHEMY_DATABASE_URL = "sqlite:///./mikrotik_devices.db"
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL,
-    connect_args={"check_same_thread": False},  # SQLite için gerekli
-    echo=False  # SQL debug için True yapılabilir
+
+def create_sqlite_engine(url: str, pragmas: Optional[Dict[str, Any]] = None, read_only: bool = False,
+                         pool_size: int = 5) -> Engine:
+    """
+    Create a SQLite engine that applies the storage profile on every connection.
+
+    read_only engines also set query_only, so a stray write through the read
+    pool fails loudly instead of competing with the writer.
+    """
+    engine = create_engine(
+        url,
+        connect_args={"check_same_thread": False},  # SQLite için gerekli
+        pool_size=pool_size,
+        max_overflow=pool_size,
+        echo=False  # SQL debug için True yapılabilir
+    )
+    pragmas = dict(pragmas or {})
+    if read_only:
+        pragmas["query_only"] = "ON"
+    
+    @event.listens_for(engine, "connect")
+    def apply_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+    
+    return engine
+
+
+# Yazma engine'i (poller, log yazıcısı, API değişiklikleri)
+engine = create_sqlite_engine(SQLALCHEMY_DATABASE_URL, settings.SQLITE_PRAGMAS)
+# API okumaları için ayrı havuz; WAL'da yazıcıyı beklemez
+read_engine = create_sqlite_engine(
+    SQLALCHEMY_DATABASE_URL, settings.SQLITE_PRAGMAS, read_only=True,
+    pool_size=settings.SQLITE_READ_POOL_SIZE
 )
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
 
 Base = declarative_base()
 
+
+class DatabaseWriter:
+    """
+    Tek thread'li yazma kuyruğu.
+    
+    Arka plan yazıcıları (poll sonuçları, loglar, heartbeat'ler, oranlar,
+    retention ve arşiv) işlerini buraya verir; hepsi aynı thread'de sırayla
+    çalışır, böylece SQLite'ın tek yazıcı kilidi için birbirleriyle yarışmazlar.
+    """
+    
+    def __init__(self):
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-writer")
+        self._lock = threading.Lock()
+        self.queued = 0
+        self.completed = 0
+        self.failed = 0
+        self.busy_time = 0.0
+        self.max_wait = 0.0
+    
+    def _call(self, func: Callable, args: tuple, queued_at: float):
+        started = time.monotonic()
+        try:
+            return func(*args)
+        except Exception:
+            with self._lock:
+                self.failed += 1
+            raise
+        finally:
+            finished = time.monotonic()
+            with self._lock:
+                self.queued -= 1
+                self.completed += 1
+                self.busy_time += finished - started
+                self.max_wait = max(self.max_wait, started - queued_at)
+    
+    async def run(self, func: Callable, *args):
+        """Run a blocking write function on the writer thread and await its result"""
+        with self._lock:
+            self.queued += 1
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._call, func, args, time.monotonic())
+    
+    def close(self):
+        # Kuyruktaki yazmalar bitene kadar bekler
+        self._executor.shutdown(wait=True)
+    
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "queued": self.queued,
+                "completed": self.completed,
+                "failed": self.failed,
+                "busy_seconds": round(self.busy_time, 3),
+                "max_wait_ms": round(self.max_wait * 1000, 1),
+            }
+
+
+# Global database writer
+db_writer = DatabaseWriter()
+
+
+def _in_session(session_factory: sessionmaker, func: Callable, args: tuple, commit: bool):
+    # expire_on_commit=False: dönen nesneler session kapandıktan sonra da okunabilsin
+    db = session_factory(expire_on_commit=False)
+    try:
+        result = func(db, *args)
+        if commit:
+            db.commit()
+        return result
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+async def run_read(func: Callable, *args):
+    """
+    Run func(db, *args) with a read-pool session on a worker thread.
+    
+    Async code (handlers that also talk to routers, the monitor loop) uses
+    this instead of querying on the event loop.
+    """
+    return await asyncio.to_thread(_in_session, ReadSessionLocal, func, args, False)
+
+
+async def run_write(func: Callable, *args):
+    """Run func(db, *args) on the writer thread and commit; rolled back if it raises"""
+    return await db_writer.run(_in_session, SessionLocal, func, args, True)
+
+
+def grouped_update(db: Session, table, rows: Dict[int, Dict[str, Any]]):
+    """UPDATE rows by id; rows with the same column set share one executemany"""
+    groups: Dict[tuple, List[dict]] = {}
+    for row_id, values in rows.items():
+        groups.setdefault(tuple(sorted(values)), []).append({"b_id": row_id, **values})
+    for fields, params in groups.items():
+        db.execute(
+            table.update()
+            .where(table.c.id == bindparam("b_id"))
+            .values({field: bindparam(field) for field in fields}),
+            params
+        )
+
+
+def storage_profile() -> dict:
+    """Pragmas actually in effect on a writer connection, plus pool state"""
+    with engine.connect() as connection:
+        pragmas = {
+            name: connection.execute(text(f"PRAGMA {name}")).scalar()
+            for name in settings.SQLITE_PRAGMAS
+        }
+    return {
+        "pragmas": pragmas,
+        "write_pool": engine.pool.status(),
+        "read_pool": read_engine.pool.status(),
+        "writer": db_writer.stats(),
+    }
+
 def get_db():
     db = SessionLocal()
     try:
@@ -23,7 +186,19 @@ def get_db():
     finally:
         db.close()
 
+def get_read_db():
+    """Session from the read pool, for endpoints that only query"""
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
 def init_db():
     # Tüm tabloları oluştur
     Base.metadata.create_all(bind=engine)
-    print("✅ SQLite database initialized successfully") 
\ No newline at end of file
+    # Var olan tablolara eksik sütun ve index'ler
+    from .migrations import run_migrations
+    for migration in run_migrations(engine):
+        print(f"✅ Migration {migration.version} applied: {migration.name}")
+    print("✅ SQLite database initialized successfully")
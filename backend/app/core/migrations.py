@@ -0,0 +1,154 @@
+"""
+Versioned schema migrations.
+
+init_db() creates missing tables from the models; existing tables are changed
+here. Every migration has a version and is idempotent (columns are checked
+before ALTER, indexes use IF NOT EXISTS), so a database that was patched by
+hand with the old migrate_*.py scripts is brought up to date the same way as
+an old one. Applied versions are recorded in schema_migrations.
+"""
+import logging
+from datetime import datetime
+from typing import Callable, List, NamedTuple
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+
+logger = logging.getLogger(__name__)
+
+VERSION_TABLE = "schema_migrations"
+
+
+class Migration(NamedTuple):
+    version: int
+    name: str
+    apply: Callable[[Connection], None]
+
+
+def _columns(conn: Connection, table: str) -> List[str]:
+    return [row[1] for row in conn.execute(text(f"PRAGMA table_info({table})"))]
+
+
+def _add_columns(conn: Connection, table: str, columns: dict):
+    existing = _columns(conn, table)
+    for name, definition in columns.items():
+        if name not in existing:
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {definition}"))
+
+
+def _create_index(conn: Connection, name: str, table: str, columns: str, unique: bool = False):
+    conn.execute(text(
+        f"CREATE {'UNIQUE ' if unique else ''}INDEX IF NOT EXISTS {name} ON {table} ({columns})"
+    ))
+
+
+# --- migrations ---
+
+def _device_columns(conn: Connection):
+    # add_column.py, migrate_add_credential_id.py ve migrate_add_groups.py'nin sütunları
+    _add_columns(conn, "mikrotik_devices", {
+        "manual_override": "BOOLEAN DEFAULT 0",
+        "credential_id": "INTEGER REFERENCES credentials(id)",
+        "group_id": "INTEGER REFERENCES groups(id)",
+    })
+
+
+def _interface_rates(conn: Connection):
+    _add_columns(conn, "device_interfaces", {
+        "rx_bps": "FLOAT",
+        "tx_bps": "FLOAT",
+        "rx_pps": "FLOAT",
+        "tx_pps": "FLOAT",
+    })
+    # Oran güncellemesi device_id + name ile eşleştirir; index yoksa her satır tablo taraması
+    _create_index(conn, "ix_device_interfaces_device_name", "device_interfaces", "device_id, name")
+
+
+def _log_retention(conn: Connection):
+    _add_columns(conn, "device_logs", {"repeat_count": "INTEGER DEFAULT 1"})
+    # Retention seviye + zaman aralığıyla siler
+    _create_index(conn, "ix_device_logs_level_timestamp", "device_logs", "log_level, timestamp")
+
+
+def _interface_sync(conn: Connection):
+    _add_columns(conn, "device_interfaces", {"ros_id": "VARCHAR(32)"})
+    # Eski N+1 kodu aynı isimde birden fazla satır bırakmış olabilir; en yenisi kalır
+    conn.execute(text("""
+        DELETE FROM device_interfaces
+        WHERE id NOT IN (SELECT MAX(id) FROM device_interfaces GROUP BY device_id, name)
+    """))
+    _create_index(conn, "ux_device_interfaces_device_name", "device_interfaces", "device_id, name", unique=True)
+    # Unique index aynı sorguları karşılar, 2. migration'ın index'i gereksiz kaldı
+    conn.execute(text("DROP INDEX IF EXISTS ix_device_interfaces_device_name"))
+
+
+def _hot_query_indexes(conn: Connection):
+    # Cihaz log sayfası ve export: device_id = ? ORDER BY timestamp DESC
+    _create_index(conn, "ix_device_logs_device_timestamp", "device_logs", "device_id, timestamp")
+    # /stats son loglar ve arşivleme: ORDER BY timestamp / timestamp < ?
+    _create_index(conn, "ix_device_logs_timestamp", "device_logs", "timestamp")
+    # /devices filtreleri, /stats sayımları, grup metrikleri
+    _create_index(conn, "ix_mikrotik_devices_is_online", "mikrotik_devices", "is_online")
+    _create_index(conn, "ix_mikrotik_devices_group_name", "mikrotik_devices", "group_name")
+    _create_index(conn, "ix_mikrotik_devices_group_id", "mikrotik_devices", "group_id")
+    # Komut geçmişi cihaza göre
+    _create_index(conn, "ix_device_commands_device_id", "device_commands", "device_id")
+
+
+def _numeric_cpu_load(conn: Connection):
+    _add_columns(conn, "mikrotik_devices", {"cpu_load_pct": "FLOAT"})
+    # Mevcut '12' / '12%' değerlerini doldur, sayı olmayanlar NULL kalır
+    conn.execute(text("""
+        UPDATE mikrotik_devices
+        SET cpu_load_pct = CAST(REPLACE(cpu_load, '%', '') AS REAL)
+        WHERE cpu_load_pct IS NULL AND REPLACE(cpu_load, '%', '') GLOB '[0-9]*'
+    """))
+    _create_index(conn, "ix_mikrotik_devices_online_cpu", "mikrotik_devices", "is_online, cpu_load_pct")
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, "device_columns", _device_columns),
+    Migration(2, "interface_rates", _interface_rates),
+    Migration(3, "log_retention", _log_retention),
+    Migration(4, "interface_sync", _interface_sync),
+    Migration(5, "hot_query_indexes", _hot_query_indexes),
+    Migration(6, "numeric_cpu_load", _numeric_cpu_load),
+]
+
+
+# --- runner ---
+
+def _ensure_version_table(conn: Connection):
+    conn.execute(text(f"""
+        CREATE TABLE IF NOT EXISTS {VERSION_TABLE} (
+            version INTEGER PRIMARY KEY,
+            name VARCHAR(255) NOT NULL,
+            applied_at DATETIME NOT NULL
+        )
+    """))
+
+
+def applied_versions(engine: Engine) -> dict:
+    """version -> (name, applied_at) of every applied migration"""
+    with engine.begin() as conn:
+        _ensure_version_table(conn)
+        rows = conn.execute(text(f"SELECT version, name, applied_at FROM {VERSION_TABLE}"))
+        return {version: (name, applied_at) for version, name, applied_at in rows}
+
+
+def run_migrations(engine: Engine) -> List[Migration]:
+    """Apply pending migrations in version order, each in its own transaction"""
+    done = applied_versions(engine)
+    applied = []
+    for migration in sorted(MIGRATIONS, key=lambda migration: migration.version):
+        if migration.version in done:
+            continue
+        with engine.begin() as conn:
+            migration.apply(conn)
+            conn.execute(
+                text(f"INSERT INTO {VERSION_TABLE} (version, name, applied_at) VALUES (:version, :name, :applied_at)"),
+                {"version": migration.version, "name": migration.name, "applied_at": datetime.utcnow()}
+            )
+        logger.info(f"Applied migration {migration.version}: {migration.name}")
+        applied.append(migration)
+    return applied
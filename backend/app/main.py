@@ -1,17 +1,30 @@
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Depends
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import HTMLResponse
-from sqlalchemy.orm import Session
 import asyncio
 import json
 import logging
-from typing import Dict, List
+from typing import Dict
 from datetime import datetime
 
 from .core.config import settings
-from .core.database import init_db, get_db
+from .core.database import init_db, db_writer, run_read, storage_profile
 from .api.mikrotik import router as mikrotik_router
 from .services.mikrotik_service import MikrotikService, connection_pool
+from .services.scheduler import poll_scheduler
+from .services.circuit_breaker import device_breakers
+from .services.metrics_store import metric_store
+from .services.traffic_rates import traffic_rates
+from .services.log_writer import log_writer
+from .services.log_retention import log_retention
+from .services.log_archive import log_archive
+from .services.device_state import device_state
+from .services.state_writer import DeviceTarget, state_writer
+from .services.fleet_stats import fleet_stats
+from .services.broadcast import Subscription, broadcast_hub
+from .services.device_feed import device_feed
+from .services.live_watch import live_watch
+from .services.device_poller import poll_once
 from .models.mikrotik import MikrotikDevice
 
 # Configure logging
@@ -38,115 +51,77 @@ app.add_middleware(
 # Include routers
 app.include_router(mikrotik_router, prefix="/api/v1")
 
-# WebSocket connection manager
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: List[WebSocket] = []
-    
-    async def connect(self, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections.append(websocket)
-        logger.info(f"WebSocket connected. Total connections: {len(self.active_connections)}")
-    
-    def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
-        logger.info(f"WebSocket disconnected. Total connections: {len(self.active_connections)}")
-    
-    async def send_personal_message(self, message: str, websocket: WebSocket):
-        await websocket.send_text(message)
-    
-    async def broadcast(self, message: str):
-        for connection in self.active_connections:
-            try:
-                await connection.send_text(message)
-            except:
-                # Remove dead connections
-                self.active_connections.remove(connection)
-
-manager = ConnectionManager()
-
 # Background task for monitoring devices
 async def monitor_devices():
     """Background task to monitor device status"""
-    while True:
-        try:
-            from .core.database import SessionLocal
-            db = SessionLocal()
-            
-            # Get all devices
-            devices = db.query(MikrotikDevice).all()
-            logger.info(f"Monitoring {len(devices)} devices")
-            
-            # Test connections in batches
-            batch_size = 50
-            for i in range(0, len(devices), batch_size):
-                batch = devices[i:i+batch_size]
-                tasks = []
-                
-                for device in batch:
-                    service = MikrotikService(db)
-                    tasks.append(monitor_single_device(service, device))
+    scheduler_task = asyncio.create_task(poll_scheduler.run(poll_once))
+    try:
+        while True:
+            try:
+                # Cihaz listesini zamanlayıcı ile senkronize et (eklenen/silinen cihazlar)
+                devices = await run_read(lambda db: db.query(
+                    MikrotikDevice.id, MikrotikDevice.group_name, MikrotikDevice.connection_attempts
+                ).all())
                 
-                results = await asyncio.gather(*tasks, return_exceptions=True)
+                poll_scheduler.sync((device_id, group_name) for device_id, group_name, _ in devices)
+                for device_id, _, connection_attempts in devices:
+                    # Yeniden başlatma sonrası erişilemeyen cihazlar hemen backoff'a girsin
+                    device_breakers.seed(device_id, connection_attempts or 0)
+                logger.info(f"Monitoring {len(devices)} devices")
                 
-                # Send updates via WebSocket
-                for device, result in zip(batch, results):
-                    if isinstance(result, Exception):
-                        logger.error(f"Error monitoring {device.name}: {result}")
-                        continue
-                    
-                    # Send device status update
-                    await manager.broadcast(json.dumps({
-                        "type": "device_status",
-                        "device_id": device.id,
-                        "name": device.name,
-                        "is_online": device.is_online,
-                        "last_seen": device.last_seen.isoformat() if device.last_seen else None,
-                        "last_error": device.last_error
-                    }))
-            
-            db.close()
+            except Exception as e:
+                logger.error(f"Error in monitor_devices: {e}")
             
-        except Exception as e:
-            logger.error(f"Error in monitor_devices: {e}")
-        
-        # Wait 30 seconds before next check
-        await asyncio.sleep(30)
+            await asyncio.sleep(settings.DEVICE_SYNC_INTERVAL)
+    finally:
+        scheduler_task.cancel()
 
-async def monitor_single_device(service: MikrotikService, device: MikrotikDevice):
-    """Monitor single device"""
-    try:
-        success = await service.test_connection(device)
-        if success:
-            # Get device info and interfaces
-            await service.get_device_info(device)
-            await service.get_interfaces(device)
-        return success
-    except Exception as e:
-        logger.error(f"Error monitoring device {device.name}: {e}")
-        return False
+async def publish_rates(message: dict):
+    """Broadcast a batch of interface rates, each client only its devices"""
+    broadcast_hub.publish_devices(
+        "interfaces", message["devices"], lambda devices: {**message, "devices": devices}
+    )
 
 # WebSocket endpoint
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
-    await manager.connect(websocket)
+    client = await broadcast_hub.connect(websocket)
     try:
         while True:
             data = await websocket.receive_text()
             message = json.loads(data)
             
-            # Handle different message types
+            # Handle different message types (replies go through the client's queue)
             if message.get("type") == "ping":
-                await websocket.send_text(json.dumps({"type": "pong"}))
+                broadcast_hub.send(client, {"type": "pong"})
             elif message.get("type") == "subscribe":
-                # Client subscribes to device updates
-                await websocket.send_text(json.dumps({
+                # Client subscribes to devices/groups/event types (missing = all).
+                # A new client gets a snapshot, a reconnecting one (last_seq + epoch)
+                # only the deltas it missed, both limited to its subscription.
+                # Nothing is awaited in between, so live frames queue up after these.
+                try:
+                    subscription = Subscription.parse(message)
+                except (TypeError, ValueError):
+                    broadcast_hub.send(client, {"type": "error", "message": "Invalid subscription"})
+                    continue
+                frame = device_feed.resume(message.get("last_seq"), message.get("epoch"), subscription)
+                if frame is not None:
+                    broadcast_hub.send(client, frame)
+                broadcast_hub.subscribe(client, subscription)
+                # Açıkça istenen cihazlar için paylaşılan canlı toplayıcı
+                live_watch.set_watched(client.id, subscription.devices if "live" in subscription.events else ())
+                broadcast_hub.send(client, {
                     "type": "subscribed",
-                    "message": "Subscribed to device updates"
-                }))
+                    "message": "Subscribed to device updates",
+                    "subscription": subscription.summary()
+                })
             
-    except WebSocketDisconnect:
-        manager.disconnect(websocket)
+    except (WebSocketDisconnect, RuntimeError):
+        # RuntimeError: hub yavaş istemciyi kapattıktan sonra okuma
+        pass
+    finally:
+        live_watch.set_watched(client.id, ())
+        await broadcast_hub.disconnect(client)
 
 # Health check endpoint
 @app.get("/health")
@@ -173,7 +148,37 @@ async def startup_event():
     
     # Initialize database
     init_db()
-    logger.info("Database initialized")
+    logger.info(f"Database initialized: {storage_profile()['pragmas']}")
+    
+    # Build the in-memory /stats snapshot; writers keep it current from here on
+    await run_read(fleet_stats.load)
+    
+    # Current device state for WebSocket snapshots
+    await run_read(device_feed.load)
+    
+    # Start batched device log writer
+    log_writer.start()
+    
+    # Start device log retention (pruning and collapsing in small chunks)
+    log_retention.start()
+    
+    # Start cold-storage archiver for old device logs
+    log_archive.start()
+    
+    # Start batched last_seen/uptime/cpu_load writer
+    device_state.start()
+    
+    # Start the poll result writer (one transaction per batch of devices)
+    state_writer.start()
+    
+    # Start metric flusher
+    metric_store.start()
+    
+    # Start interface rate computation, results are pushed to WebSocket clients
+    traffic_rates.start(publish_rates)
+    
+    # Start coalesced device delta frames for WebSocket clients
+    device_feed.start()
     
     # Start monitoring task
     asyncio.create_task(monitor_devices())
@@ -184,16 +189,43 @@ async def startup_event():
 async def shutdown_event():
     logger.info("Shutting down MikroTik API Management System...")
     
+    # Stop live collectors and close WebSocket clients
+    await live_watch.close()
+    await device_feed.close()
+    await broadcast_hub.close()
+    
     # Close all connections
-    connection_pool.close_all()
+    await connection_pool.close_all()
     logger.info("All connections closed")
+    
+    # Write pending poll results, then remaining heartbeats
+    await state_writer.close()
+    await device_state.close()
+    
+    # Stop log retention and archiving, then write buffered device logs
+    await log_retention.close()
+    await log_archive.close()
+    await log_writer.close()
+    logger.info("Device logs flushed")
+    
+    # Stop rate computation before the final metric flush
+    await traffic_rates.close()
+    
+    # Flush pending metric samples
+    await metric_store.close()
+    logger.info("Metric store flushed")
+    
+    # Wait for queued database writes
+    db_writer.close()
 
 # Test endpoint for bulk operations
 @app.post("/api/v1/test-bulk")
-async def test_bulk_operations(db: Session = Depends(get_db)):
+async def test_bulk_operations():
     """Test endpoint for bulk operations"""
-    devices = db.query(MikrotikDevice).limit(10).all()
-    service = MikrotikService(db)
+    devices = await run_read(lambda db: [
+        DeviceTarget.from_device(device) for device in db.query(MikrotikDevice).limit(10).all()
+    ])
+    service = MikrotikService()
     
     # Test parallel connections
     tasks = []
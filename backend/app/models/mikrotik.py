@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, JSON, ForeignKey, Table
+from sqlalchemy import Column, Integer, Float, String, DateTime, Boolean, Text, JSON, ForeignKey, Table, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -68,7 +68,7 @@ class MikrotikDevice(Base):
     username = Column(String(255), nullable=False)
     password = Column(String(255), nullable=False)
     credential_id = Column(Integer, ForeignKey("credentials.id"), nullable=True)  # Reference to credential
-    group_id = Column(Integer, ForeignKey("groups.id"), nullable=True)  # Reference to group
+    group_id = Column(Integer, ForeignKey("groups.id"), nullable=True, index=True)  # Reference to group
     
     # Device Info
     router_board = Column(String(255))
@@ -78,17 +78,18 @@ class MikrotikDevice(Base):
     manual_override = Column(Boolean, default=False)  # Manuel güncelleme flag'i
     
     # Connection Status
-    is_online = Column(Boolean, default=False)
+    is_online = Column(Boolean, default=False, index=True)
     last_seen = Column(DateTime, default=datetime.utcnow)
     connection_attempts = Column(Integer, default=0)
     last_error = Column(Text)
     
     # Real-time metrics
-    cpu_load = Column(String(10))  # CPU kullanım yüzdesi
+    cpu_load = Column(String(10))  # CPU kullanım yüzdesi (görüntülenen değer)
+    cpu_load_pct = Column(Float)  # aynı değer sayısal, sıralama ve top-N için
     uptime = Column(String(100))   # Uptime süresi
     
     # Grouping
-    group_name = Column(String(255), default="default")
+    group_name = Column(String(255), default="default", index=True)
     location = Column(String(255))
     description = Column(Text)
     
@@ -101,6 +102,11 @@ class MikrotikDevice(Base):
     interfaces = relationship("DeviceInterface", back_populates="device")
     credential = relationship("Credential")
     group = relationship("Group")
+    
+    __table_args__ = (
+        # /stats yüksek CPU: is_online = 1 ORDER BY cpu_load_pct DESC LIMIT 10
+        Index("ix_mikrotik_devices_online_cpu", "is_online", "cpu_load_pct"),
+    )
 
 class DeviceLog(Base):
     __tablename__ = "device_logs"
@@ -111,16 +117,25 @@ class DeviceLog(Base):
     message = Column(Text)
     command = Column(Text)
     response = Column(JSON)
-    timestamp = Column(DateTime, default=datetime.utcnow)
+    timestamp = Column(DateTime, default=datetime.utcnow, index=True)
+    repeat_count = Column(Integer, default=1)  # retention tarafından birleştirilen tekrar sayısı
     
     # Relationship
     device = relationship("MikrotikDevice", back_populates="logs")
+    
+    __table_args__ = (
+        # Retention seviye + zaman aralığıyla siler
+        Index("ix_device_logs_level_timestamp", "log_level", "timestamp"),
+        # Cihaz log sayfası: device_id = ? ORDER BY timestamp DESC
+        Index("ix_device_logs_device_timestamp", "device_id", "timestamp"),
+    )
 
 class DeviceInterface(Base):
     __tablename__ = "device_interfaces"
     
     id = Column(Integer, primary_key=True, index=True)
     device_id = Column(Integer, ForeignKey("mikrotik_devices.id"))
+    ros_id = Column(String(32))  # RouterOS .id (*1, *1A ...), isim değişse de sabit
     name = Column(String(255))
     type = Column(String(100))
     mac_address = Column(String(17))
@@ -133,17 +148,28 @@ class DeviceInterface(Base):
     rx_packets = Column(Integer, default=0)
     tx_packets = Column(Integer, default=0)
     
+    # Rates (son iki sayaç snapshot'ından)
+    rx_bps = Column(Float)
+    tx_bps = Column(Float)
+    rx_pps = Column(Float)
+    tx_pps = Column(Float)
+    
     # Metadata
     last_updated = Column(DateTime, default=datetime.utcnow)
     
     # Relationship
     device = relationship("MikrotikDevice", back_populates="interfaces")
+    
+    __table_args__ = (
+        # Interface sync cihaz başına isimle eşleştirir
+        Index("ux_device_interfaces_device_name", "device_id", "name", unique=True),
+    )
 
 class DeviceCommand(Base):
     __tablename__ = "device_commands"
     
     id = Column(Integer, primary_key=True, index=True)
-    device_id = Column(Integer, ForeignKey("mikrotik_devices.id"))
+    device_id = Column(Integer, ForeignKey("mikrotik_devices.id"), index=True)
     command = Column(Text, nullable=False)
     status = Column(String(50), default="pending")  # pending, running, completed, failed
     result = Column(JSON)
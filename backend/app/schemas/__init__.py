@@ -17,7 +17,8 @@ from .mikrotik import (
     SubnetUpdate,
     Group,
     GroupCreate,
-    GroupUpdate
+    GroupUpdate,
+    MetricSeries
 )
 
 __all__ = [
@@ -39,5 +40,6 @@ __all__ = [
     "SubnetUpdate",
     "Group",
     "GroupCreate",
-    "GroupUpdate"
+    "GroupUpdate",
+    "MetricSeries"
 ] 
\ No newline at end of file
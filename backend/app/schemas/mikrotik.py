@@ -158,6 +158,7 @@ class MikrotikDevice(MikrotikDeviceBase):
     connection_attempts: int = 0
     last_error: Optional[str] = None
     cpu_load: Optional[str] = None
+    cpu_load_pct: Optional[float] = None
     uptime: Optional[str] = None
     created_at: datetime
     updated_at: datetime
@@ -168,6 +169,7 @@ class MikrotikDevice(MikrotikDeviceBase):
 class DeviceInterface(BaseModel):
     id: int
     device_id: int
+    ros_id: Optional[str] = None
     name: str
     type: Optional[str] = None
     mac_address: Optional[str] = None
@@ -177,6 +179,10 @@ class DeviceInterface(BaseModel):
     tx_bytes: int = 0
     rx_packets: int = 0
     tx_packets: int = 0
+    rx_bps: Optional[float] = None
+    tx_bps: Optional[float] = None
+    rx_pps: Optional[float] = None
+    tx_pps: Optional[float] = None
     last_updated: datetime
     
     class Config:
@@ -190,6 +196,7 @@ class DeviceLog(BaseModel):
     command: Optional[str] = None
     response: Optional[Dict[str, Any]] = None
     timestamp: datetime
+    repeat_count: int = 1
     
     class Config:
         from_attributes = True
@@ -232,6 +239,7 @@ class HighCpuDevice(BaseModel):
     name: str
     ip_address: str
     cpu_load: str
+    cpu_load_pct: Optional[float] = None
     group_name: str
     is_online: bool
     last_seen: Optional[datetime] = None
@@ -240,6 +248,7 @@ class HighCpuDevice(BaseModel):
         from_attributes = True
 
 class DeviceStats(BaseModel):
+    version: int = 0  # özet her değiştiğinde artar
     total_devices: int
     online_devices: int
     offline_devices: int
@@ -247,4 +256,14 @@ class DeviceStats(BaseModel):
     recent_logs: List[DeviceLog]
     high_cpu_devices: List[HighCpuDevice]
 
- 
\ No newline at end of file
+ 
+class MetricSeries(BaseModel):
+    device_id: int
+    metric: str
+    start: Optional[float] = None  # epoch saniye (UTC)
+    end: Optional[float] = None
+    step: Optional[float] = None
+    tier: str = "raw"  # raw, 1m, 5m, 1h, 1d
+    agg: str = "avg"
+    timestamps: List[float]
+    values: List[float]
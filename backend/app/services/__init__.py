@@ -1,7 +1,45 @@
 from .mikrotik_service import MikrotikService, MikrotikConnectionPool, connection_pool
+from .scheduler import PollScheduler, poll_scheduler
+from .circuit_breaker import CircuitBreaker, BreakerRegistry, device_breakers
+from .traffic_rates import TrafficRateEngine, traffic_rates
+from .log_writer import DeviceLogWriter, log_writer
+from .log_retention import LogRetentionEngine, log_retention
+from .log_archive import LogArchive, log_archive
+from .device_state import DeviceStateTracker, device_state
+from .state_writer import StateWriter, state_writer
+from .fleet_stats import FleetStats, fleet_stats
+from .broadcast import BroadcastHub, Subscription, broadcast_hub
+from .device_feed import DeviceFeed, device_feed
+from .live_watch import LiveWatch, live_watch
  
 __all__ = [
     "MikrotikService",
     "MikrotikConnectionPool", 
-    "connection_pool"
+    "connection_pool",
+    "PollScheduler",
+    "poll_scheduler",
+    "CircuitBreaker",
+    "BreakerRegistry",
+    "device_breakers",
+    "TrafficRateEngine",
+    "traffic_rates",
+    "DeviceLogWriter",
+    "log_writer",
+    "LogRetentionEngine",
+    "log_retention",
+    "LogArchive",
+    "log_archive",
+    "DeviceStateTracker",
+    "device_state",
+    "StateWriter",
+    "state_writer",
+    "FleetStats",
+    "fleet_stats",
+    "BroadcastHub",
+    "Subscription",
+    "broadcast_hub",
+    "DeviceFeed",
+    "device_feed",
+    "LiveWatch",
+    "live_watch"
 ] 
\ No newline at end of file
@@ -0,0 +1,350 @@
+import asyncio
+import itertools
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, FrozenSet, Hashable, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from fastapi import WebSocket
+
+from ..core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# WebSocket close kodu: "try again later", yavaş istemci kapatılırken
+CLOSE_TRY_AGAIN_LATER = 1013
+
+# status: devices_delta/snapshot, metrics: CPU/bellek örnekleri,
+# interfaces: interface_rates, logs: device_logs,
+# live: izlenen cihazın device_live mesajları (toplayıcıyı başlatır)
+EVENT_TYPES = ("status", "metrics", "interfaces", "logs", "live")
+
+
+class Subscription(NamedTuple):
+    """What a client asked for; no devices and no groups means the whole fleet"""
+    devices: FrozenSet[int] = frozenset()
+    groups: FrozenSet[str] = frozenset()  # grup id'si veya adı
+    events: FrozenSet[str] = frozenset(EVENT_TYPES)
+
+    @classmethod
+    def parse(cls, message: dict) -> "Subscription":
+        """Build from a subscribe message; raises ValueError/TypeError on bad ids"""
+        return cls(
+            devices=frozenset(int(device_id) for device_id in message.get("devices") or ()),
+            groups=frozenset(str(group) for group in message.get("groups") or ()),
+            events=frozenset(event for event in message.get("events") or EVENT_TYPES if event in EVENT_TYPES),
+        )
+
+    @property
+    def whole_fleet(self) -> bool:
+        return not self.devices and not self.groups
+
+    def topics(self) -> List[tuple]:
+        scopes = [("*", None)] if self.whole_fleet else \
+            [("device", device_id) for device_id in self.devices] + [("group", group) for group in self.groups]
+        return [(event, kind, value) for event in self.events for kind, value in scopes]
+
+    def matches(self, device_id: int, groups: Iterable[str] = ()) -> bool:
+        return self.whole_fleet or device_id in self.devices or not self.groups.isdisjoint(groups)
+
+    def summary(self) -> dict:
+        return {
+            "devices": sorted(self.devices),
+            "groups": sorted(self.groups),
+            "events": sorted(self.events),
+        }
+
+
+class ClientChannel:
+    """
+    Tek bir WebSocket istemcisinin giden kuyruğu.
+
+    Kuyruk key -> metin sıralı sözlüğüdür: aynı key ile gelen yeni mesaj
+    kuyruktaki eskisinin yerine geçer (örn. bir cihazın son durumu), key'siz
+    mesajlar sıraya eklenir. Kuyruk dolunca en eski mesaj atılır.
+    """
+
+    _ids = itertools.count(1)
+
+    def __init__(self, websocket: WebSocket, max_queue: int):
+        self.id = next(self._ids)
+        self.websocket = websocket
+        self.max_queue = max_queue
+        self.queue: "OrderedDict[Hashable, str]" = OrderedDict()
+        self._ready = asyncio.Event()
+        self._unique = itertools.count()
+        self.task: Optional[asyncio.Task] = None
+        # subscribe mesajına kadar yayın almaz (önce snapshot/replay gider)
+        self.subscription: Optional[Subscription] = None
+        self.closed = False
+        self.connected_at = time.time()
+        self.overflow_since: Optional[float] = None
+        self.sent = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.max_depth = 0
+        self.last_send_duration = 0.0
+
+    def enqueue(self, text: str, key: Optional[Hashable] = None):
+        if key is not None and key in self.queue:
+            # Henüz gönderilmemiş eski değerin yerine geçer, sırası korunur
+            self.queue[key] = text
+            self.coalesced += 1
+            return
+        if len(self.queue) >= self.max_queue:
+            self.queue.popitem(last=False)
+            self.dropped += 1
+            if self.overflow_since is None:
+                self.overflow_since = time.monotonic()
+        self.queue[key if key is not None else ("", next(self._unique))] = text
+        self.max_depth = max(self.max_depth, len(self.queue))
+        self._ready.set()
+
+    async def next(self) -> str:
+        while not self.queue:
+            self._ready.clear()
+            await self._ready.wait()
+        _, text = self.queue.popitem(last=False)
+        if self.overflow_since is not None and len(self.queue) <= self.max_queue // 2:
+            # Yarıya kadar boşaldı, yetişiyor
+            self.overflow_since = None
+        return text
+
+    def stalled_for(self) -> float:
+        return time.monotonic() - self.overflow_since if self.overflow_since is not None else 0.0
+
+    def stats(self) -> dict:
+        client = self.websocket.client
+        return {
+            "id": self.id,
+            "subscription": self.subscription.summary() if self.subscription else None,
+            "remote": f"{client.host}:{client.port}" if client else None,
+            "connected_seconds": round(time.time() - self.connected_at, 1),
+            "queue_depth": len(self.queue),
+            "max_queue_depth": self.max_depth,
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "coalesced": self.coalesced,
+            "last_send_ms": round(self.last_send_duration * 1000, 2),
+            "stalled_seconds": round(self.stalled_for(), 1),
+        }
+
+
+class BroadcastHub:
+    """
+    WebSocket yayın merkezi.
+
+    publish() mesajı bir kez serialize edip her istemcinin kuyruğuna koyar ve
+    hiç beklemez; ağ gönderimi istemci başına bir sender task'ında yapılır.
+
+    İstemciler cihaz, grup ve olay tipine göre abone olur. Aynı aboneliğe
+    sahip istemciler bir "view" paylaşır; topic -> view index'i sayesinde
+    cihaz olayları sadece ilgili view'lara gider ve her view için bir kez
+    serialize edilir. Tek cihazı izleyen sayfa filonun değil o cihazın
+    trafiğini alır.
+    Böylece yavaş bir tarayıcı sekmesi monitörü ve diğer istemcileri
+    yavaşlatmaz. Yavaş istemcide kuyruk taşarsa eski mesajlar atılır (key'li
+    olanlar birleştirilir); tek gönderim send_timeout'u aşarsa veya kuyruk
+    stall_timeout boyunca taşmaya devam ederse istemci kapatılır.
+    """
+
+    def __init__(self, max_queue: int = 256, send_timeout: float = 10, stall_timeout: float = 30):
+        self.max_queue = max_queue
+        self.send_timeout = send_timeout
+        self.stall_timeout = stall_timeout
+        self.clients: Dict[int, ClientChannel] = {}
+        self._views: Dict[Subscription, Set[ClientChannel]] = {}
+        self._topics: Dict[tuple, Set[Subscription]] = {}
+        # Grup aboneliklerini eşleştirmek için cihaz -> (grup id'si, grup adı)
+        self.device_groups: Dict[int, Tuple[str, ...]] = {}
+        self.published = 0
+        self.total_dropped = 0
+        self.disconnected_slow = 0
+
+    async def connect(self, websocket: WebSocket) -> ClientChannel:
+        await websocket.accept()
+        client = ClientChannel(websocket, self.max_queue)
+        self.clients[client.id] = client
+        client.task = asyncio.create_task(self._sender(client))
+        logger.info(f"WebSocket connected. Total connections: {len(self.clients)}")
+        return client
+
+    async def disconnect(self, client: ClientChannel, code: int = 1000, reason: str = ""):
+        if client.closed:
+            return
+        client.closed = True
+        self.clients.pop(client.id, None)
+        self._unsubscribe(client)
+        self.total_dropped += client.dropped
+        if client.task is not None and client.task is not asyncio.current_task():
+            client.task.cancel()
+        try:
+            await asyncio.wait_for(client.websocket.close(code=code, reason=reason), timeout=self.send_timeout)
+        except Exception:
+            # Zaten kapanmış ya da karşı taraf cevap vermiyor
+            pass
+        logger.info(f"WebSocket disconnected. Total connections: {len(self.clients)}")
+
+    # --- subscriptions ---
+
+    def subscribe(self, client: ClientChannel, subscription: Subscription = Subscription()):
+        """Start (or change) what this client receives"""
+        self._unsubscribe(client)
+        client.subscription = subscription
+        clients = self._views.get(subscription)
+        if clients is None:
+            clients = self._views[subscription] = set()
+            for topic in subscription.topics():
+                self._topics.setdefault(topic, set()).add(subscription)
+        clients.add(client)
+
+    def _unsubscribe(self, client: ClientChannel):
+        subscription, client.subscription = client.subscription, None
+        clients = self._views.get(subscription) if subscription is not None else None
+        if clients is None:
+            return
+        clients.discard(client)
+        if not clients:
+            del self._views[subscription]
+            for topic in subscription.topics():
+                views = self._topics.get(topic)
+                if views is not None:
+                    views.discard(subscription)
+                    if not views:
+                        del self._topics[topic]
+
+    def set_device_groups(self, device_id: int, group_id: Any, group_name: Any):
+        self.device_groups[device_id] = tuple(str(group) for group in (group_id, group_name) if group is not None)
+
+    def forget_device(self, device_id: int):
+        self.device_groups.pop(device_id, None)
+
+    def has_view(self, view: Subscription) -> bool:
+        return view in self._views
+
+    def wants(self, event: str) -> bool:
+        """Whether any client subscribed to this event type (skip building messages otherwise)"""
+        return any(event in view.events for view in self._views)
+
+    def views_for(self, event: str, device_id: int) -> Set[Subscription]:
+        """Views that receive this device's events, via the topic index"""
+        views = set(self._topics.get((event, "*", None), ()))
+        views.update(self._topics.get((event, "device", device_id), ()))
+        for group in self.device_groups.get(device_id, ()):
+            views.update(self._topics.get((event, "group", group), ()))
+        return views
+
+    # --- publishing ---
+
+    @staticmethod
+    def _text(message: Any) -> str:
+        return message if isinstance(message, str) else json.dumps(message, default=str)
+
+    def _deliver(self, clients: Iterable[ClientChannel], text: str, key: Optional[Hashable] = None):
+        for client in list(clients):
+            client.enqueue(text, key)
+            if client.stalled_for() > self.stall_timeout:
+                self._drop_slow(client, f"queue overflowing for {client.stalled_for():.0f}s")
+
+    def publish(self, message: Any, key: Optional[Hashable] = None):
+        """Queue a message for every subscribed client; never awaits"""
+        if not self._views:
+            return
+        self.published += 1
+        text = self._text(message)
+        for clients in list(self._views.values()):
+            self._deliver(clients, text, key)
+
+    def send_view(self, view: Subscription, message: Any, key: Optional[Hashable] = None):
+        """Queue a message for the clients sharing one subscription"""
+        clients = self._views.get(view)
+        if clients:
+            self._deliver(clients, self._text(message), key)
+
+    def publish_device(self, event: str, device_id: int, message: Any, key: Optional[Hashable] = None):
+        """Queue one device's event for the views subscribed to it"""
+        views = self.views_for(event, device_id)
+        if not views:
+            return
+        self.published += 1
+        text = self._text(message)
+        for view in views:
+            self._deliver(self._views[view], text, key)
+
+    def publish_devices(self, event: str, per_device: Dict[int, Any], build: Callable[[Dict[int, Any]], Any]):
+        """
+        Split a multi-device message: every view gets build() of only its
+        devices' parts. Views with the same device set share one serialization.
+        """
+        subsets: Dict[Subscription, Dict[int, Any]] = {}
+        for device_id, part in per_device.items():
+            for view in self.views_for(event, device_id):
+                subsets.setdefault(view, {})[device_id] = part
+        if not subsets:
+            return
+        self.published += 1
+        texts: Dict[FrozenSet[int], str] = {}
+        for view, subset in subsets.items():
+            signature = frozenset(subset)
+            if signature not in texts:
+                texts[signature] = self._text(build(subset))
+            self._deliver(self._views[view], texts[signature])
+
+    def send(self, client: ClientChannel, message: Any):
+        """Queue a message for one client (replies go through its sender too)"""
+        client.enqueue(message if isinstance(message, str) else json.dumps(message, default=str))
+
+    def _drop_slow(self, client: ClientChannel, why: str):
+        if self.clients.pop(client.id, None) is None:
+            # Zaten kapatılıyor
+            return
+        self._unsubscribe(client)
+        logger.warning(f"Disconnecting slow WebSocket client {client.id}: {why}")
+        self.disconnected_slow += 1
+        asyncio.create_task(self.disconnect(client, CLOSE_TRY_AGAIN_LATER, "client too slow"))
+
+    async def _sender(self, client: ClientChannel):
+        try:
+            while True:
+                text = await client.next()
+                started = time.monotonic()
+                try:
+                    await asyncio.wait_for(client.websocket.send_text(text), timeout=self.send_timeout)
+                except asyncio.TimeoutError:
+                    self._drop_slow(client, f"send took longer than {self.send_timeout}s")
+                    return
+                client.last_send_duration = time.monotonic() - started
+                client.sent += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # Bağlantı koptu; okuma döngüsü de kapanacak
+            await self.disconnect(client)
+
+    async def close(self):
+        for client in list(self.clients.values()):
+            await self.disconnect(client, 1001, "server shutting down")
+
+    def stats(self) -> dict:
+        clients = [client.stats() for client in self.clients.values()]
+        return {
+            "clients": len(clients),
+            "views": len(self._views),
+            "topics": len(self._topics),
+            "max_queue": self.max_queue,
+            "send_timeout": self.send_timeout,
+            "stall_timeout": self.stall_timeout,
+            "published": self.published,
+            "dropped": self.total_dropped + sum(client["dropped"] for client in clients),
+            "disconnected_slow": self.disconnected_slow,
+            "per_client": clients,
+        }
+
+
+# Global WebSocket broadcast hub
+broadcast_hub = BroadcastHub(
+    max_queue=settings.WS_CLIENT_QUEUE_SIZE,
+    send_timeout=settings.WS_SEND_TIMEOUT,
+    stall_timeout=settings.WS_STALL_TIMEOUT,
+)
@@ -0,0 +1,147 @@
+import logging
+import random
+import time
+from typing import Dict, Optional
+
+from ..core.config import settings
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    Tek bir cihaz için devre kesici.
+
+    Art arda failure_threshold hata sonrası devre açılır ve cihaz backoff
+    süresince hiç sorgulanmaz. Süre dolunca tek bir deneme (half-open)
+    yapılır; başarılı olursa devre kapanır, başarısız olursa backoff ikiye
+    katlanır (max_backoff ile sınırlı).
+    """
+
+    def __init__(self, failure_threshold: int = 3, base_backoff: float = 30,
+                 max_backoff: float = 900):
+        self.failure_threshold = failure_threshold
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.open_count = 0
+        self.opened_at: Optional[float] = None
+        self.retry_at: Optional[float] = None
+        self.last_failure: Optional[str] = None
+
+    def allow_request(self) -> bool:
+        """Whether a poll may run now; moves an expired open breaker to half-open"""
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN and time.monotonic() >= self.retry_at:
+            self.state = HALF_OPEN
+            return True
+        # Half-open denemesi zaten sürüyor veya backoff bitmedi
+        return False
+
+    @property
+    def is_half_open(self) -> bool:
+        return self.state == HALF_OPEN
+
+    def record_success(self):
+        if self.state != CLOSED:
+            logger.info(f"Circuit closed after {self.consecutive_failures} failures")
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.open_count = 0
+        self.opened_at = None
+        self.retry_at = None
+        self.last_failure = None
+
+    def record_failure(self, error: Optional[str] = None):
+        self.consecutive_failures += 1
+        self.last_failure = error
+        if self.state == HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            self.trip()
+
+    def trip(self):
+        """Open the circuit with the next backoff step"""
+        self.open_count += 1
+        backoff = min(self.base_backoff * (2 ** (self.open_count - 1)), self.max_backoff)
+        # Aynı anda düşen cihazların denemeleri üst üste binmesin
+        backoff *= random.uniform(0.9, 1.1)
+        now = time.monotonic()
+        self.state = OPEN
+        self.opened_at = now
+        self.retry_at = now + backoff
+
+    def snapshot(self) -> dict:
+        now = time.monotonic()
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "open_count": self.open_count,
+            "retry_in": round(max(0.0, self.retry_at - now), 1) if self.state == OPEN else None,
+            "open_for": round(now - self.opened_at, 1) if self.opened_at is not None else None,
+            "last_failure": self.last_failure,
+        }
+
+
+class BreakerRegistry:
+    """Circuit breakers keyed by device id"""
+
+    def __init__(self, failure_threshold: int = 3, base_backoff: float = 30,
+                 max_backoff: float = 900):
+        self.failure_threshold = failure_threshold
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.breakers: Dict[int, CircuitBreaker] = {}
+
+    def get(self, device_id: int) -> CircuitBreaker:
+        breaker = self.breakers.get(device_id)
+        if breaker is None:
+            breaker = CircuitBreaker(self.failure_threshold, self.base_backoff, self.max_backoff)
+            self.breakers[device_id] = breaker
+        return breaker
+
+    def seed(self, device_id: int, consecutive_failures: int):
+        """Restore failure count (MikrotikDevice.connection_attempts) after a restart"""
+        if device_id in self.breakers or not consecutive_failures:
+            return
+        breaker = self.get(device_id)
+        breaker.consecutive_failures = consecutive_failures
+        if consecutive_failures >= self.failure_threshold:
+            breaker.trip()
+
+    def remove(self, device_id: int):
+        self.breakers.pop(device_id, None)
+
+    def state_of(self, device_id: int) -> dict:
+        breaker = self.breakers.get(device_id)
+        if breaker is None:
+            return {"state": CLOSED, "consecutive_failures": 0, "open_count": 0,
+                    "retry_in": None, "open_for": None, "last_failure": None}
+        return breaker.snapshot()
+
+    def stats(self) -> dict:
+        counts = {CLOSED: 0, OPEN: 0, HALF_OPEN: 0}
+        tripped = {}
+        for device_id, breaker in self.breakers.items():
+            counts[breaker.state] += 1
+            if breaker.state != CLOSED:
+                tripped[device_id] = breaker.snapshot()
+        return {
+            "failure_threshold": self.failure_threshold,
+            "base_backoff": self.base_backoff,
+            "max_backoff": self.max_backoff,
+            "states": counts,
+            "devices": tripped,
+        }
+
+
+# Global breaker registry
+device_breakers = BreakerRegistry(
+    failure_threshold=settings.BREAKER_FAILURE_THRESHOLD,
+    base_backoff=settings.BREAKER_BASE_BACKOFF,
+    max_backoff=settings.BREAKER_MAX_BACKOFF,
+)
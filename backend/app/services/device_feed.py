@@ -0,0 +1,280 @@
+import asyncio
+import json
+import logging
+import time
+import uuid
+from collections import deque
+from datetime import datetime
+from typing import Any, Deque, Dict, FrozenSet, Optional, Set, Tuple
+
+from sqlalchemy.orm import Session
+
+from ..core.config import settings
+from ..models.mikrotik import MikrotikDevice
+from .broadcast import Subscription, broadcast_hub
+from .mikrotik_service import to_number
+
+logger = logging.getLogger(__name__)
+
+# Cihaz listesinde gösterilen, akışla güncel tutulan alanlar
+FEED_FIELDS = (
+    "name", "ip_address", "group_id", "group_name", "location", "router_board", "version",
+    "is_online", "last_seen", "last_error", "cpu_load", "uptime",
+)
+# Her poll'da ilerleyen alanlar; last_seen resolution kadar ilerleyince birlikte gönderilir
+HEARTBEAT_FIELDS = ("last_seen", "uptime")
+
+
+def _wire(value: Any) -> Any:
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+class DeviceFeed:
+    """
+    WebSocket istemcilerine giden cihaz durumu akışı.
+
+    Monitör her poll'da update() çağırır; burada son yayınlanan değerlerle
+    karşılaştırılır ve sadece değişen alanlar biriktirilir. tick_interval'de
+    bir kez, bir şey değiştiyse tek bir "devices_delta" frame'i yayınlanır:
+
+        {"type": "devices_delta", "epoch": "...", "prev_seq": 41, "seq": 42,
+         "timestamp": ..., "devices": {"7": {"is_online": false}}, "removed": [12]}
+
+    Her frame bir öncekine (prev_seq) bağlanır; zincir kopan ya da yeniden
+    bağlanan istemci son seq'ini göndererek resume() ile kaçırdıklarını tek
+    bir birleştirilmiş delta olarak alır. Kaçırılan frame'ler replay
+    tamponundan çıktıysa veya sunucu yeniden başladıysa (epoch farklı) tam
+    snapshot gönderilir.
+
+    İstemciler aboneliklerine (cihaz/grup) göre sadece kendi cihazlarını
+    alır. Frame'ler view (aynı abonelik) başına kurulur; bir view'ın
+    prev_seq'i o view'a giden son frame'in seq'idir, yani aradaki seq'lerde
+    view'ın cihazları değişmemiştir. Replay tamponu filtresiz tutulur,
+    resume() aboneliğe göre süzer.
+
+    last_seen ve uptime her başarılı poll'da ilerler, arayüz dakika
+    çözünürlüğünde gösterdiği için last_seen last_seen_resolution kadar
+    ilerleyince gönderilir; cpu_load da cpu_resolution puan değişince.
+    """
+
+    def __init__(self, tick_interval: float = 1, last_seen_resolution: float = 300,
+                 cpu_resolution: float = 5, replay_frames: int = 300):
+        self.tick_interval = tick_interval
+        self.last_seen_resolution = last_seen_resolution
+        self.cpu_resolution = cpu_resolution
+        # Sunucu her başladığında değişir, eski seq'ler yeni akışa uygulanmaz
+        self.epoch = uuid.uuid4().hex[:12]
+        self.state: Dict[int, Dict[str, Any]] = {}
+        self._pending: Dict[int, Dict[str, Any]] = {}
+        self._removed: Set[int] = set()
+        self._frames: Deque[dict] = deque(maxlen=replay_frames)
+        # view -> o view'a gönderilen son frame'in seq'i
+        self._view_seq: Dict[Subscription, int] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.seq = 0
+        self.updates = 0
+        self.unchanged = 0
+        self.frames = 0
+        self.last_frame_devices = 0
+        self.snapshots_sent = 0
+        self.replays_sent = 0
+
+    def load(self, db: Session):
+        """Fill the state from the database so the first snapshot is complete (startup)"""
+        rows = db.query(MikrotikDevice.id, *[getattr(MikrotikDevice, field) for field in FEED_FIELDS]).all()
+        self.state = {row.id: {field: getattr(row, field) for field in FEED_FIELDS} for row in rows}
+        for device_id, values in self.state.items():
+            broadcast_hub.set_device_groups(device_id, values["group_id"], values["group_name"])
+
+    def _changed(self, field: str, old: Any, new: Any) -> bool:
+        if field == "last_seen" and isinstance(old, datetime) and isinstance(new, datetime):
+            return abs((new - old).total_seconds()) >= self.last_seen_resolution
+        if field == "cpu_load":
+            old_load, new_load = to_number(old), to_number(new)
+            if old_load is not None and new_load is not None:
+                return abs(new_load - old_load) >= self.cpu_resolution
+        return old != new
+
+    def update(self, device_id: int, **values):
+        """Record a device's current fields; only differences are sent"""
+        self.updates += 1
+        current = self.state.get(device_id)
+        if current is None:
+            current = self.state[device_id] = {}
+            changes = values
+        else:
+            changes = {field: value for field, value in values.items()
+                       if field not in HEARTBEAT_FIELDS
+                       and (field not in current or self._changed(field, current[field], value))}
+            if "is_online" in changes or (
+                "last_seen" in values and self._changed("last_seen", current.get("last_seen"), values["last_seen"])
+            ):
+                changes.update({field: values[field] for field in HEARTBEAT_FIELDS
+                                if field in values and current.get(field) != values[field]})
+        if not changes:
+            self.unchanged += 1
+            return
+        current.update(changes)
+        if "group_id" in changes or "group_name" in changes:
+            broadcast_hub.set_device_groups(device_id, current.get("group_id"), current.get("group_name"))
+        self._pending.setdefault(device_id, {}).update(changes)
+        self._removed.discard(device_id)
+
+    def remove(self, device_id: int):
+        if self.state.pop(device_id, None) is not None:
+            self._pending.pop(device_id, None)
+            self._removed.add(device_id)
+
+    def flush(self) -> Optional[dict]:
+        """Publish one frame with everything changed since the last one"""
+        if not self._pending and not self._removed:
+            return None
+        self.seq += 1
+        frame = {
+            "type": "devices_delta",
+            "epoch": self.epoch,
+            "prev_seq": self.seq - 1,
+            "seq": self.seq,
+            "timestamp": time.time(),
+            "devices": {
+                device_id: {field: _wire(value) for field, value in changes.items()}
+                for device_id, changes in self._pending.items()
+            },
+            "removed": sorted(self._removed),
+        }
+        self._pending, self._removed = {}, set()
+        self._frames.append(frame)
+        self.frames += 1
+        self.last_frame_devices = len(frame["devices"])
+        self._publish(frame)
+        return frame
+
+    def _publish(self, frame: dict):
+        """Send each status view the part of the frame that concerns it"""
+        views: Dict[Subscription, Tuple[Dict[int, dict], list]] = {}
+        for device_id, changes in frame["devices"].items():
+            for view in broadcast_hub.views_for("status", device_id):
+                views.setdefault(view, ({}, []))[0][device_id] = changes
+        for device_id in frame["removed"]:
+            for view in broadcast_hub.views_for("status", device_id):
+                views.setdefault(view, ({}, []))[1].append(device_id)
+            # Grubu eşleştirmede kullanıldı, artık unutulabilir
+            broadcast_hub.forget_device(device_id)
+        texts: Dict[Tuple[FrozenSet[int], Tuple[int, ...], int], str] = {}
+        for view, (devices, removed) in views.items():
+            prev_seq = self._view_seq.get(view, frame["prev_seq"])
+            self._view_seq[view] = frame["seq"]
+            signature = (frozenset(devices), tuple(removed), prev_seq)
+            if signature not in texts:
+                texts[signature] = json.dumps(
+                    {**frame, "prev_seq": prev_seq, "devices": devices, "removed": removed}, default=str
+                )
+            broadcast_hub.send_view(view, texts[signature])
+        for view in [view for view in self._view_seq if not broadcast_hub.has_view(view)]:
+            del self._view_seq[view]
+
+    def _filter(self, devices: Dict[int, Any], subscription: Subscription) -> Dict[int, Any]:
+        if subscription.whole_fleet:
+            return devices
+        return {device_id: values for device_id, values in devices.items()
+                if subscription.matches(device_id, broadcast_hub.device_groups.get(device_id, ()))}
+
+    def snapshot(self, subscription: Subscription = Subscription()) -> dict:
+        """Full state of the subscribed devices at the current seq"""
+        self.snapshots_sent += 1
+        return {
+            "type": "devices_snapshot",
+            "epoch": self.epoch,
+            "seq": self.seq,
+            "timestamp": time.time(),
+            "devices": {
+                device_id: {field: _wire(value) for field, value in values.items()}
+                for device_id, values in self._filter(self.state, subscription).items()
+            },
+        }
+
+    def resume(self, last_seq: Optional[int] = None, epoch: Optional[str] = None,
+               subscription: Subscription = Subscription()) -> Optional[dict]:
+        """
+        Frame that brings a client from last_seq to the current seq.
+
+        The missed deltas merged into one devices_delta (prev_seq=last_seq) if
+        they are all still in the replay buffer, otherwise a snapshot; both
+        only contain the subscribed devices. None if status isn't subscribed.
+        Must be followed by hub.subscribe() without awaiting in between.
+        """
+        if "status" not in subscription.events:
+            return None
+        # Yeni view'ın zinciri buradan başlar
+        self._view_seq.setdefault(subscription, self.seq)
+        if epoch != self.epoch or not isinstance(last_seq, int) or last_seq > self.seq:
+            return self.snapshot(subscription)
+        if last_seq < self.seq and (not self._frames or self._frames[0]["prev_seq"] > last_seq):
+            # Boşluk tampondan büyük
+            return self.snapshot(subscription)
+        devices: Dict[Any, Dict[str, Any]] = {}
+        removed: Set[int] = set()
+        for frame in self._frames:
+            if frame["seq"] <= last_seq:
+                continue
+            for device_id in frame["removed"]:
+                devices.pop(device_id, None)
+                removed.add(device_id)
+            for device_id, changes in frame["devices"].items():
+                removed.discard(device_id)
+                devices.setdefault(device_id, {}).update(changes)
+        self.replays_sent += 1
+        return {
+            "type": "devices_delta",
+            "epoch": self.epoch,
+            "prev_seq": last_seq,
+            "seq": self.seq,
+            "timestamp": time.time(),
+            "devices": self._filter(devices, subscription),
+            "removed": sorted(removed),
+            "replay": True,
+        }
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(self.tick_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Error publishing device delta: {e}")
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "epoch": self.epoch,
+            "tick_interval": self.tick_interval,
+            "last_seen_resolution": self.last_seen_resolution,
+            "cpu_resolution": self.cpu_resolution,
+            "devices": len(self.state),
+            "seq": self.seq,
+            "replay_frames": len(self._frames),
+            "views": len(self._view_seq),
+            "updates": self.updates,
+            "unchanged": self.unchanged,
+            "frames": self.frames,
+            "last_frame_devices": self.last_frame_devices,
+            "snapshots_sent": self.snapshots_sent,
+            "replays_sent": self.replays_sent,
+        }
+
+
+# Global device delta feed
+device_feed = DeviceFeed(
+    tick_interval=settings.WS_TICK_INTERVAL,
+    last_seen_resolution=settings.WS_LAST_SEEN_RESOLUTION,
+    cpu_resolution=settings.WS_CPU_RESOLUTION,
+    replay_frames=settings.WS_REPLAY_FRAMES,
+)
@@ -0,0 +1,74 @@
+import logging
+from typing import Optional, Tuple
+
+from ..core.database import run_read
+from .circuit_breaker import device_breakers
+from .device_feed import device_feed
+from .device_state import device_state
+from .mikrotik_service import collect_device
+from .poll_plan import CONNECTION_TEST_PLAN, MONITOR_POLL_PLAN, PollPlan
+from .scheduler import poll_scheduler
+from .state_writer import DeviceTarget, PollOutcome, state_writer
+
+logger = logging.getLogger(__name__)
+
+
+async def poll_once(device_id: int, plan: PollPlan = MONITOR_POLL_PLAN) -> Optional[Tuple[DeviceTarget, PollOutcome]]:
+    """
+    Poll a device once through its circuit breaker and publish the result.
+
+    Zamanlanmış poll ve canlı izleme aynı yolu kullanır: backoff'taki cihaza
+    bağlanılmaz, half-open durumda önce ucuz bir deneme yapılır, sonuç
+    kesiciye işlenir, değişiklikler state_writer'a, durum device_feed'e
+    gider. Cihaz backoff'taysa veya silinmişse None döner.
+    """
+    breaker = device_breakers.get(device_id)
+    if not breaker.allow_request():
+        # Cihaz backoff'ta, bağlantı denemesi yapma
+        return None
+
+    try:
+        # Cihaz worker thread'de okunur, ağ beklenirken oturum açık kalmaz
+        target = await run_read(DeviceTarget.load, device_id)
+        if target is None:
+            poll_scheduler.remove(device_id)
+            device_breakers.remove(device_id)
+            return None
+
+        if breaker.is_half_open:
+            # Backoff sonrası önce ucuz bir deneme, başarılıysa tam poll
+            outcome = await collect_device(target, CONNECTION_TEST_PLAN)
+            if target.is_online:
+                state_writer.submit(outcome)
+                outcome = await collect_device(target, plan)
+        else:
+            outcome = await collect_device(target, plan)
+        state_writer.submit(outcome)
+
+        if target.is_online:
+            breaker.record_success()
+        else:
+            breaker.record_failure(target.last_error)
+            if breaker.state == "open":
+                logger.warning(
+                    f"Circuit open for {target.name}, next attempt in "
+                    f"{breaker.snapshot()['retry_in']}s"
+                )
+
+        # Device status goes out with the next delta frame, only if it changed
+        device_feed.update(
+            target.id,
+            name=target.name,
+            router_board=target.router_board,
+            version=target.version,
+            is_online=target.is_online,
+            last_seen=device_state.latest(target.id, "last_seen", target.last_seen),
+            last_error=target.last_error,
+            cpu_load=device_state.latest(target.id, "cpu_load"),
+            uptime=device_state.latest(target.id, "uptime")
+        )
+        return target, outcome
+    finally:
+        if breaker.is_half_open:
+            # Deneme beklenmedik şekilde yarıda kaldı, bir sonraki backoff'a geç
+            breaker.record_failure("half-open probe interrupted")
@@ -0,0 +1,195 @@
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from ..core.config import settings
+from ..core.database import SessionLocal, db_writer, grouped_update
+from ..models.mikrotik import MikrotikDevice
+from .fleet_stats import fleet_stats
+
+logger = logging.getLogger(__name__)
+
+# Her poll'da değişen, info diff'ine girmeyen alanlar
+VOLATILE_INFO_FIELDS = {
+    "cpu.cpu_load",
+    "system.uptime",
+    "system.uptime_raw",
+    "memory.free_memory",
+    "memory.free_hdd_space",
+}
+# Heartbeat ile toplu yazılan cihaz sütunları
+HEARTBEAT_FIELDS = ("last_seen", "uptime", "cpu_load", "cpu_load_pct")
+
+
+def normalize_info(info: dict) -> Dict[str, Any]:
+    """Flatten an info dict to 'section.key' -> value, without raw_data and volatile fields"""
+    flat = {}
+    for section, values in info.items():
+        if section == "raw_data" or not isinstance(values, dict):
+            continue
+        for key, value in values.items():
+            name = f"{section}.{key}"
+            if name not in VOLATILE_INFO_FIELDS:
+                flat[name] = value
+    return flat
+
+
+class DeviceStateTracker:
+    """
+    Poll'lar arasında cihaz durumunu bellekte tutar, böylece sadece değişenler
+    yazılır.
+
+    - Son normalize edilmiş info snapshot'ı: yeni poll sadece farkları döndürür,
+      loglara tam info yerine diff yazılır.
+    - last_seen / uptime / cpu_load her poll'da değişir; bunlar ORM'den
+      geçmeden burada biriktirilir ve heartbeat_interval'de bir tek
+      executemany UPDATE ile yazılır.
+    """
+
+    def __init__(self, heartbeat_interval: float = 30):
+        self.heartbeat_interval = heartbeat_interval
+        self.snapshots: Dict[int, Dict[str, Any]] = {}
+        self.interface_counts: Dict[int, int] = {}
+        self._pending: Dict[int, Dict[str, Any]] = {}
+        self._latest: Dict[int, Dict[str, Any]] = {}
+        self._last_write = time.monotonic()
+        self._task: Optional[asyncio.Task] = None
+        self.heartbeats_received = 0
+        self.heartbeats_written = 0
+        self.info_diffs = 0
+        self.info_unchanged = 0
+
+    # --- change detection ---
+
+    def diff_info(self, device_id: int, info: dict) -> Optional[Dict[str, List[Any]]]:
+        """
+        Compare info with the last snapshot and remember it.
+
+        Returns None for the first snapshot of a device, otherwise
+        {field: [old, new]} for the fields that changed (empty if none).
+        """
+        current = normalize_info(info)
+        previous = self.snapshots.get(device_id)
+        self.snapshots[device_id] = current
+        if previous is None:
+            return None
+        changes = {
+            name: [previous.get(name), value]
+            for name, value in current.items()
+            if previous.get(name) != value
+        }
+        for name in previous.keys() - current.keys():
+            changes[name] = [previous[name], None]
+        if changes:
+            self.info_diffs += 1
+        else:
+            self.info_unchanged += 1
+        return changes
+
+    def interfaces_changed(self, device_id: int, count: int) -> bool:
+        """Whether the interface count differs from the last poll"""
+        changed = self.interface_counts.get(device_id) != count
+        self.interface_counts[device_id] = count
+        return changed
+
+    # --- heartbeats ---
+
+    def heartbeat(self, device_id: int, **values):
+        """Queue last_seen/uptime/cpu_load for the next batched write"""
+        self._pending.setdefault(device_id, {}).update(values)
+        self._latest.setdefault(device_id, {}).update(values)
+        self.heartbeats_received += 1
+
+    def latest(self, device_id: int, field: str, default: Any = None) -> Any:
+        """Most recent heartbeat value, even if not written yet"""
+        return self._latest.get(device_id, {}).get(field, default)
+
+    @staticmethod
+    def _write(pending: Dict[int, Dict[str, Any]]):
+        db = SessionLocal()
+        try:
+            # Aynı sütun kümesine sahip cihazlar tek executemany ile yazılır
+            grouped_update(db, MikrotikDevice.__table__, pending)
+            db.commit()
+        finally:
+            db.close()
+
+    def _due(self) -> bool:
+        return time.monotonic() - self._last_write >= self.heartbeat_interval
+
+    def has_pending(self) -> bool:
+        """Whether heartbeats are waiting and the interval has passed"""
+        return bool(self._pending) and self._due()
+
+    def take_pending(self, force: bool = False) -> Dict[int, Dict[str, Any]]:
+        """
+        Hand over pending heartbeats once per interval (or now with force).
+
+        The poller's state writer calls this so heartbeats ride along in its
+        transaction instead of needing a commit of their own.
+        """
+        if not self._pending or not (force or self._due()):
+            return {}
+        pending, self._pending = self._pending, {}
+        self._last_write = time.monotonic()
+        self.heartbeats_written += len(pending)
+        return pending
+
+    def restore_pending(self, pending: Dict[int, Dict[str, Any]]):
+        """Put back heartbeats whose write failed; values queued since then win"""
+        for device_id, values in pending.items():
+            self._pending[device_id] = {**values, **self._pending.get(device_id, {})}
+        self.heartbeats_written -= len(pending)
+
+    async def flush(self, force: bool = False) -> int:
+        pending = self.take_pending(force)
+        if not pending:
+            return 0
+        try:
+            await db_writer.run(self._write, pending)
+        except Exception:
+            self.restore_pending(pending)
+            raise
+        fleet_stats.apply_updates(pending)
+        return len(pending)
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Failed to write device heartbeats: {e}")
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._flush_loop())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self.flush(force=True)
+
+    def remove_device(self, device_id: int):
+        self.snapshots.pop(device_id, None)
+        self.interface_counts.pop(device_id, None)
+        self._pending.pop(device_id, None)
+        self._latest.pop(device_id, None)
+
+    def stats(self) -> dict:
+        return {
+            "heartbeat_interval": self.heartbeat_interval,
+            "devices": len(self.snapshots),
+            "pending_heartbeats": len(self._pending),
+            "heartbeats_received": self.heartbeats_received,
+            "heartbeats_written": self.heartbeats_written,
+            "info_diffs": self.info_diffs,
+            "info_unchanged": self.info_unchanged,
+        }
+
+
+# Global device state tracker
+device_state = DeviceStateTracker(heartbeat_interval=settings.DEVICE_HEARTBEAT_INTERVAL)
@@ -0,0 +1,222 @@
+import heapq
+import logging
+import threading
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from ..core.config import settings
+from ..models.mikrotik import DeviceLog, MikrotikDevice
+
+logger = logging.getLogger(__name__)
+
+# /stats'ta görünen cihaz sütunları
+DEVICE_FIELDS = ("name", "ip_address", "group_name", "is_online", "cpu_load", "cpu_load_pct", "last_seen")
+LOG_FIELDS = ("id", "device_id", "log_level", "message", "command", "response", "timestamp", "repeat_count")
+
+
+class FleetStats:
+    """
+    /stats için bellekte artımlı tutulan filo özeti.
+
+    Cihaz durumu DB'ye yazıldıkça (state writer ve log writer commit'ten
+    sonra, API cihaz ekleyip sildiğinde) güncellenir; /stats sorgu
+    çalıştırmadan hazır snapshot'ı döner:
+    - online/offline sayaçları ve grup başına cihaz sayısı
+    - online cihazların CPU'su için max-heap; eski girişler okunurken atılır
+    - en yeni logların halkası
+
+    Görünen her değişiklik version'ı artırır, snapshot version başına bir kez
+    kurulur. İstemciler aynı version'da yeniden çizmeyi atlayabilir.
+    Başlangıçta load() ile DB'den doldurulur.
+    """
+
+    def __init__(self, top_k: int = 10, recent_logs: int = 10):
+        self.top_k = top_k
+        self.recent_logs = recent_logs
+        # API endpoint'leri threadpool'da, yazıcılar event loop'ta günceller
+        self._lock = threading.Lock()
+        self._devices: Dict[int, Dict[str, Any]] = {}
+        self._online = 0
+        self._groups: Counter = Counter()
+        self._cpu_heap: List[Tuple[float, int]] = []
+        self._logs: List[Dict[str, Any]] = []  # en yenisi başta
+        self._snapshot: Optional[dict] = None
+        self.version = 0
+        self.loaded = False
+        self.updates = 0
+        self.snapshots_built = 0
+
+    # --- loading ---
+
+    def load(self, db: Session):
+        """Rebuild everything from the database (startup)"""
+        rows = db.query(MikrotikDevice.id, *[getattr(MikrotikDevice, field) for field in DEVICE_FIELDS]).all()
+        logs = db.query(DeviceLog).order_by(DeviceLog.timestamp.desc(), DeviceLog.id.desc()) \
+            .limit(self.recent_logs).all()
+        with self._lock:
+            self._devices = {}
+            self._online = 0
+            self._groups = Counter()
+            self._cpu_heap = []
+            for row in rows:
+                self._add(row.id, {field: getattr(row, field) for field in DEVICE_FIELDS})
+            self._logs = [{field: getattr(log, field) for field in LOG_FIELDS} for log in logs]
+            self._changed()
+            self.loaded = True
+        logger.info(f"Fleet stats loaded: {len(rows)} devices, {self._online} online")
+
+    # --- device changes ---
+
+    def _add(self, device_id: int, values: Dict[str, Any]):
+        device = {field: values.get(field) for field in DEVICE_FIELDS}
+        self._devices[device_id] = device
+        self._online += bool(device["is_online"])
+        self._groups[device["group_name"]] += 1
+        self._push_cpu(device_id, device)
+
+    def _drop(self, device_id: int) -> Optional[Dict[str, Any]]:
+        device = self._devices.pop(device_id, None)
+        if device is not None:
+            self._online -= bool(device["is_online"])
+            self._groups[device["group_name"]] -= 1
+            if self._groups[device["group_name"]] <= 0:
+                del self._groups[device["group_name"]]
+            # Heap girişi okunurken geçersiz sayılır
+        return device
+
+    def _update(self, device_id: int, values: Dict[str, Any]) -> bool:
+        device = self._devices.get(device_id)
+        if device is None:
+            # Silinmiş (veya henüz yüklenmemiş) cihaz
+            return False
+        changes = {field: value for field, value in values.items()
+                   if field in device and device[field] != value}
+        if not changes:
+            return False
+        if "is_online" in changes:
+            self._online += bool(changes["is_online"]) - bool(device["is_online"])
+        if "group_name" in changes:
+            self._groups[device["group_name"]] -= 1
+            if self._groups[device["group_name"]] <= 0:
+                del self._groups[device["group_name"]]
+            self._groups[changes["group_name"]] += 1
+        device.update(changes)
+        if "is_online" in changes or "cpu_load_pct" in changes:
+            self._push_cpu(device_id, device)
+        return True
+
+    def _push_cpu(self, device_id: int, device: Dict[str, Any]):
+        if device["is_online"] and device["cpu_load_pct"] is not None:
+            heapq.heappush(self._cpu_heap, (-device["cpu_load_pct"], device_id))
+            if len(self._cpu_heap) > 2 * len(self._devices) + 64:
+                self._compact_heap()
+
+    def _compact_heap(self):
+        self._cpu_heap = [(-device["cpu_load_pct"], device_id) for device_id, device in self._devices.items()
+                          if device["is_online"] and device["cpu_load_pct"] is not None]
+        heapq.heapify(self._cpu_heap)
+
+    def _changed(self):
+        self.version += 1
+        self._snapshot = None
+
+    def upsert_device(self, device: Any):
+        """Add or refresh a device from an ORM object or dict (API create/update)"""
+        if isinstance(device, dict):
+            device_id, values = device["id"], device
+        else:
+            device_id, values = device.id, {field: getattr(device, field) for field in DEVICE_FIELDS}
+        with self._lock:
+            if device_id in self._devices:
+                changed = self._update(device_id, values)
+            else:
+                self._add(device_id, values)
+                changed = True
+            if changed:
+                self._changed()
+
+    def remove_device(self, device_id: int):
+        with self._lock:
+            if self._drop(device_id) is None:
+                return
+            # Silinen cihazın logları /stats'tan da kalkar
+            self._logs = [log for log in self._logs if log["device_id"] != device_id]
+            self._changed()
+
+    def apply_updates(self, updates: Dict[int, Dict[str, Any]]):
+        """Apply committed device column changes (device_id -> {column: value})"""
+        with self._lock:
+            changed = False
+            for device_id, values in updates.items():
+                changed = self._update(device_id, values) or changed
+            self.updates += len(updates)
+            if changed:
+                self._changed()
+
+    # --- logs ---
+
+    def add_logs(self, logs: Iterable[Dict[str, Any]], ids: Iterable[int]):
+        """Add committed log records; ids are the row ids assigned by the INSERT"""
+        records = [{**{field: log.get(field) for field in LOG_FIELDS}, "id": log_id,
+                    "repeat_count": log.get("repeat_count") or 1}
+                   for log, log_id in zip(logs, ids)]
+        if not records:
+            return
+        with self._lock:
+            newest = heapq.nlargest(self.recent_logs, records + self._logs,
+                                    key=lambda log: (log["timestamp"], log["id"]))
+            if [log["id"] for log in newest] != [log["id"] for log in self._logs]:
+                self._logs = newest
+                self._changed()
+
+    # --- reading ---
+
+    def _top_cpu(self) -> List[Dict[str, Any]]:
+        """Pop valid entries for the top K, drop stale ones, push the valid ones back"""
+        top, taken, valid = [], set(), []
+        while self._cpu_heap and len(top) < self.top_k:
+            entry = heapq.heappop(self._cpu_heap)
+            load, device_id = -entry[0], entry[1]
+            device = self._devices.get(device_id)
+            if (device is None or not device["is_online"] or device["cpu_load_pct"] != load
+                    or device_id in taken):
+                continue
+            taken.add(device_id)
+            valid.append(entry)
+            top.append({"id": device_id, **device})
+        for entry in valid:
+            heapq.heappush(self._cpu_heap, entry)
+        return top
+
+    def snapshot(self) -> dict:
+        """/stats response; rebuilt only when the version changed"""
+        with self._lock:
+            if self._snapshot is None:
+                total = len(self._devices)
+                self._snapshot = {
+                    "version": self.version,
+                    "total_devices": total,
+                    "online_devices": self._online,
+                    "offline_devices": total - self._online,
+                    "groups": dict(self._groups),
+                    "recent_logs": list(self._logs),
+                    "high_cpu_devices": self._top_cpu(),
+                }
+                self.snapshots_built += 1
+            return self._snapshot
+
+    def stats(self) -> dict:
+        return {
+            "loaded": self.loaded,
+            "version": self.version,
+            "devices": len(self._devices),
+            "cpu_heap_size": len(self._cpu_heap),
+            "updates": self.updates,
+            "snapshots_built": self.snapshots_built,
+        }
+
+
+# Global fleet statistics
+fleet_stats = FleetStats(top_k=settings.FLEET_STATS_TOP_K, recent_logs=settings.FLEET_STATS_RECENT_LOGS)
@@ -0,0 +1,156 @@
+import asyncio
+import logging
+import time
+from typing import Dict, FrozenSet, Iterable, Set
+
+from ..core.config import settings
+from .broadcast import broadcast_hub
+from .device_poller import poll_once
+
+logger = logging.getLogger(__name__)
+
+
+class LiveWatch:
+    """
+    Detay sayfasında izlenen cihazlar için paylaşılan canlı toplayıcılar.
+
+    WebSocket istemcisi "live" olayına cihaz id'leriyle abone olunca cihaz
+    izlenmeye başlar. Her izlenen cihaz için tek bir task interval'de bir
+    monitör poll'u çalıştırır (tek round trip), sonucu state_writer ile
+    yazar ve "device_live" mesajı olarak o cihazı izleyen herkese yayınlar.
+    Aynı router'a bakan beş kişi beş kat değil tek bir toplama yükü getirir.
+    Son izleyici ayrılınca task durdurulur. max_devices doluyken istenen
+    cihazlar sıraya alınır ve bir task durunca sırayla başlatılır.
+
+    Toplama zamanlanmış poll ile aynı poll_once yolundan geçer: backoff'taki
+    cihaz için bağlantı denenmez (her 2 saniyede bir hata logu yazılmaz),
+    sonuç kesiciye işlenir ve durum device_feed ile liste istemcilerine de
+    gider.
+    """
+
+    def __init__(self, interval: float = 2, max_devices: int = 50):
+        self.interval = interval
+        self.max_devices = max_devices
+        # cihaz -> izleyen istemci id'leri
+        self._watchers: Dict[int, Set[int]] = {}
+        # istemci -> izlediği cihazlar
+        self._watching: Dict[int, FrozenSet[int]] = {}
+        self._tasks: Dict[int, asyncio.Task] = {}
+        # Limit doluyken istenen cihaz -> izleyenler, yer açılınca sırayla başlar
+        self._waiting: Dict[int, Set[int]] = {}
+        self.collections = 0
+        self.failures = 0
+        self.skipped = 0
+        self.started = 0
+        self.stopped = 0
+        self.queued = 0
+
+    def set_watched(self, watcher_id: int, device_ids: Iterable[int]):
+        """Replace the devices a client watches; an empty set stops watching"""
+        old = self._watching.pop(watcher_id, frozenset())
+        new = frozenset(device_ids)
+        if new:
+            self._watching[watcher_id] = new
+        for device_id in old - new:
+            waiting = self._waiting.get(device_id)
+            if waiting is not None:
+                waiting.discard(watcher_id)
+                if not waiting:
+                    del self._waiting[device_id]
+                continue
+            watchers = self._watchers.get(device_id)
+            if watchers is None:
+                continue
+            watchers.discard(watcher_id)
+            if not watchers:
+                # Son izleyici gitti
+                del self._watchers[device_id]
+                self._stop(device_id)
+        # Boşalan yerler önce sırada bekleyenlere
+        self._start_waiting()
+        for device_id in new - old:
+            watchers = self._watchers.get(device_id)
+            if watchers is None:
+                if len(self._watchers) >= self.max_devices:
+                    if device_id not in self._waiting:
+                        self.queued += 1
+                        logger.warning(f"Live watch limit reached ({self.max_devices}), device {device_id} queued")
+                    self._waiting.setdefault(device_id, set()).add(watcher_id)
+                    continue
+                watchers = self._watchers[device_id] = set()
+                self._start(device_id)
+            watchers.add(watcher_id)
+
+    def _start_waiting(self):
+        """Start queued devices, oldest first, while there are free slots"""
+        while self._waiting and len(self._watchers) < self.max_devices:
+            device_id = next(iter(self._waiting))
+            self._watchers[device_id] = self._waiting.pop(device_id)
+            self._start(device_id)
+
+    def _start(self, device_id: int):
+        self._tasks[device_id] = asyncio.create_task(self._loop(device_id))
+        self.started += 1
+
+    def _stop(self, device_id: int):
+        task = self._tasks.pop(device_id, None)
+        if task is not None:
+            task.cancel()
+            self.stopped += 1
+
+    async def _loop(self, device_id: int):
+        while True:
+            started = time.monotonic()
+            try:
+                await self.collect(device_id)
+            except Exception as e:
+                self.failures += 1
+                logger.error(f"Error collecting live data for device {device_id}: {e}")
+            # Aralık toplamanın başından sayılır, yavaş cihazda üst üste binmez
+            await asyncio.sleep(max(0.0, self.interval - (time.monotonic() - started)))
+
+    async def collect(self, device_id: int):
+        """Poll the device once, write the result and fan it out to its watchers"""
+        polled = await poll_once(device_id)
+        if polled is None:
+            # Cihaz backoff'ta (ya da silinmiş), bu tick'te bağlantı denenmedi
+            self.skipped += 1
+            return
+        target, outcome = polled
+        self.collections += 1
+        info = outcome.info and {key: value for key, value in outcome.info.items() if key != "raw_data"}
+        broadcast_hub.publish_device("live", device_id, {
+            "type": "device_live",
+            "device_id": device_id,
+            "timestamp": time.time(),
+            "is_online": target.is_online,
+            "last_error": target.last_error,
+            "system_info": info,
+            "interfaces": outcome.interfaces,
+        })
+
+    async def close(self):
+        for device_id in list(self._tasks):
+            self._stop(device_id)
+        self._watchers.clear()
+        self._waiting.clear()
+        self._watching.clear()
+
+    def stats(self) -> dict:
+        return {
+            "interval": self.interval,
+            "max_devices": self.max_devices,
+            "devices": {device_id: len(watchers) for device_id, watchers in self._watchers.items()},
+            "waiting": {device_id: len(watchers) for device_id, watchers in self._waiting.items()},
+            "watchers": len(self._watching),
+            "collections": self.collections,
+            "failures": self.failures,
+            "skipped": self.skipped,
+            "started": self.started,
+            "stopped": self.stopped,
+            "queued": self.queued,
+        }
+
+
+# Global live collectors for watched devices
+live_watch = LiveWatch(interval=settings.LIVE_WATCH_INTERVAL, max_devices=settings.LIVE_WATCH_MAX_DEVICES)
@@ -0,0 +1,360 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import select
+
+from ..core.config import settings
+from ..core.database import SessionLocal
+from ..models.mikrotik import DeviceLog
+
+logger = logging.getLogger(__name__)
+
+INDEX_FILE = "index.json"
+SEGMENT_SUFFIX = ".ndjson.z"
+DEFAULT_LEVEL = "default"
+
+
+def _row_to_record(row) -> Dict[str, Any]:
+    record = dict(row._mapping)
+    record["timestamp"] = record["timestamp"].isoformat() if record["timestamp"] else None
+    return record
+
+
+def _parse_ts(value: Optional[str]) -> Optional[datetime]:
+    return datetime.fromisoformat(value) if value else None
+
+
+class LogArchive:
+    """
+    Eski DeviceLog kayıtları için sıkıştırılmış soğuk arşiv.
+
+    Neyin canlı tablodan çıkacağına LogRetentionEngine'in seviye başına
+    politikası karar verir; arşiv açıksa süresi dolan satırlar silinmek
+    yerine move_chunk() ile buraya taşınır. Kayıtlar gün ve seviyeye göre
+    NDJSON + zlib segment dosyalarına yazılır. index.json her segmentin
+    gününü, seviyesini, zaman aralığını, satır sayısını ve içerdiği
+    cihazları tutar; sorgular sadece ilgili segmentleri açar. Segmentler
+    seviyenin arşiv saklama süresi dolunca silinir.
+
+    Her gün + seviye için tek segment vardır; her parça dosyanın sonuna ayrı
+    bir zlib akışı olarak eklenir ve fsync edilir, sonra satırlar silinir.
+    index.json bellekte güncellenir ve çalışma başına bir kez yazılır
+    (save_index). Arada kesilirse açılışta reconcile() index'te olmayan veya
+    boyutu tutmayan segmentleri dosyadan yeniden hesaplar ve yarım kalmış son
+    akışı keser; aynı satırlar tekrar arşivlenmiş olabilir, okuma tarafı
+    id'ye göre tekilleştirir.
+    """
+
+    def __init__(self, root: str, retention: Optional[Dict[str, int]] = None, interval: float = 3600):
+        self.root = root
+        self.retention = dict(retention or {DEFAULT_LEVEL: 365 * 86400})
+        self.interval = interval
+        self._index_lock = threading.Lock()
+        self.segments: List[Dict[str, Any]] = self._load_index()
+        self._index_dirty = False
+        self._task: Optional[asyncio.Task] = None
+        self.archived = 0
+        self.last_run: Optional[dict] = None
+
+    # --- index ---
+
+    def _load_index(self) -> List[Dict[str, Any]]:
+        path = os.path.join(self.root, INDEX_FILE)
+        if not os.path.exists(path):
+            return []
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.error(f"Log archive index unreadable, starting empty: {e}")
+            return []
+
+    def _save_index(self):
+        os.makedirs(self.root, exist_ok=True)
+        path = os.path.join(self.root, INDEX_FILE)
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.segments, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+        self._index_dirty = False
+
+    def save_index(self):
+        """Write index.json if segments changed since the last save (once per archive run)"""
+        with self._index_lock:
+            if self._index_dirty:
+                self._save_index()
+
+    def reconcile(self) -> int:
+        """
+        Bring the index in line with the segment files after an interrupted run.
+
+        Segments missing from the index or whose size differs are re-read;
+        a torn trailing stream is cut off so later appends stay readable.
+        Returns the number of segments fixed.
+        """
+        if not os.path.isdir(self.root):
+            return 0
+        fixed = 0
+        with self._index_lock:
+            by_file = {segment["file"]: segment for segment in self.segments}
+            for day in sorted(os.listdir(self.root)):
+                directory = os.path.join(self.root, day)
+                if not os.path.isdir(directory):
+                    continue
+                for name in os.listdir(directory):
+                    if not name.endswith(SEGMENT_SUFFIX):
+                        continue
+                    file = f"{day}/{name}"
+                    path = os.path.join(directory, name)
+                    segment = by_file.get(file)
+                    if segment is not None and segment["bytes"] == os.path.getsize(path):
+                        continue
+                    records, valid = self._read_streams(path)
+                    if valid < os.path.getsize(path):
+                        with open(path, "r+b") as f:
+                            f.truncate(valid)
+                    if segment is not None:
+                        self.segments.remove(segment)
+                    if records:
+                        self.segments.append(self._summary(file, day, name[:-len(SEGMENT_SUFFIX)], records, valid))
+                    fixed += 1
+            if fixed:
+                self._save_index()
+                logger.warning(f"Log archive index rebuilt for {fixed} segments")
+        return fixed
+
+    # --- writing ---
+
+    @staticmethod
+    def _summary(file: str, day: str, level: str, records: List[Dict[str, Any]], size: int) -> Dict[str, Any]:
+        timestamps = [record["timestamp"] for record in records if record["timestamp"]]
+        return {
+            "file": file,
+            "day": day,
+            "level": level,
+            "start": min(timestamps, default=None),
+            "end": max(timestamps, default=None),
+            "rows": len(records),
+            "bytes": size,
+            "device_ids": sorted({record["device_id"] for record in records if record["device_id"] is not None}),
+        }
+
+    def _append_segment(self, day: str, level: str, records: List[Dict[str, Any]]):
+        """Append records to the day's segment of a level as one more zlib stream"""
+        directory = os.path.join(self.root, day)
+        os.makedirs(directory, exist_ok=True)
+        name = f"{level}{SEGMENT_SUFFIX}"
+        payload = zlib.compress(
+            "".join(json.dumps(record, default=str) + "\n" for record in records).encode("utf-8"), 6
+        )
+        # Ekleme kilit altında: reconcile() yazılmakta olan dosyayı yarım sanıp kesmesin
+        with self._index_lock:
+            with open(os.path.join(directory, name), "ab") as f:
+                f.write(payload)
+                f.flush()
+                os.fsync(f.fileno())
+                size = f.tell()
+            added = self._summary(f"{day}/{name}", day, level, records, size)
+            segment = next((segment for segment in self.segments if segment["file"] == added["file"]), None)
+            if segment is None:
+                self.segments.append(added)
+            else:
+                segment["start"] = min(filter(None, (segment["start"], added["start"])), default=None)
+                segment["end"] = max(filter(None, (segment["end"], added["end"])), default=None)
+                segment["rows"] += added["rows"]
+                segment["bytes"] = size
+                segment["device_ids"] = sorted(set(segment["device_ids"]) | set(added["device_ids"]))
+            self._index_dirty = True
+
+    def _segment_level(self, level: Optional[str]) -> str:
+        # Politikası olmayan seviyeler "default" segmentlerine gider
+        return level if level in self.retention and level != DEFAULT_LEVEL else DEFAULT_LEVEL
+
+    def move_chunk(self, condition, limit: int) -> int:
+        """
+        Archive up to limit logs matching condition, then delete them (writer thread).
+
+        LogRetentionEngine calls this instead of deleting expired rows.
+        """
+        table = DeviceLog.__table__
+        db = SessionLocal()
+        try:
+            rows = db.execute(
+                select(table).where(condition).order_by(table.c.timestamp, table.c.id).limit(limit)
+            ).all()
+            if not rows:
+                return 0
+
+            groups: Dict[Tuple[str, str], List[Dict[str, Any]]] = {}
+            for row in rows:
+                record = _row_to_record(row)
+                day = (record["timestamp"] or "unknown")[:10]
+                groups.setdefault((day, self._segment_level(record["log_level"])), []).append(record)
+
+            for (day, level), records in groups.items():
+                self._append_segment(day, level, records)
+
+            # Ancak kayıtlar segmentte (fsync) iken canlı tablodan sil; index run sonunda yazılır
+            db.execute(table.delete().where(table.c.id.in_([row.id for row in rows])))
+            db.commit()
+            self.archived += len(rows)
+            return len(rows)
+        finally:
+            db.close()
+
+    def _keep_for(self, segment: Dict[str, Any]) -> int:
+        level = segment.get("level", DEFAULT_LEVEL)
+        return self.retention.get(level, self.retention.get(DEFAULT_LEVEL, 0))
+
+    def _prune_segments(self, now: datetime) -> int:
+        """Drop whole segments older than their level's archive retention"""
+        with self._index_lock:
+            expired = [
+                segment for segment in self.segments
+                if self._keep_for(segment) and segment["end"]
+                and segment["end"] < (now - timedelta(seconds=self._keep_for(segment))).isoformat()
+            ]
+            if not expired:
+                return 0
+            self.segments = [segment for segment in self.segments if segment not in expired]
+            self._save_index()
+        for segment in expired:
+            try:
+                os.remove(os.path.join(self.root, segment["file"]))
+            except FileNotFoundError:
+                pass
+        return len(expired)
+
+    async def run(self) -> dict:
+        """Drop expired segments (archiving itself runs inside log retention)"""
+        started = time.monotonic()
+        pruned = await asyncio.to_thread(self._prune_segments, datetime.utcnow())
+        self.last_run = {
+            "finished_at": datetime.utcnow().isoformat(),
+            "duration": round(time.monotonic() - started, 3),
+            "segments_pruned": pruned,
+        }
+        if pruned:
+            logger.info(f"Log archive: pruned {pruned} segments")
+        return self.last_run
+
+    # --- reading ---
+
+    @staticmethod
+    def _read_streams(path: str) -> Tuple[List[Dict[str, Any]], int]:
+        """Records of every complete zlib stream in a segment, and the bytes they span"""
+        with open(path, "rb") as f:
+            data = f.read()
+        records: List[Dict[str, Any]] = []
+        offset = 0
+        while offset < len(data):
+            stream = zlib.decompressobj()
+            try:
+                text = stream.decompress(data[offset:])
+            except zlib.error:
+                break
+            if not stream.eof:
+                # Yarım kalmış son ekleme
+                break
+            records.extend(json.loads(line) for line in text.decode("utf-8").splitlines() if line)
+            offset = len(data) - len(stream.unused_data)
+        return records, offset
+
+    def _read_segment(self, segment: Dict[str, Any]) -> List[Dict[str, Any]]:
+        records, _ = self._read_streams(os.path.join(self.root, segment["file"]))
+        # Parçalar zaman sırasıyla eklenir ama "default" birden fazla seviyeden dolar
+        records.sort(key=lambda record: (record["timestamp"] or "", record["id"]))
+        return records
+
+    def iter_logs(self, device_id: int, start: Optional[datetime] = None, end: Optional[datetime] = None,
+                  level: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Yield archived logs of a device, newest first.
+
+        Segments are opened lazily, so a caller that stops early only pays
+        for the segments it actually read.
+        """
+        start_iso = start.isoformat() if start else None
+        end_iso = end.isoformat() if end else None
+        with self._index_lock:
+            segments = [
+                segment for segment in self.segments
+                if device_id in segment["device_ids"]
+                and not (start_iso and segment["end"] and segment["end"] < start_iso)
+                and not (end_iso and segment["start"] and segment["start"] >= end_iso)
+            ]
+        segments.sort(key=lambda segment: (segment["end"] or "", segment["file"]), reverse=True)
+
+        seen = set()
+        for segment in segments:
+            try:
+                records = self._read_segment(segment)
+            except (OSError, zlib.error, ValueError) as e:
+                logger.error(f"Skipping unreadable log segment {segment['file']}: {e}")
+                continue
+            for record in reversed(records):
+                if record["device_id"] != device_id or record["id"] in seen:
+                    continue
+                if level and record["log_level"] != level:
+                    continue
+                timestamp = record["timestamp"]
+                if (start_iso and timestamp < start_iso) or (end_iso and timestamp >= end_iso):
+                    continue
+                seen.add(record["id"])
+                record["timestamp"] = _parse_ts(timestamp)
+                yield record
+
+    # --- lifecycle ---
+
+    async def _loop(self):
+        try:
+            await asyncio.to_thread(self.reconcile)
+        except Exception as e:
+            logger.error(f"Error reconciling log archive index: {e}")
+        while True:
+            try:
+                await self.run()
+            except Exception as e:
+                logger.error(f"Error in log archive: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def stats(self) -> dict:
+        with self._index_lock:
+            segments = list(self.segments)
+        return {
+            "root": self.root,
+            "retention": self.retention,
+            "segments": len(segments),
+            "rows": sum(segment["rows"] for segment in segments),
+            "bytes": sum(segment["bytes"] for segment in segments),
+            "oldest": min((segment["start"] for segment in segments if segment["start"]), default=None),
+            "newest": max((segment["end"] for segment in segments if segment["end"]), default=None),
+            "archived_since_start": self.archived,
+            "last_run": self.last_run,
+        }
+
+
+# Global log archive
+log_archive = LogArchive(
+    root=settings.LOG_ARCHIVE_DIR,
+    retention=settings.LOG_ARCHIVE_RETENTION,
+    interval=settings.LOG_ARCHIVE_INTERVAL,
+)
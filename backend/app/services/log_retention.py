@@ -0,0 +1,314 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, bindparam, func, or_, select, text
+
+from ..core.config import settings
+from ..core.database import ReadSessionLocal, SessionLocal, db_writer
+from ..models.mikrotik import DeviceLog
+from .log_archive import LogArchive, log_archive
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LEVEL = "default"
+
+
+class LogRetentionEngine:
+    """
+    device_logs tablosunun büyümesini sınırlar.
+
+    - Seviye başına saklama süresi (info 7 gün, error 90 gün gibi); süresi
+      dolan kayıtlar küçük parçalar halinde silinir, her parça ayrı ve kısa bir
+      transaction'dır ve parçalar arasında beklenir, böylece log yazıcısı ve
+      poll'lar DB kilidini uzun süre beklemez. archive verilmişse silinmek
+      yerine aynı parçalarla soğuk arşive taşınır.
+    - collapse_after'dan eski, aynı cihazın aynı bucket içinde tekrarlanan info
+      mesajları tek satıra indirilir; silinen kopyalar kalan satırın
+      repeat_count'una eklenir. response taşıyan satırlar (örn. "Device
+      info changed" diff'leri) her biri ayrı veri olduğu için birleştirilmez.
+    - Her çalışmanın sonunda silinen/birleştirilen satırlar ve geri kazanılan
+      alan raporlanır.
+    """
+
+    def __init__(self, retention: Optional[Dict[str, int]] = None, collapse_after: int = 3600,
+                 collapse_bucket: int = 3600, interval: float = 600, chunk_size: int = 2000,
+                 pause: float = 0.05, archive: Optional[LogArchive] = None):
+        self.retention = dict(retention or {DEFAULT_LEVEL: 30 * 86400})
+        self.archive = archive
+        self.collapse_after = collapse_after
+        self.collapse_bucket = collapse_bucket
+        self.interval = interval
+        self.chunk_size = chunk_size
+        self.pause = pause
+        self._task: Optional[asyncio.Task] = None
+        self._run_lock = asyncio.Lock()
+        # Bu noktadan önceki bucket'lar zaten birleştirildi
+        self._collapsed_until: Optional[datetime] = None
+        self.last_report: Optional[dict] = None
+        self.total_deleted = 0
+        self.total_collapsed = 0
+
+    # --- retention ---
+
+    def _level_filters(self, now: datetime) -> List[Tuple[str, object]]:
+        table = DeviceLog.__table__
+        explicit = [level for level in self.retention if level != DEFAULT_LEVEL]
+        filters = []
+        for level in explicit:
+            cutoff = now - timedelta(seconds=self.retention[level])
+            filters.append((level, and_(table.c.log_level == level, table.c.timestamp < cutoff)))
+        if DEFAULT_LEVEL in self.retention:
+            cutoff = now - timedelta(seconds=self.retention[DEFAULT_LEVEL])
+            filters.append((DEFAULT_LEVEL, and_(
+                or_(table.c.log_level.notin_(explicit), table.c.log_level.is_(None)),
+                table.c.timestamp < cutoff
+            )))
+        return filters
+
+    def _delete_chunk(self, condition) -> int:
+        table = DeviceLog.__table__
+        db = SessionLocal()
+        try:
+            chunk = select(table.c.id).where(condition).limit(self.chunk_size)
+            result = db.execute(table.delete().where(table.c.id.in_(chunk)))
+            db.commit()
+            return result.rowcount
+        finally:
+            db.close()
+
+    def _archive_chunk(self, condition) -> int:
+        return self.archive.move_chunk(condition, self.chunk_size)
+
+    async def prune(self, now: Optional[datetime] = None) -> Dict[str, int]:
+        """Remove expired logs per level from the live table (archived if enabled), chunk by chunk"""
+        remove_chunk = self._delete_chunk if self.archive is None else self._archive_chunk
+        deleted: Dict[str, int] = {}
+        try:
+            for level, condition in self._level_filters(now or datetime.utcnow()):
+                deleted[level] = 0
+                while True:
+                    count = await db_writer.run(remove_chunk, condition)
+                    deleted[level] += count
+                    if count < self.chunk_size:
+                        break
+                    # Diğer yazıcılara sıra ver
+                    await asyncio.sleep(self.pause)
+        finally:
+            if self.archive is not None:
+                # Arşiv index'i parça başına değil, çalışma başına bir kez yazılır
+                await asyncio.to_thread(self.archive.save_index)
+        return deleted
+
+    # --- collapsing ---
+
+    def _collapse_start(self, before: datetime) -> Optional[datetime]:
+        table = DeviceLog.__table__
+        db = ReadSessionLocal()
+        try:
+            first = db.execute(
+                select(func.min(table.c.timestamp)).where(
+                    table.c.log_level == "info", table.c.timestamp < before
+                )
+            ).scalar()
+        finally:
+            db.close()
+        if first is None:
+            return None
+        # Bucket sınırlarını sabit tut (epoch'a hizalı)
+        epoch = datetime(1970, 1, 1)
+        offset = (first - epoch).total_seconds() // self.collapse_bucket * self.collapse_bucket
+        return epoch + timedelta(seconds=offset)
+
+    def _collapse_chunk(self, start: datetime, end: datetime) -> int:
+        """Fold up to chunk_size duplicates of one bucket into their keeper rows"""
+        table = DeviceLog.__table__
+        in_bucket = and_(table.c.log_level == "info",
+                         # JSON sütununda None, SQL NULL ya da 'null' olarak saklanmış olabilir
+                         func.coalesce(func.json_type(table.c.response), "null") == "null",
+                         table.c.timestamp >= start, table.c.timestamp < end)
+        db = SessionLocal()
+        try:
+            # Her (cihaz, mesaj, komut) grubunun en yeni satırı kalır
+            keepers = {
+                (device_id, message, command): keep_id
+                for keep_id, device_id, message, command in db.execute(
+                    select(func.max(table.c.id), table.c.device_id, table.c.message, table.c.command)
+                    .where(in_bucket)
+                    .group_by(table.c.device_id, table.c.message, table.c.command)
+                    .having(func.count() > 1)
+                )
+            }
+            if not keepers:
+                return 0
+
+            newest = (
+                select(func.max(table.c.id))
+                .where(in_bucket)
+                .group_by(table.c.device_id, table.c.message, table.c.command)
+            )
+            duplicates = db.execute(
+                select(table.c.id, table.c.device_id, table.c.message, table.c.command,
+                       func.coalesce(table.c.repeat_count, 1))
+                .where(in_bucket, table.c.id.notin_(newest))
+                .limit(self.chunk_size)
+            ).all()
+
+            added: Dict[int, int] = {}
+            for _, device_id, message, command, repeat_count in duplicates:
+                keep_id = keepers.get((device_id, message, command))
+                if keep_id is not None:
+                    added[keep_id] = added.get(keep_id, 0) + repeat_count
+            ids = [row[0] for row in duplicates if (row[1], row[2], row[3]) in keepers]
+            if not ids:
+                return 0
+
+            # Sayaç güncellemesi ve silme aynı transaction'da, yarıda kalırsa tekrar sayılmaz
+            db.execute(
+                table.update()
+                .where(table.c.id == bindparam("keep_id"))
+                .values(repeat_count=func.coalesce(table.c.repeat_count, 1) + bindparam("added")),
+                [{"keep_id": keep_id, "added": count} for keep_id, count in added.items()]
+            )
+            db.execute(table.delete().where(table.c.id.in_(ids)))
+            db.commit()
+            return len(ids)
+        finally:
+            db.close()
+
+    async def collapse(self, now: Optional[datetime] = None) -> int:
+        """Collapse repeated info messages older than collapse_after"""
+        if not self.collapse_after:
+            return 0
+        before = (now or datetime.utcnow()) - timedelta(seconds=self.collapse_after)
+        start = self._collapsed_until
+        if start is None:
+            start = await asyncio.to_thread(self._collapse_start, before)
+            if start is None:
+                return 0
+
+        collapsed = 0
+        bucket = timedelta(seconds=self.collapse_bucket)
+        while start + bucket <= before:
+            while True:
+                count = await db_writer.run(self._collapse_chunk, start, start + bucket)
+                collapsed += count
+                if count < self.chunk_size:
+                    break
+                await asyncio.sleep(self.pause)
+            start += bucket
+            self._collapsed_until = start
+            await asyncio.sleep(0)
+        return collapsed
+
+    # --- reporting ---
+
+    @staticmethod
+    def _storage_info() -> dict:
+        db = ReadSessionLocal()
+        try:
+            page_size = db.execute(text("PRAGMA page_size")).scalar()
+            page_count = db.execute(text("PRAGMA page_count")).scalar()
+            freelist = db.execute(text("PRAGMA freelist_count")).scalar()
+            auto_vacuum = db.execute(text("PRAGMA auto_vacuum")).scalar()
+            rows = db.execute(select(func.count()).select_from(DeviceLog.__table__)).scalar()
+        finally:
+            db.close()
+        return {
+            "page_size": page_size,
+            "file_bytes": page_size * page_count,
+            "free_bytes": page_size * freelist,
+            "auto_vacuum": auto_vacuum,
+            "log_rows": rows,
+        }
+
+    @staticmethod
+    def _incremental_vacuum():
+        db = SessionLocal()
+        try:
+            db.execute(text("PRAGMA incremental_vacuum"))
+            db.commit()
+        finally:
+            db.close()
+
+    async def run(self) -> dict:
+        """One retention pass: prune, collapse, report"""
+        async with self._run_lock:
+            started = time.monotonic()
+            before = await asyncio.to_thread(self._storage_info)
+            deleted = await self.prune()
+            collapsed = await self.collapse()
+            if before["auto_vacuum"] == 2:
+                # auto_vacuum=INCREMENTAL ise boş sayfalar dosyadan da atılır
+                await db_writer.run(self._incremental_vacuum)
+            after = await asyncio.to_thread(self._storage_info)
+
+            self.total_deleted += sum(deleted.values())
+            self.total_collapsed += collapsed
+            self.last_report = {
+                "finished_at": datetime.utcnow().isoformat(),
+                "duration": round(time.monotonic() - started, 3),
+                "deleted": deleted,
+                "archived": self.archive is not None,
+                "collapsed": collapsed,
+                "rows_before": before["log_rows"],
+                "rows_after": after["log_rows"],
+                "file_bytes_before": before["file_bytes"],
+                "file_bytes_after": after["file_bytes"],
+                # Canlı veriden düşen alan; boş sayfalar yeni yazmalarda tekrar kullanılır
+                "reclaimed_bytes": max(0, (before["file_bytes"] - before["free_bytes"])
+                                       - (after["file_bytes"] - after["free_bytes"])),
+                "free_bytes": after["free_bytes"],
+            }
+            if sum(deleted.values()) or collapsed:
+                logger.info(
+                    f"Log retention: {'archived' if self.archive else 'deleted'} {sum(deleted.values())}, "
+                    f"collapsed {collapsed}, "
+                    f"reclaimed {self.last_report['reclaimed_bytes']} bytes"
+                )
+            return self.last_report
+
+    async def _loop(self):
+        while True:
+            try:
+                await self.run()
+            except Exception as e:
+                logger.error(f"Error in log retention: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "retention": self.retention,
+            "archive": self.archive is not None,
+            "collapse_after": self.collapse_after,
+            "collapse_bucket": self.collapse_bucket,
+            "interval": self.interval,
+            "chunk_size": self.chunk_size,
+            "collapsed_until": self._collapsed_until.isoformat() if self._collapsed_until else None,
+            "total_deleted": self.total_deleted,
+            "total_collapsed": self.total_collapsed,
+            "last_report": self.last_report,
+        }
+
+
+# Global retention engine
+log_retention = LogRetentionEngine(
+    retention=settings.LOG_RETENTION,
+    collapse_after=settings.LOG_COLLAPSE_AFTER,
+    collapse_bucket=settings.LOG_COLLAPSE_BUCKET,
+    interval=settings.LOG_PRUNE_INTERVAL,
+    chunk_size=settings.LOG_PRUNE_CHUNK,
+    pause=settings.LOG_PRUNE_PAUSE,
+    archive=log_archive if settings.LOG_ARCHIVE_ENABLED else None,
+)
@@ -0,0 +1,192 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, Deque, Dict, Iterable, List, Optional
+
+from ..core.config import settings
+from ..core.database import SessionLocal, db_writer
+from ..models.mikrotik import DeviceLog
+from .broadcast import broadcast_hub
+from .fleet_stats import LOG_FIELDS, fleet_stats
+
+logger = logging.getLogger(__name__)
+
+DROP_OLDEST = "drop_oldest"
+DROP_NEWEST = "drop_newest"
+DROP_INFO = "drop_info"
+OVERFLOW_POLICIES = (DROP_OLDEST, DROP_NEWEST, DROP_INFO)
+
+
+def publish_logs(logs: Iterable[Dict[str, Any]], ids: Iterable[int]):
+    """Send committed log records to the WebSocket clients subscribed to their devices"""
+    if not broadcast_hub.wants("logs"):
+        return
+    per_device: Dict[int, List[Dict[str, Any]]] = {}
+    for log, log_id in zip(logs, ids):
+        record = {field: log.get(field) for field in LOG_FIELDS}
+        record["id"] = log_id
+        record["repeat_count"] = record["repeat_count"] or 1
+        if isinstance(record["timestamp"], datetime):
+            record["timestamp"] = record["timestamp"].isoformat()
+        per_device.setdefault(log["device_id"], []).append(record)
+    broadcast_hub.publish_devices("logs", per_device, lambda devices: {"type": "device_logs", "devices": devices})
+
+
+class DeviceLogWriter:
+    """
+    DeviceLog kayıtları için asenkron toplu yazıcı.
+
+    write() kaydı sadece bellekteki tampona ekler; arka plan task'ı tampon
+    batch_size'a ulaştığında veya flush_interval dolduğunda kayıtları tek bir
+    çok satırlı INSERT ile (thread'de) yazar. Böylece poll başına birkaç commit
+    yerine saniyede en fazla birkaç commit yapılır.
+
+    Tampon max_buffer ile sınırlıdır. Dolduğunda overflow politikası uygulanır:
+    - drop_oldest: en eski kayıt atılır
+    - drop_newest: yeni kayıt atılır
+    - drop_info: en eski 'info' kaydı atılır, tamponda info yoksa en eskisi
+    """
+
+    def __init__(self, batch_size: int = 500, flush_interval: float = 2,
+                 max_buffer: int = 20000, overflow: str = DROP_INFO):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {overflow}")
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self.overflow = overflow
+        self._buffer: Deque[Dict[str, Any]] = deque()
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self.written = 0
+        self.dropped = 0
+        self.failed_batches = 0
+        self.last_batch_size = 0
+        self.last_flush_duration = 0.0
+
+    def write(self, device_id: int, level: str, message: str,
+              command: Optional[str] = None, response: Any = None,
+              timestamp: Optional[datetime] = None):
+        """Queue a log record; never blocks and never touches the database"""
+        if len(self._buffer) >= self.max_buffer and not self._make_room(level):
+            self.dropped += 1
+            return
+        self._buffer.append({
+            "device_id": device_id,
+            "log_level": level,
+            "message": message,
+            "command": command,
+            "response": response,
+            "timestamp": timestamp or datetime.utcnow(),
+        })
+        if len(self._buffer) >= self.batch_size:
+            self._wakeup.set()
+
+    def _make_room(self, level: str) -> bool:
+        """Apply the overflow policy; False means the new record is dropped"""
+        if self.overflow == DROP_NEWEST:
+            return False
+        if self.overflow == DROP_INFO:
+            for index, record in enumerate(self._buffer):
+                if record["log_level"] == "info":
+                    del self._buffer[index]
+                    self.dropped += 1
+                    return True
+            if level == "info":
+                return False
+        self._buffer.popleft()
+        self.dropped += 1
+        return True
+
+    def _take_batch(self) -> List[Dict[str, Any]]:
+        count = min(self.batch_size, len(self._buffer))
+        return [self._buffer.popleft() for _ in range(count)]
+
+    @staticmethod
+    def _insert(records: List[Dict[str, Any]]) -> range:
+        """Insert a batch; returns the ids given to the records, in order"""
+        db = SessionLocal()
+        try:
+            # Tek çok satırlı INSERT ... VALUES (...), (...), ...
+            result = db.execute(DeviceLog.__table__.insert().values(records))
+            db.commit()
+            # Satırlar sırayla max(rowid)+1 alır (yazıcı tek thread)
+            return range(result.lastrowid - len(records) + 1, result.lastrowid + 1)
+        finally:
+            db.close()
+
+    async def flush(self, drain: bool = False) -> int:
+        """Write one batch (or everything when drain=True); returns rows written"""
+        total = 0
+        async with self._flush_lock:
+            while self._buffer:
+                batch = self._take_batch()
+                started = time.monotonic()
+                try:
+                    ids = await db_writer.run(self._insert, batch)
+                except Exception as e:
+                    self.failed_batches += 1
+                    logger.error(f"Failed to write {len(batch)} device logs: {e}")
+                    # Kayıtları geri koy, sınırı aşan kısım overflow sayılır
+                    room = max(0, self.max_buffer - len(self._buffer))
+                    self._buffer.extendleft(reversed(batch[:room]))
+                    self.dropped += len(batch) - min(room, len(batch))
+                    break
+                fleet_stats.add_logs(batch, ids)
+                publish_logs(batch, ids)
+                self.last_batch_size = len(batch)
+                self.last_flush_duration = time.monotonic() - started
+                self.written += len(batch)
+                total += len(batch)
+                if not drain and len(self._buffer) < self.batch_size:
+                    break
+        return total
+
+    async def _flush_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Error in device log writer: {e}")
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._flush_loop())
+
+    async def close(self):
+        """Stop the background task and write everything still buffered"""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self.flush(drain=True)
+
+    def stats(self) -> dict:
+        return {
+            "buffered": len(self._buffer),
+            "max_buffer": self.max_buffer,
+            "batch_size": self.batch_size,
+            "flush_interval": self.flush_interval,
+            "overflow_policy": self.overflow,
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed_batches": self.failed_batches,
+            "last_batch_size": self.last_batch_size,
+            "last_flush_ms": round(self.last_flush_duration * 1000, 1),
+        }
+
+
+# Global log writer
+log_writer = DeviceLogWriter(
+    batch_size=settings.LOG_BATCH_SIZE,
+    flush_interval=settings.LOG_FLUSH_INTERVAL,
+    max_buffer=settings.LOG_MAX_BUFFER,
+    overflow=settings.LOG_OVERFLOW_POLICY,
+)
@@ -0,0 +1,508 @@
+import asyncio
+import logging
+import os
+import shutil
+import threading
+import time
+from typing import Dict, List, NamedTuple, Optional, Sequence, Set, Tuple
+from urllib.parse import quote, unquote
+
+import numpy as np
+
+from ..core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Ham disk kaydı: (timestamp, value), her biri float64 -> 16 byte/örnek
+SAMPLE_DTYPE = np.dtype([("ts", "<f8"), ("value", "<f8")])
+
+# Rollup kaydı: bucket başlangıcı + min/max/sum/count/last
+ROLLUP_DTYPE = np.dtype([
+    ("ts", "<f8"), ("min", "<f8"), ("max", "<f8"),
+    ("sum", "<f8"), ("count", "<f8"), ("last", "<f8"),
+])
+
+# (tier adı, bucket süresi saniye) - inceden kabaya
+ROLLUP_TIERS: Tuple[Tuple[str, int], ...] = (("1m", 60), ("5m", 300), ("1h", 3600), ("1d", 86400))
+RAW_TIER = "raw"
+AGGREGATES = ("avg", "min", "max", "last", "count")
+
+SeriesKey = Tuple[int, str]
+TierKey = Tuple[int, str, str]
+
+
+class SeriesMemory(NamedTuple):
+    """In-memory part of a series copied for a query: ring samples or unwritten records"""
+    ring: Optional[Tuple[np.ndarray, np.ndarray]] = None
+    extra: Sequence[tuple] = ()
+
+
+class RingBuffer:
+    """Fixed-size in-memory buffer of the most recent samples of one series"""
+
+    __slots__ = ("ts", "values", "head", "count")
+
+    def __init__(self, size: int):
+        self.ts = np.zeros(size, dtype="<f8")
+        self.values = np.zeros(size, dtype="<f8")
+        self.head = 0
+        self.count = 0
+
+    def append(self, ts: float, value: float):
+        size = len(self.ts)
+        self.ts[self.head] = ts
+        self.values[self.head] = value
+        self.head = (self.head + 1) % size
+        self.count = min(self.count + 1, size)
+
+    @property
+    def oldest(self) -> Optional[float]:
+        if not self.count:
+            return None
+        return float(self.ts[(self.head - self.count) % len(self.ts)])
+
+    def snapshot(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Samples in time order"""
+        size = len(self.ts)
+        if self.count < size:
+            start = (self.head - self.count) % size
+            index = (np.arange(self.count) + start) % size
+        else:
+            index = np.roll(np.arange(size), -self.head)
+        return self.ts[index], self.values[index]
+
+
+class MetricStore:
+    """
+    Cihaz metrikleri için zaman serisi deposu.
+
+    - Her (device_id, metric) serisi için son örnekler bellekte RingBuffer'da
+    - Geçmiş, seri başına append-only binary dosyada ({root}/{device_id}/{metric}.bin)
+    - 1m/5m/1h/1d rollup'ları (min/max/sum/count/last) örnek geldikçe artımlı
+      hesaplanır; kapanan bucket'lar {metric}@{tier}.bin dosyasına eklenir
+    - Yazmalar ORM'den bağımsızdır ve toplu yapılır: örnekler önce bellekte
+      birikir, arka plan task'ı belirli aralıklarla dosyalara ekler
+    - Her tier'ın kendi saklama süresi vardır, eski kayıtlar periyodik olarak budanır
+    """
+
+    def __init__(self, root: str, ring_size: int = 120, flush_interval: float = 60,
+                 flush_samples: int = 20, max_pending_age: float = 300,
+                 retention: Optional[Dict[str, float]] = None, prune_interval: float = 3600):
+        self.root = root
+        self.ring_size = ring_size
+        self.flush_interval = flush_interval
+        self.flush_samples = flush_samples
+        self.max_pending_age = max_pending_age
+        self.retention: Dict[str, float] = dict(retention or {})
+        self.prune_interval = prune_interval
+        self.rings: Dict[SeriesKey, RingBuffer] = {}
+        self.pending: Dict[SeriesKey, List[Tuple[float, float]]] = {}
+        # Her tier için açık (henüz kapanmamış) bucket: [start, min, max, sum, count, last]
+        self.open_buckets: Dict[SeriesKey, List[Optional[List[float]]]] = {}
+        self.rollup_pending: Dict[TierKey, List[Tuple[float, ...]]] = {}
+        self._writing: Dict[SeriesKey, List[Tuple[float, float]]] = {}
+        self._rollup_writing: Dict[TierKey, List[Tuple[float, ...]]] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+        # Dosya başına ekleme ile budama yeniden yazımını ayırır (thread'lerde tutulur)
+        self._file_lock = threading.Lock()
+        self._last_prune = time.monotonic()
+
+        # Stats
+        self.samples_recorded = 0
+        self.samples_flushed = 0
+        self.rollups_flushed = 0
+        self.flushes = 0
+        self.last_flush_duration = 0.0
+        self.bytes_pruned = 0
+
+    def record(self, device_id: int, metric: str, value: float, ts: Optional[float] = None):
+        """Record one sample (never touches disk)"""
+        ts = time.time() if ts is None else ts
+        key = (device_id, metric)
+        ring = self.rings.get(key)
+        if ring is None:
+            ring = self.rings[key] = RingBuffer(self.ring_size)
+        ring.append(ts, value)
+        self.pending.setdefault(key, []).append((ts, value))
+        self._update_rollups(key, ts, value)
+        self.samples_recorded += 1
+
+    def record_many(self, device_id: int, samples: Dict[str, Optional[float]], ts: Optional[float] = None):
+        """Record several metrics of one device taken at the same time; None values are skipped"""
+        ts = time.time() if ts is None else ts
+        for metric, value in samples.items():
+            if value is not None:
+                self.record(device_id, metric, value, ts)
+
+    def _update_rollups(self, key: SeriesKey, ts: float, value: float):
+        buckets = self.open_buckets.get(key)
+        if buckets is None:
+            buckets = self.open_buckets[key] = [None] * len(ROLLUP_TIERS)
+
+        for index, (tier, seconds) in enumerate(ROLLUP_TIERS):
+            start = ts - ts % seconds
+            bucket = buckets[index]
+            if bucket is not None and bucket[0] == start:
+                if value < bucket[1]:
+                    bucket[1] = value
+                if value > bucket[2]:
+                    bucket[2] = value
+                bucket[3] += value
+                bucket[4] += 1
+                bucket[5] = value
+            elif bucket is None or start > bucket[0]:
+                if bucket is not None:
+                    # Önceki bucket kapandı, diske yazılmak üzere sıraya al
+                    self.rollup_pending.setdefault((key[0], key[1], tier), []).append(tuple(bucket))
+                buckets[index] = [start, value, value, value, 1.0, value]
+            # Geç gelen (eski bucket'a ait) örnekler rollup'a dahil edilmez
+
+    def series_path(self, device_id: int, metric: str, tier: str = RAW_TIER) -> str:
+        # Interface adları '/' veya boşluk içerebilir; quote '@' işaretini de kaçırır
+        name = quote(metric, safe="")
+        if tier != RAW_TIER:
+            name += "@" + tier
+        return os.path.join(self.root, str(device_id), name + ".bin")
+
+    async def list_metrics(self, device_id: int) -> List[str]:
+        """Metric names known for a device (in memory or on disk)"""
+        names = {metric for (dev, metric) in self.rings if dev == device_id}
+        return sorted(names | await asyncio.to_thread(self._disk_metrics, device_id))
+
+    def _disk_metrics(self, device_id: int) -> Set[str]:
+        device_dir = os.path.join(self.root, str(device_id))
+        if not os.path.isdir(device_dir):
+            return set()
+        return {
+            unquote(name[:-4].split("@")[0])
+            for name in os.listdir(device_dir) if name.endswith(".bin")
+        }
+
+    def choose_tier(self, start: Optional[float], step: Optional[float]) -> str:
+        """
+        Coarsest tier whose resolution still satisfies step; falls through to
+        coarser tiers when the requested range is beyond a tier's retention.
+        """
+        tiers = [RAW_TIER] + [tier for tier, _ in ROLLUP_TIERS]
+        index = 0
+        if step:
+            for position, (_, seconds) in enumerate(ROLLUP_TIERS, start=1):
+                if seconds <= step:
+                    index = position
+        if start is not None:
+            age = time.time() - start
+            while index < len(tiers) - 1 and self.retention.get(tiers[index], float("inf")) < age:
+                index += 1
+        return tiers[index]
+
+    def _snapshot(self, device_id: int, metric: str, tier: str, start: Optional[float]) -> SeriesMemory:
+        """Copy of the in-memory part of a series; runs on the event loop, which mutates it"""
+        key = (device_id, metric)
+        if tier == RAW_TIER:
+            ring = self.rings.get(key)
+            if ring is not None and ring.oldest is not None and ring.oldest <= (-np.inf if start is None else start):
+                # İstenen aralık tamamen bellekte
+                return SeriesMemory(ring=ring.snapshot())
+            # Diske yazılmakta olan örnekler de dahil edilir
+            return SeriesMemory(extra=self._writing.get(key, []) + self.pending.get(key, []))
+        tier_key = (device_id, metric, tier)
+        extra = self._rollup_writing.get(tier_key, []) + self.rollup_pending.get(tier_key, [])
+        buckets = self.open_buckets.get(key)
+        if buckets is not None:
+            open_bucket = buckets[[name for name, _ in ROLLUP_TIERS].index(tier)]
+            if open_bucket is not None:
+                extra.append(tuple(open_bucket))
+        return SeriesMemory(extra=extra)
+
+    def _query_raw(self, device_id: int, metric: str, memory: SeriesMemory, start: Optional[float] = None,
+                   end: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Raw samples of one series within [start, end]"""
+        start = -np.inf if start is None else start
+        end = np.inf if end is None else end
+
+        if memory.ring is not None:
+            ts, values = memory.ring
+        else:
+            disk = self._read_disk(self.series_path(device_id, metric), SAMPLE_DTYPE)
+            if memory.extra:
+                disk = np.concatenate([disk, np.array(memory.extra, dtype=SAMPLE_DTYPE)])
+            ts, values = disk["ts"], disk["value"]
+
+        mask = (ts >= start) & (ts <= end)
+        return ts[mask], values[mask]
+
+    def _query_rollup(self, device_id: int, metric: str, tier: str, memory: SeriesMemory,
+                      start: Optional[float] = None, end: Optional[float] = None) -> np.ndarray:
+        """Rollup records of one tier within [start, end], including the open bucket"""
+        records = self._read_disk(self.series_path(device_id, metric, tier), ROLLUP_DTYPE)
+        if memory.extra:
+            records = np.concatenate([records, np.array(memory.extra, dtype=ROLLUP_DTYPE)])
+
+        mask = np.ones(len(records), dtype=bool)
+        if start is not None:
+            mask &= records["ts"] >= start - start % dict(ROLLUP_TIERS)[tier]
+        if end is not None:
+            mask &= records["ts"] <= end
+        return records[mask]
+
+    async def query_range(self, device_id: int, metric: str, start: Optional[float] = None,
+                          end: Optional[float] = None, step: Optional[float] = None,
+                          agg: str = "avg") -> Tuple[str, np.ndarray, np.ndarray]:
+        """
+        Range query that picks the cheapest tier for the requested step.
+
+        Returns (tier, timestamps, values); with a step the values are
+        re-aggregated into step-sized buckets aligned to start.
+        """
+        return (await self.query_many([device_id], metric, start, end, step, agg))[0]
+
+    async def query_many(self, device_ids: List[int], metric: str, start: Optional[float] = None,
+                         end: Optional[float] = None, step: Optional[float] = None,
+                         agg: str = "avg") -> List[Tuple[str, np.ndarray, np.ndarray]]:
+        """
+        query_range for several devices with a single worker thread call.
+
+        Rings, pending samples and open buckets are copied here on the event
+        loop (record() and flush() change them there); only the .bin file
+        reads and the aggregation run in the thread.
+        """
+        tier = self.choose_tier(start, step)
+        memories = [self._snapshot(device_id, metric, tier, start) for device_id in device_ids]
+
+        def read_all():
+            return [self._range(device_id, metric, tier, memory, start, end, step, agg)
+                    for device_id, memory in zip(device_ids, memories)]
+
+        return await asyncio.to_thread(read_all)
+
+    def _range(self, device_id: int, metric: str, tier: str, memory: SeriesMemory, start: Optional[float],
+               end: Optional[float], step: Optional[float], agg: str) -> Tuple[str, np.ndarray, np.ndarray]:
+        if tier == RAW_TIER:
+            ts, values = self._query_raw(device_id, metric, memory, start, end)
+            if not step or not len(ts):
+                return tier, ts, values
+            records = np.empty(len(ts), dtype=ROLLUP_DTYPE)
+            records["ts"] = ts
+            for field in ("min", "max", "sum", "last"):
+                records[field] = values
+            records["count"] = 1
+        else:
+            records = self._query_rollup(device_id, metric, tier, memory, start, end)
+            if not len(records):
+                return tier, records["ts"], records["sum"]
+            if not step:
+                step = dict(ROLLUP_TIERS)[tier]
+
+        origin = start if start is not None else float(records["ts"][0])
+        ts, merged = merge_buckets(records, origin, step)
+        return tier, ts, aggregate_values(merged, agg)
+
+    @staticmethod
+    def _read_disk(path: str, dtype: np.dtype) -> np.ndarray:
+        try:
+            count = os.path.getsize(path) // dtype.itemsize
+        except OSError:
+            count = 0
+        if count == 0:
+            return np.empty(0, dtype=dtype)
+        # Yazma sırasında yarım kalmış son kayıt okunmasın diye boyut sabitlenir
+        return np.array(np.memmap(path, dtype=dtype, mode="r", shape=(count,)))
+
+    def _take_batch(self, force: bool = False):
+        now = time.time()
+        batch = {}
+        for key, samples in list(self.pending.items()):
+            if force or len(samples) >= self.flush_samples or now - samples[0][0] >= self.max_pending_age:
+                batch[key] = self.pending.pop(key)
+        if force:
+            # Kapanışta açık bucket'lar da yazılır; aynı bucket tekrar açılırsa
+            # sorguda min/max/sum/count birleştirildiği için sonuç doğru kalır
+            for (device_id, metric), buckets in self.open_buckets.items():
+                for (tier, _), bucket in zip(ROLLUP_TIERS, buckets):
+                    if bucket is not None:
+                        self.rollup_pending.setdefault((device_id, metric, tier), []).append(tuple(bucket))
+            self.open_buckets = {}
+        # Rollup kayıtları seyrek oluşur, her flush'ta hepsi yazılır
+        rollups, self.rollup_pending = self.rollup_pending, {}
+        return batch, rollups
+
+    def _write_batch(self, batch: Dict[SeriesKey, List[Tuple[float, float]]],
+                     rollups: Dict[TierKey, List[Tuple[float, ...]]]):
+        for (device_id, metric), samples in batch.items():
+            self._append(self.series_path(device_id, metric), np.array(samples, dtype=SAMPLE_DTYPE))
+        for (device_id, metric, tier), records in rollups.items():
+            self._append(self.series_path(device_id, metric, tier), np.array(records, dtype=ROLLUP_DTYPE))
+
+    def _append(self, path: str, records: np.ndarray):
+        with self._file_lock:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "ab") as f:
+                records.tofile(f)
+
+    async def flush(self, force: bool = False) -> int:
+        """Append due pending samples and closed rollup buckets to disk (off the event loop)"""
+        async with self._flush_lock:
+            batch, rollups = self._take_batch(force)
+            if not batch and not rollups:
+                return 0
+            started = time.monotonic()
+            self._writing, self._rollup_writing = batch, rollups
+            try:
+                await asyncio.to_thread(self._write_batch, batch, rollups)
+            except Exception as e:
+                logger.error(f"Metric flush failed: {e}")
+                # Örnekleri kaybetme, bir sonraki flush'ta tekrar dene
+                for key, samples in batch.items():
+                    self.pending[key] = samples + self.pending.get(key, [])
+                for key, records in rollups.items():
+                    self.rollup_pending[key] = records + self.rollup_pending.get(key, [])
+                return 0
+            finally:
+                self._writing, self._rollup_writing = {}, {}
+            written = sum(len(samples) for samples in batch.values())
+            self.samples_flushed += written
+            self.rollups_flushed += sum(len(records) for records in rollups.values())
+            self.flushes += 1
+            self.last_flush_duration = time.monotonic() - started
+            return written
+
+    def _prune_files(self) -> int:
+        """Drop records older than each tier's retention; returns bytes reclaimed"""
+        if not os.path.isdir(self.root):
+            return 0
+        now = time.time()
+        reclaimed = 0
+        for device_dir in os.scandir(self.root):
+            if not device_dir.is_dir():
+                continue
+            try:
+                entries = list(os.scandir(device_dir.path))
+            except FileNotFoundError:
+                # Cihaz bu arada silindi
+                continue
+            for entry in entries:
+                if not entry.name.endswith(".bin"):
+                    continue
+                stem = entry.name[:-4]
+                tier = stem.split("@")[1] if "@" in stem else RAW_TIER
+                keep_for = self.retention.get(tier)
+                if not keep_for:
+                    continue
+                dtype = SAMPLE_DTYPE if tier == RAW_TIER else ROLLUP_DTYPE
+                # Dosyalar zaman sıralı; sadece ilk kayda bakmak yeter
+                try:
+                    first = np.fromfile(entry.path, dtype=dtype, count=1)
+                except FileNotFoundError:
+                    continue
+                if not len(first) or first["ts"][0] >= now - keep_for:
+                    continue
+                reclaimed += self._prune_file(entry.path, dtype, now - keep_for)
+        return reclaimed
+
+    def _prune_file(self, path: str, dtype: np.dtype, cutoff: float) -> int:
+        """Rewrite one file without records older than cutoff (locked against appends)"""
+        with self._file_lock:
+            if not os.path.exists(path):
+                # Bu arada cihaz silindi
+                return 0
+            records = self._read_disk(path, dtype)
+            kept = records[records["ts"] >= cutoff]
+            tmp_path = path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                kept.tofile(f)
+            os.replace(tmp_path, path)
+        return (len(records) - len(kept)) * dtype.itemsize
+
+    async def prune(self) -> int:
+        """Apply per-tier retention; flushes keep running, only the rewritten file is locked"""
+        reclaimed = await asyncio.to_thread(self._prune_files)
+        self.bytes_pruned += reclaimed
+        if reclaimed:
+            logger.info(f"Metric retention pruned {reclaimed} bytes")
+        return reclaimed
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+            if time.monotonic() - self._last_prune >= self.prune_interval:
+                self._last_prune = time.monotonic()
+                try:
+                    await self.prune()
+                except Exception as e:
+                    logger.error(f"Metric retention pruning failed: {e}")
+
+    def start(self):
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def close(self):
+        """Stop the flusher and write everything still pending"""
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        await self.flush(force=True)
+
+    async def remove_device(self, device_id: int):
+        """Forget a deleted device: memory, unwritten samples and its files on disk"""
+        for key in [key for key in self.rings if key[0] == device_id]:
+            self.rings.pop(key, None)
+            self.open_buckets.pop(key, None)
+        for pending in (self.pending, self.rollup_pending):
+            for key in [key for key in pending if key[0] == device_id]:
+                pending.pop(key, None)
+        # Süren bir flush bu cihazın dosyalarını yeniden oluşturmasın diye kilit altında;
+        # id tekrar kullanılırsa eski seriler devralınmaz
+        async with self._flush_lock:
+            await asyncio.to_thread(self._remove_files, device_id)
+
+    def _remove_files(self, device_id: int):
+        with self._file_lock:
+            shutil.rmtree(os.path.join(self.root, str(device_id)), ignore_errors=True)
+
+    def stats(self) -> dict:
+        return {
+            "series": len(self.rings),
+            "pending_samples": sum(len(samples) for samples in self.pending.values()),
+            "pending_rollups": sum(len(records) for records in self.rollup_pending.values()),
+            "samples_recorded": self.samples_recorded,
+            "samples_flushed": self.samples_flushed,
+            "rollups_flushed": self.rollups_flushed,
+            "flushes": self.flushes,
+            "last_flush_duration": round(self.last_flush_duration, 3),
+            "retention": self.retention,
+            "bytes_pruned": self.bytes_pruned,
+        }
+
+
+def merge_buckets(records: np.ndarray, origin: float, step: float) -> Tuple[np.ndarray, np.ndarray]:
+    """Combine rollup records into step-sized buckets aligned to origin"""
+    records = records[np.argsort(records["ts"], kind="stable")]
+    buckets = np.floor((records["ts"] - origin) / step).astype(np.int64)
+    unique, first_index = np.unique(buckets, return_index=True)
+    last_index = np.append(first_index[1:], len(records)) - 1
+
+    merged = np.empty(len(unique), dtype=ROLLUP_DTYPE)
+    merged["ts"] = origin + unique * step
+    merged["min"] = np.minimum.reduceat(records["min"], first_index)
+    merged["max"] = np.maximum.reduceat(records["max"], first_index)
+    merged["sum"] = np.add.reduceat(records["sum"], first_index)
+    merged["count"] = np.add.reduceat(records["count"], first_index)
+    merged["last"] = records["last"][last_index]
+    return merged["ts"], merged
+
+
+def aggregate_values(records: np.ndarray, agg: str) -> np.ndarray:
+    if agg == "avg":
+        return records["sum"] / records["count"]
+    return records[agg]
+
+
+# Global metric store
+metric_store = MetricStore(
+    root=settings.METRICS_DIR,
+    ring_size=settings.METRICS_RING_SIZE,
+    flush_interval=settings.METRICS_FLUSH_INTERVAL,
+    retention=settings.METRICS_RETENTION,
+)
@@ -1,17 +1,49 @@
 import asyncio
+import hashlib
 import logging
 import re
-from typing import Dict, List, Optional, Any
-from librouteros import connect
-from librouteros.exceptions import TrapError, FatalError
-from sqlalchemy.orm import Session
-from ..models.mikrotik import MikrotikDevice, DeviceLog, DeviceInterface
+import time
+import weakref
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional
+import numpy as np
+from ..models.mikrotik import MikrotikDevice
 from ..core.config import settings
+from .routeros_api import AsyncRouterOSClient, ConnectionClosedError, DeviceUnreachableError, TrapError, tcp_probe
+from .poll_plan import PollPlan, PollResult, DEVICE_INFO_PLAN, MONITOR_POLL_PLAN
+from .metrics_store import metric_store
+from .traffic_rates import traffic_rates, COUNTER_FIELDS
+from .broadcast import broadcast_hub
+from .log_writer import log_writer
+from .device_state import device_state
+from .state_writer import DeviceTarget, PollOutcome, state_writer
 from datetime import datetime
 import json
 
 logger = logging.getLogger(__name__)
 
+UPTIME_PATTERN = r'(?:(\d+)w)?(?:(\d+)d)?(?:(\d+)h)?(?:(\d+)m)?(?:(\d+)s)?'
+
+def parse_uptime_seconds(uptime_str: str) -> Optional[int]:
+    """MikroTik uptime ("1w2d3h4m5s") -> saniye"""
+    if not uptime_str or uptime_str == 'N/A':
+        return None
+    match = re.fullmatch(UPTIME_PATTERN, uptime_str)
+    if not match:
+        return None
+    weeks, days, hours, minutes, seconds = (int(part) if part else 0 for part in match.groups())
+    return (((weeks * 7 + days) * 24 + hours) * 60 + minutes) * 60 + seconds
+
+def to_number(value: Any) -> Optional[float]:
+    """RouterOS string değerini sayıya çevirir ('12', '12%'), olmazsa None"""
+    if value is None:
+        return None
+    try:
+        return float(str(value).rstrip('%'))
+    except ValueError:
+        return None
+
 def format_uptime(uptime_str: str) -> str:
     """
     MikroTik uptime formatını WinBox tarzı formata çevirir
@@ -22,8 +54,7 @@ def format_uptime(uptime_str: str) -> str:
     
     try:
         # MikroTik uptime formatını parse et (1w2d3h4m5s)
-        pattern = r'(?:(\d+)w)?(?:(\d+)d)?(?:(\d+)h)?(?:(\d+)m)?(?:(\d+)s)?'
-        match = re.match(pattern, uptime_str)
+        match = re.match(UPTIME_PATTERN, uptime_str)
         
         if not match:
             return uptime_str  # Parse edilemezse orijinal formatı döndür
@@ -68,312 +99,605 @@ def format_uptime(uptime_str: str) -> str:
     except Exception:
         return uptime_str  # Hata durumunda orijinal formatı döndür
 
+class PooledConnection:
+    """Pool entry: a RouterOS connection plus usage bookkeeping"""
+    
+    def __init__(self, key: str, device_id: int, client: AsyncRouterOSClient):
+        self.key = key
+        self.device_id = device_id
+        self.client = client
+        self.in_use = 0
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+
 class MikrotikConnectionPool:
-    def __init__(self, max_connections: int = 50):
+    """
+    RouterOS bağlantı havuzu.
+    
+    - Açık bağlantı sayısı max_connections ile sınırlıdır; limit dolunca en uzun
+      süredir boşta olan (LRU) bağlantı kapatılır, hepsi kullanımdaysa beklenir
+    - idle_ttl süresinden uzun boşta kalan bağlantılar kapatılır
+    - probe_after süresinden uzun boşta kalan bağlantı kullanılmadan önce test
+      edilir, kopmuşsa yeniden bağlanılır
+    - Aynı soket üzerindeki komutlar '.tag' ile ayrılır ve cümleler yazma
+      kilidiyle gönderilir, bu yüzden eş zamanlı kullanımda birbirine karışmaz
+    - Anahtar cihaz id'si, adres ve kimlik bilgisinin özetinden oluşur; şifre
+      değişince eski oturum tekrar kullanılmaz
+    """
+    
+    def __init__(self, max_connections: int = 500, idle_ttl: float = 300,
+                 probe_after: float = 60, probe_timeout: float = 3,
+                 tcp_probe_timeout: Optional[float] = 2):
         self.max_connections = max_connections
-        self.connections: Dict[str, Any] = {}
-        self.semaphore = asyncio.Semaphore(max_connections)
+        self.idle_ttl = idle_ttl
+        self.probe_after = probe_after
+        self.probe_timeout = probe_timeout
+        self.tcp_probe_timeout = tcp_probe_timeout
+        self.connections: "OrderedDict[str, PooledConnection]" = OrderedDict()
+        # Kilit sadece kullanılırken yaşar; silinen cihaz / değişen şifre anahtarı birikmez
+        self._key_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+        self._slots = asyncio.Condition()
+        self._opening = 0
+        self._last_eviction = time.monotonic()
+        
+        # Stats
+        self.connects = 0
+        self.connect_failures = 0
+        self.reconnects = 0
+        self.evictions = 0
+        self.probes = 0
+        self.probe_failures = 0
+        self.tcp_probe_failures = 0
+        self._connect_latencies: Deque[float] = deque(maxlen=500)
+    
+    @staticmethod
+    def device_key(device: MikrotikDevice) -> str:
+        # Şifre anahtarda/istatistiklerde açık görünmesin diye özetlenir
+        credentials = hashlib.sha256(f"{device.username}\0{device.password}".encode()).hexdigest()[:12]
+        return f"{device.id}@{device.ip_address}:{device.port}/{credentials}"
     
-    async def get_connection(self, device: MikrotikDevice):
-        """Get or create connection to MikroTik device"""
-        device_key = f"{device.ip_address}:{device.port}"
+    @asynccontextmanager
+    async def acquire(self, device: MikrotikDevice):
+        """Lease a healthy connection for the duration of the block"""
+        entry = await self._get_entry(device)
+        entry.in_use += 1
+        try:
+            yield entry.client
+        finally:
+            entry.in_use -= 1
+            entry.last_used = time.monotonic()
+            if entry.key in self.connections:
+                self.connections.move_to_end(entry.key)
+            if entry.in_use == 0:
+                async with self._slots:
+                    self._slots.notify()
+    
+    async def run(self, device: MikrotikDevice, operation: Callable[[AsyncRouterOSClient], Awaitable[Any]],
+                  retry: bool = True):
+        """
+        Run operation(connection); reconnect and retry once if the socket broke.
         
-        async with self.semaphore:
-            if device_key not in self.connections:
-                try:
-                    connection = await asyncio.to_thread(
-                        connect,
-                        username=device.username,
-                        password=device.password,
-                        host=device.ip_address,
-                        port=device.port,
-                        timeout=settings.CONNECTION_TIMEOUT
-                    )
-                    self.connections[device_key] = connection
-                    logger.info(f"Connected to {device.name} ({device.ip_address})")
-                except Exception as e:
-                    logger.error(f"Failed to connect to {device.name}: {str(e)}")
-                    raise
-            
-            return self.connections[device_key]
+        Only idempotent reads may retry: a command may already have run on the
+        router when the connection dropped, so callers pass retry=False.
+        """
+        try:
+            async with self.acquire(device) as connection:
+                return await operation(connection)
+        except (ConnectionClosedError, ConnectionError):
+            if not retry:
+                await self.close_connection(device)
+                raise
+            logger.info(f"Connection to {device.name} broken, reconnecting")
+            await self.close_connection(device)
+            self.reconnects += 1
+            async with self.acquire(device) as connection:
+                return await operation(connection)
+    
+    async def get_connection(self, device: MikrotikDevice) -> AsyncRouterOSClient:
+        """Get or create connection to MikroTik device (without leasing it)"""
+        return (await self._get_entry(device)).client
+    
+    async def _get_entry(self, device: MikrotikDevice) -> PooledConnection:
+        key = self.device_key(device)
+        await self._maybe_evict_idle()
+        
+        lock = self._key_locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            entry = self.connections.get(key)
+            if entry is not None and not await self._is_healthy(entry):
+                await self._remove(key)
+                self.reconnects += 1
+                entry = None
+            
+            if entry is None:
+                entry = await self._open(device, key)
+            
+            self.connections.move_to_end(key)
+            return entry
+    
+    async def _is_healthy(self, entry: PooledConnection) -> bool:
+        if entry.client.is_closed:
+            return False
+        if entry.in_use or time.monotonic() - entry.last_used < self.probe_after:
+            return True
+        
+        # Uzun süre boşta kaldı, kullanmadan önce ucuz bir komutla test et
+        self.probes += 1
+        try:
+            await entry.client.talk(['/system/identity/print'], timeout=self.probe_timeout)
+            return True
+        except Exception:
+            self.probe_failures += 1
+            return False
+    
+    async def _open(self, device: MikrotikDevice, key: str) -> PooledConnection:
+        if self.tcp_probe_timeout:
+            # Login'den önce kısa timeout'lu TCP kontrolü; kapalı cihaz için
+            # CONNECTION_TIMEOUT kadar beklemeyiz ve slot ayırmayız
+            error = await tcp_probe(device.ip_address, device.port, self.tcp_probe_timeout)
+            if error:
+                self.tcp_probe_failures += 1
+                raise DeviceUnreachableError(error)
+        
+        await self._reserve_slot()
+        started = time.monotonic()
+        try:
+            client = await AsyncRouterOSClient.connect(
+                host=device.ip_address,
+                port=device.port,
+                username=device.username,
+                password=device.password,
+                timeout=settings.CONNECTION_TIMEOUT,
+                use_ssl=device.port == settings.MIKROTIK_SSL_PORT
+            )
+        except Exception as e:
+            self.connect_failures += 1
+            logger.error(f"Failed to connect to {device.name}: {str(e)}")
+            raise
+        finally:
+            self._opening -= 1
+        
+        self._connect_latencies.append(time.monotonic() - started)
+        self.connects += 1
+        entry = PooledConnection(key, device.id, client)
+        self.connections[key] = entry
+        logger.info(f"Connected to {device.name} ({device.ip_address})")
+        return entry
     
-    def close_connection(self, device: MikrotikDevice):
+    async def _reserve_slot(self):
+        """Wait until opening one more connection stays within max_connections"""
+        async with self._slots:
+            while len(self.connections) + self._opening >= self.max_connections:
+                victim = next((e for e in self.connections.values() if e.in_use == 0), None)
+                if victim is not None:
+                    self.connections.pop(victim.key)
+                    self.evictions += 1
+                    asyncio.create_task(victim.client.close())
+                    continue
+                await self._slots.wait()
+            self._opening += 1
+    
+    async def _maybe_evict_idle(self):
+        now = time.monotonic()
+        if now - self._last_eviction < min(self.idle_ttl, 30):
+            return
+        self._last_eviction = now
+        await self.evict_idle()
+    
+    async def evict_idle(self) -> int:
+        """Close connections idle for longer than idle_ttl"""
+        now = time.monotonic()
+        expired = [
+            key for key, entry in self.connections.items()
+            if entry.in_use == 0 and now - entry.last_used > self.idle_ttl
+        ]
+        for key in expired:
+            await self._remove(key)
+            self.evictions += 1
+        return len(expired)
+    
+    async def _remove(self, key: str):
+        entry = self.connections.pop(key, None)
+        if entry is None:
+            return
+        try:
+            await entry.client.close()
+        except Exception as e:
+            logger.error(f"Error closing connection {key}: {str(e)}")
+        async with self._slots:
+            self._slots.notify()
+    
+    async def close_connection(self, device: MikrotikDevice):
         """Close connection to device"""
-        device_key = f"{device.ip_address}:{device.port}"
-        if device_key in self.connections:
-            try:
-                self.connections[device_key].close()
-                del self.connections[device_key]
-                logger.info(f"Disconnected from {device.name}")
-            except Exception as e:
-                logger.error(f"Error closing connection to {device.name}: {str(e)}")
-    
-    def close_all(self):
+        key = self.device_key(device)
+        if key in self.connections:
+            await self._remove(key)
+            logger.info(f"Disconnected from {device.name}")
+    
+    async def close_device(self, device_id: int) -> int:
+        """Close every pooled connection of a device (edited or deleted)"""
+        keys = [key for key, entry in self.connections.items() if entry.device_id == device_id]
+        for key in keys:
+            await self._remove(key)
+        return len(keys)
+    
+    async def close_all(self):
         """Close all connections"""
-        for device_key in list(self.connections.keys()):
-            try:
-                self.connections[device_key].close()
-                del self.connections[device_key]
-            except Exception as e:
-                logger.error(f"Error closing connection {device_key}: {str(e)}")
+        for key in list(self.connections.keys()):
+            await self._remove(key)
+    
+    def stats(self) -> dict:
+        """Pool usage and connection metrics"""
+        in_use = sum(1 for entry in self.connections.values() if entry.in_use)
+        latencies = list(self._connect_latencies)
+        return {
+            "max_connections": self.max_connections,
+            "open": len(self.connections),
+            "key_locks": len(self._key_locks),
+            "opening": self._opening,
+            "in_use": in_use,
+            "idle": len(self.connections) - in_use,
+            "in_flight_commands": sum(entry.client.in_flight for entry in self.connections.values()),
+            "connects": self.connects,
+            "connect_failures": self.connect_failures,
+            "reconnects": self.reconnects,
+            "evictions": self.evictions,
+            "probes": self.probes,
+            "probe_failures": self.probe_failures,
+            "tcp_probe_failures": self.tcp_probe_failures,
+            "connect_latency": {
+                "samples": len(latencies),
+                "avg": round(sum(latencies) / len(latencies), 3) if latencies else 0.0,
+                "max": round(max(latencies), 3) if latencies else 0.0,
+            },
+        }
 
 # Global connection pool
-connection_pool = MikrotikConnectionPool(settings.MAX_CONCURRENT_CONNECTIONS)
+connection_pool = MikrotikConnectionPool(
+    max_connections=settings.POOL_MAX_CONNECTIONS,
+    idle_ttl=settings.POOL_IDLE_TTL,
+    probe_after=settings.POOL_PROBE_AFTER,
+    tcp_probe_timeout=settings.TCP_PROBE_TIMEOUT
+)
+
+def build_device_info(result: PollResult) -> dict:
+    """Build the info dict (cpu, memory, system, identity, hardware) from a poll result"""
+    # Format the information
+    resource_data = result.first('resource')
+    identity_data = result.first('identity')
+    routerboard_data = result.first('routerboard')
+    
+    # Extract key information
+    cpu_info = {
+        'cpu_count': resource_data.get('cpu-count', 'N/A'),
+        'cpu_frequency': resource_data.get('cpu-frequency', 'N/A'),
+        'cpu_load': resource_data.get('cpu-load', 'N/A'),
+        'architecture': resource_data.get('architecture-name', 'N/A')
+    }
+    
+    memory_info = {
+        'total_memory': resource_data.get('total-memory', 'N/A'),
+        'free_memory': resource_data.get('free-memory', 'N/A'),
+        'total_hdd_space': resource_data.get('total-hdd-space', 'N/A'),
+        'free_hdd_space': resource_data.get('free-hdd-space', 'N/A')
+    }
+    
+    raw_uptime = resource_data.get('uptime', 'N/A')
+    system_info = {
+        'board_name': resource_data.get('board-name', 'N/A'),
+        'platform': resource_data.get('platform', 'N/A'),
+        'version': resource_data.get('version', 'N/A'),
+        'build_time': resource_data.get('build-time', 'N/A'),
+        'uptime': format_uptime(raw_uptime),  # Formatlanmış uptime
+        'uptime_raw': raw_uptime  # Ham uptime (debugging için)
+    }
+    
+    device_identity = {
+        'name': identity_data.get('name', 'N/A')
+    }
+    
+    hardware_info = {
+        'model': routerboard_data.get('model', 'N/A'),
+        'serial_number': routerboard_data.get('serial-number', 'N/A'),
+        'firmware_type': routerboard_data.get('firmware-type', 'N/A'),
+        'factory_firmware': routerboard_data.get('factory-firmware', 'N/A'),
+        'current_firmware': routerboard_data.get('current-firmware', 'N/A')
+    }
+    
+    return {
+        'cpu': cpu_info,
+        'memory': memory_info,
+        'system': system_info,
+        'identity': device_identity,
+        'hardware': hardware_info,
+        'raw_data': {
+            'resource': resource_data,
+            'identity': identity_data,
+            'routerboard': routerboard_data
+        }
+    }
+
+def device_info_fields(device, info: dict) -> Dict[str, Any]:
+    """
+    Device columns to update from an info dict.
+    
+    Manuel güncelleme yapılmışsa (manual_override) otomatik güncelleme
+    yapılmaz, böylece kullanıcının girdiği değerler ezilmez.
+    """
+    if device.manual_override:
+        return {}
+    
+    fields = {}
+    current_model = info['hardware'].get('model', '')
+    current_board_name = info['system'].get('board_name', '')
+    current_version = info['system'].get('version', '')
+    current_architecture = info['cpu'].get('architecture', '')
+    current_build_time = info['system'].get('build_time', '')
+    
+    if current_model != 'N/A':
+        fields['router_board'] = current_model
+    elif current_board_name != 'N/A':
+        fields['router_board'] = current_board_name
+    
+    if current_architecture != 'N/A':
+        fields['architecture'] = current_architecture
+    
+    if current_version != 'N/A':
+        fields['version'] = current_version
+    
+    if current_build_time != 'N/A':
+        fields['build_time'] = current_build_time
+    
+    return fields
+
+def info_heartbeat(info: dict) -> Dict[str, Any]:
+    """Per-poll values written through device_state heartbeats"""
+    cpu_load = info['cpu'].get('cpu_load', 'N/A')
+    return {
+        'cpu_load': cpu_load,
+        'cpu_load_pct': to_number(cpu_load),
+        'uptime': info['system']['uptime'],
+        'last_seen': datetime.utcnow(),
+    }
+
+def record_resource_metrics(device_id: int, resource_data: dict):
+    """Zaman serisi: geçmiş ORM yerine metric store'da tutulur"""
+    total_memory = to_number(resource_data.get('total-memory'))
+    free_memory = to_number(resource_data.get('free-memory'))
+    values = {
+        'cpu_load': to_number(resource_data.get('cpu-load')),
+        'memory_total': total_memory,
+        'memory_free': free_memory,
+        'memory_used_pct': (
+            (total_memory - free_memory) * 100 / total_memory
+            if total_memory and free_memory is not None else None
+        ),
+        'hdd_free': to_number(resource_data.get('free-hdd-space')),
+        'uptime': parse_uptime_seconds(resource_data.get('uptime')),
+    }
+    metric_store.record_many(device_id, values)
+    # Sadece bu cihaza abone olan istemcilere gider
+    broadcast_hub.publish_device('metrics', device_id, {
+        'type': 'metrics',
+        'device_id': device_id,
+        'timestamp': time.time(),
+        'values': values,
+    })
+
+def interface_rows(device_id: int, interfaces: List[dict], uptime: Optional[float] = None) -> List[dict]:
+    """
+    Convert /interface print output to DeviceInterface column values.
+    
+    Sayaçlar metric store'a yazılır ve bps/pps hesabı için traffic_rates'e
+    verilir; eksik gelen sayaç satıra konmaz (DB'deki değer korunur).
+    """
+    now = time.time()
+    rows = []
+    names = []
+    snapshot = np.full((len(interfaces), len(COUNTER_FIELDS)), np.nan)
+    
+    for row, iface_data in enumerate(interfaces):
+        name = iface_data.get('name')
+        counters = {
+            'rx_bytes': to_number(iface_data.get('rx-byte')),
+            'tx_bytes': to_number(iface_data.get('tx-byte')),
+            'rx_packets': to_number(iface_data.get('rx-packet')),
+            'tx_packets': to_number(iface_data.get('tx-packet')),
+        }
+        values = {
+            'ros_id': iface_data.get('.id'),
+            'name': name,
+            'type': iface_data.get('type'),
+            'mac_address': iface_data.get('mac-address'),
+            'running': iface_data.get('running') == 'true',
+            'disabled': iface_data.get('disabled') == 'true',
+        }
+        for column, (field, value) in enumerate(counters.items()):
+            if value is not None:
+                values[field] = int(value)
+                snapshot[row, column] = value
+        rows.append(values)
+        names.append(name)
+        metric_store.record_many(
+            device_id, {f"if:{name}:{field}": value for field, value in counters.items()}, now
+        )
+    
+    # bps/pps tüm filo için toplu hesaplanır (traffic_rates tick'i)
+    traffic_rates.submit(device_id, names, snapshot, now, uptime)
+    return rows
+
+def mark_online(outcome: PollOutcome, target: DeviceTarget):
+    outcome.set(target, 'is_online', True)
+    outcome.set(target, 'connection_attempts', 0)
+    outcome.set(target, 'last_error', None)
+
+def mark_offline(outcome: PollOutcome, target: DeviceTarget, error: Exception):
+    outcome.set(target, 'is_online', False)
+    outcome.set(target, 'connection_attempts', (target.connection_attempts or 0) + 1)
+    outcome.set(target, 'last_error', str(error))
+
+async def collect_device(target: DeviceTarget, plan: PollPlan = MONITOR_POLL_PLAN) -> PollOutcome:
+    """
+    Run a monitoring poll and return what should be written.
+    
+    Bağlantı kontrolü, sistem bilgisi ve interface'ler tek round trip'te
+    okunur. Ağ beklenirken ORM/oturum kullanılmaz; sonuç state_writer
+    tarafından toplu olarak yazılır. Sadece değişen sütunlar ve loglar
+    sonuca girer.
+    """
+    outcome = PollOutcome(target.id, target.name)
+    try:
+        result = await connection_pool.run(target, plan.execute)
+    except TrapError as e:
+        # Login sonrası bir komut hata döndü, cihaz cevap veriyor, durum değişmez.
+        # Login trap'i LoginError olarak gelir ve aşağıda offline sayılır.
+        logger.error(f"Error monitoring device {target.name}: {e}")
+        outcome.log("error", f"Poll failed: {str(e)}")
+        return outcome
+    except Exception as e:
+        mark_offline(outcome, target, e)
+        outcome.log("error", f"Connection failed: {str(e)}")
+        return outcome
+    
+    was_online = target.is_online
+    mark_online(outcome, target)
+    if not was_online:
+        outcome.log("info", "Connection test successful")
+    
+    if 'resource' in plan.collectors:
+        info = outcome.info = build_device_info(result)
+        for field, value in device_info_fields(target, info).items():
+            outcome.set(target, field, value)
+        device_state.heartbeat(target.id, **info_heartbeat(info))
+        record_resource_metrics(target.id, result.first('resource'))
+        
+        changes = device_state.diff_info(target.id, info)
+        if changes is None:
+            outcome.log("info", "Device system info retrieved", command="system info", response=info)
+        elif changes:
+            outcome.log("info", f"Device info changed: {', '.join(sorted(changes))}",
+                        command="system info", response={"changes": changes})
+    else:
+        device_state.heartbeat(target.id, last_seen=datetime.utcnow())
+    
+    if 'interfaces' in plan.collectors:
+        interfaces = result.get('interfaces')
+        uptime = parse_uptime_seconds(result.first('resource').get('uptime'))
+        outcome.interfaces = interface_rows(target.id, interfaces, uptime)
+        if device_state.interfaces_changed(target.id, len(interfaces)):
+            outcome.log("info", f"Retrieved {len(interfaces)} interfaces")
+    
+    return outcome
 
 class MikrotikService:
-    def __init__(self, db: Session):
-        self.db = db
+    """
+    API isteklerinin kullandığı cihaz işlemleri.
+    
+    Oturum tutmaz: cihaz DeviceTarget olarak verilir, değişiklikler
+    PollOutcome olarak state_writer ile yazılır, böylece istek beklerken
+    event loop'ta veritabanı işi yapılmaz. Monitor döngüsü collect_device
+    kullanır.
+    """
     
-    def log_activity(self, device: MikrotikDevice, level: str, message: str, 
+    def log_activity(self, target: DeviceTarget, level: str, message: str, 
                     command: str = None, response: dict = None):
-        """Log device activity"""
-        log = DeviceLog(
-            device_id=device.id,
-            log_level=level,
-            message=message,
-            command=command,
-            response=response,
-            timestamp=datetime.utcnow()
-        )
-        self.db.add(log)
-        self.db.commit()
+        """Log device activity (buffered, written in batches by log_writer)"""
+        log_writer.write(target.id, level, message, command=command, response=response)
     
-    async def test_connection(self, device: MikrotikDevice) -> bool:
+    async def test_connection(self, target: DeviceTarget) -> bool:
         """Test connection to MikroTik device"""
+        outcome = PollOutcome(target.id, target.name)
         try:
-            connection = await connection_pool.get_connection(device)
-            
             # Test with simple command
-            result = await asyncio.to_thread(
-                tuple, connection.path('system', 'identity')
-            )
+            await connection_pool.run(target, lambda connection: connection.query('/system/identity'))
             
-            device.is_online = True
-            device.last_seen = datetime.utcnow()
-            device.connection_attempts = 0
-            device.last_error = None
-            
-            self.log_activity(device, "info", "Connection test successful")
-            self.db.commit()
-            
-            return True
+            mark_online(outcome, target)
+            device_state.heartbeat(target.id, last_seen=datetime.utcnow())
+            outcome.log("info", "Connection test successful")
+            success = True
             
         except Exception as e:
-            device.is_online = False
-            device.connection_attempts += 1
-            device.last_error = str(e)
-            
-            self.log_activity(device, "error", f"Connection failed: {str(e)}")
-            self.db.commit()
-            
-            return False
+            mark_offline(outcome, target, e)
+            outcome.log("error", f"Connection failed: {str(e)}")
+            success = False
+        
+        await state_writer.write(outcome)
+        return success
     
-    async def get_device_info(self, device: MikrotikDevice) -> dict:
+    async def get_device_info(self, target: DeviceTarget) -> dict:
         """Get device system information including CPU, RAM, and identity"""
         try:
-            connection = await connection_pool.get_connection(device)
-            
-            # Get system resource info (CPU, RAM, etc.)
-            resource = await asyncio.to_thread(
-                list, connection.path('system', 'resource')
-            )
-            
-            # Get device identity (name)
-            identity = await asyncio.to_thread(
-                list, connection.path('system', 'identity')
-            )
-            
-            # Try to get routerboard info (hardware details)
-            try:
-                routerboard = await asyncio.to_thread(
-                    list, connection.path('system', 'routerboard')
-                )
-            except Exception:
-                # Some devices don't have routerboard command
-                routerboard = []
-            
-            # Format the information
-            resource_data = resource[0] if resource else {}
-            identity_data = identity[0] if identity else {}
-            routerboard_data = routerboard[0] if routerboard else {}
-            
-            # Extract key information
-            cpu_info = {
-                'cpu_count': resource_data.get('cpu-count', 'N/A'),
-                'cpu_frequency': resource_data.get('cpu-frequency', 'N/A'),
-                'cpu_load': resource_data.get('cpu-load', 'N/A'),
-                'architecture': resource_data.get('architecture-name', 'N/A')
-            }
-            
-            memory_info = {
-                'total_memory': resource_data.get('total-memory', 'N/A'),
-                'free_memory': resource_data.get('free-memory', 'N/A'),
-                'total_hdd_space': resource_data.get('total-hdd-space', 'N/A'),
-                'free_hdd_space': resource_data.get('free-hdd-space', 'N/A')
-            }
-            
-            raw_uptime = resource_data.get('uptime', 'N/A')
-            system_info = {
-                'board_name': resource_data.get('board-name', 'N/A'),
-                'platform': resource_data.get('platform', 'N/A'),
-                'version': resource_data.get('version', 'N/A'),
-                'build_time': resource_data.get('build-time', 'N/A'),
-                'uptime': format_uptime(raw_uptime),  # Formatlanmış uptime
-                'uptime_raw': raw_uptime  # Ham uptime (debugging için)
-            }
-            
-            device_identity = {
-                'name': identity_data.get('name', 'N/A')
-            }
-            
-            hardware_info = {
-                'model': routerboard_data.get('model', 'N/A'),
-                'serial_number': routerboard_data.get('serial-number', 'N/A'),
-                'firmware_type': routerboard_data.get('firmware-type', 'N/A'),
-                'factory_firmware': routerboard_data.get('factory-firmware', 'N/A'),
-                'current_firmware': routerboard_data.get('current-firmware', 'N/A')
-            }
-            
-            info = {
-                'cpu': cpu_info,
-                'memory': memory_info,
-                'system': system_info,
-                'identity': device_identity,
-                'hardware': hardware_info,
-                'raw_data': {
-                    'resource': resource_data,
-                    'identity': identity_data,
-                    'routerboard': routerboard_data
-                }
-            }
-            
-            # Update device database record (only if no manual override)
-            # Bu, manuel güncelleme yapıldığında otomatik güncelleme tarafından ezilmemesini sağlar
-            if not device.manual_override:
-                current_model = hardware_info.get('model', '')
-                current_board_name = system_info.get('board_name', '')
-                current_version = system_info.get('version', '')
-                current_architecture = cpu_info.get('architecture', '')
-                current_build_time = system_info.get('build_time', '')
-                
-                # Otomatik güncelleme yap (sadece manuel override olmadığında)
-                if current_model != 'N/A':
-                    device.router_board = current_model
-                elif current_board_name != 'N/A':
-                    device.router_board = current_board_name
-                
-                if current_architecture != 'N/A':
-                    device.architecture = current_architecture
-                
-                if current_version != 'N/A':
-                    device.version = current_version
-                
-                if current_build_time != 'N/A':
-                    device.build_time = current_build_time
-            # Update real-time metrics
-            device.cpu_load = cpu_info.get('cpu_load', 'N/A')
-            raw_uptime = resource_data.get('uptime', 'N/A')  # Ham uptime verisi
-            device.uptime = format_uptime(raw_uptime)  # Formatlanmış uptime
-            device.last_seen = datetime.utcnow()
-            device.is_online = True
-            
-            self.log_activity(device, "info", "Device system info retrieved", 
-                            command="system info", response=info)
-            self.db.commit()
-            
-            return info
-            
+            # resource, identity ve routerboard tek seferde sorgulanır
+            result = await connection_pool.run(target, DEVICE_INFO_PLAN.execute)
         except Exception as e:
-            self.log_activity(device, "error", f"Failed to get device info: {str(e)}")
+            self.log_activity(target, "error", f"Failed to get device info: {str(e)}")
             raise
+        
+        info = build_device_info(result)
+        outcome = PollOutcome(target.id, target.name)
+        # Update device record (only if no manual override)
+        for field, value in device_info_fields(target, info).items():
+            outcome.set(target, field, value)
+        outcome.set(target, 'is_online', True)
+        
+        # Update real-time metrics (heartbeat, toplu yazılır)
+        device_state.heartbeat(target.id, **info_heartbeat(info))
+        record_resource_metrics(target.id, result.first('resource'))
+        
+        outcome.log("info", "Device system info retrieved", command="system info", response=info)
+        await state_writer.write(outcome)
+        return info
     
-    async def get_interfaces(self, device: MikrotikDevice) -> List[dict]:
+    async def get_interfaces(self, target: DeviceTarget) -> List[dict]:
         """Get device interfaces"""
         try:
-            connection = await connection_pool.get_connection(device)
-            
-            interfaces = await asyncio.to_thread(
-                tuple, connection.path('interface')
-            )
-            
-            # Update database
-            for iface_data in interfaces:
-                iface = self.db.query(DeviceInterface).filter_by(
-                    device_id=device.id,
-                    name=iface_data.get('name')
-                ).first()
-                
-                if not iface:
-                    iface = DeviceInterface(
-                        device_id=device.id,
-                        name=iface_data.get('name'),
-                        type=iface_data.get('type'),
-                        mac_address=iface_data.get('mac-address'),
-                        running=iface_data.get('running') == 'true',
-                        disabled=iface_data.get('disabled') == 'true'
-                    )
-                    self.db.add(iface)
-                else:
-                    iface.type = iface_data.get('type')
-                    iface.mac_address = iface_data.get('mac-address')
-                    iface.running = iface_data.get('running') == 'true'
-                    iface.disabled = iface_data.get('disabled') == 'true'
-                    iface.last_updated = datetime.utcnow()
-            
-            self.db.commit()
-            
-            self.log_activity(device, "info", f"Retrieved {len(interfaces)} interfaces")
-            
-            return interfaces
-            
+            interfaces = await connection_pool.run(target, lambda connection: connection.query('/interface'))
         except Exception as e:
-            self.log_activity(device, "error", f"Failed to get interfaces: {str(e)}")
+            self.log_activity(target, "error", f"Failed to get interfaces: {str(e)}")
             raise
+        
+        outcome = PollOutcome(target.id, target.name)
+        outcome.interfaces = interface_rows(target.id, interfaces)
+        outcome.log("info", f"Retrieved {len(interfaces)} interfaces")
+        await state_writer.write(outcome)
+        
+        return interfaces
     
-    async def execute_command(self, device: MikrotikDevice, command_path: str, 
+    async def execute_command(self, target: DeviceTarget, command_path: str, 
                             params: dict = None) -> dict:
         """Execute command on MikroTik device"""
         try:
-            connection = await connection_pool.get_connection(device)
-            
-            # Parse command path
-            path_parts = command_path.split('.')
-            cmd_path = connection.path(*path_parts)
-            
-            # Execute command
-            if params:
-                result = await asyncio.to_thread(tuple, cmd_path.where(**params))
-            else:
-                result = await asyncio.to_thread(tuple, cmd_path)
+            # Execute command ('system.identity' -> '/system/identity/print')
+            # Kullanıcı komutu kopan bağlantıda tekrar gönderilmez, iki kez çalışabilir
+            result = await connection_pool.run(
+                target, lambda connection: connection.query(command_path, **(params or {})), retry=False
+            )
             
-            self.log_activity(device, "info", f"Command executed: {command_path}",
+            self.log_activity(target, "info", f"Command executed: {command_path}",
                             command=command_path, response=result)
             
             return {"success": True, "data": result}
             
         except Exception as e:
             error_msg = f"Command failed: {str(e)}"
-            self.log_activity(device, "error", error_msg, command=command_path)
+            self.log_activity(target, "error", error_msg, command=command_path)
             return {"success": False, "error": error_msg}
     
-    async def reboot_device(self, device: MikrotikDevice) -> dict:
+    async def reboot_device(self, target: DeviceTarget) -> dict:
         """Reboot MikroTik device"""
         try:
-            connection = await connection_pool.get_connection(device)
-            
-            # Execute reboot command
-            await asyncio.to_thread(
-                connection.path('system', 'reboot').call
-            )
+            # Execute reboot command (no retry, a reboot must not be sent twice)
+            async with connection_pool.acquire(target) as connection:
+                await connection.call('/system', 'reboot')
             
             # Close connection as device will reboot
-            connection_pool.close_connection(device)
+            await connection_pool.close_connection(target)
             
-            self.log_activity(device, "info", "Device reboot initiated")
+            self.log_activity(target, "info", "Device reboot initiated")
             
             return {"success": True, "message": "Reboot command sent"}
             
         except Exception as e:
             error_msg = f"Reboot failed: {str(e)}"
-            self.log_activity(device, "error", error_msg)
-            return {"success": False, "error": error_msg} 
\ No newline at end of file
+            self.log_activity(target, "error", error_msg)
+            return {"success": False, "error": error_msg}
@@ -0,0 +1,88 @@
+import asyncio
+import logging
+import time
+from typing import Dict, List, Tuple
+
+from .routeros_api import AsyncRouterOSClient
+
+logger = logging.getLogger(__name__)
+
+
+class PollResult:
+    """Combined result of a poll plan run"""
+
+    def __init__(self, data: Dict[str, List[dict]], errors: Dict[str, Exception], duration: float):
+        self.data = data
+        self.errors = errors
+        self.duration = duration
+
+    def get(self, name: str) -> List[dict]:
+        return self.data.get(name, [])
+
+    def first(self, name: str) -> dict:
+        """First row of a collector (e.g. /system/resource has exactly one)"""
+        rows = self.data.get(name)
+        return rows[0] if rows else {}
+
+
+class PollPlan:
+    """
+    Bir cihazdan tek seferde okunacak RouterOS path'lerinin listesi.
+
+    Tüm sorgular aynı bağlantı üzerinden '.tag' ile eş zamanlı gönderilir, bu
+    yüzden plana yeni bir collector eklemek sıralı gecikme eklemez.
+    """
+
+    def __init__(self):
+        # name -> (path, optional, where)
+        self.collectors: Dict[str, Tuple[str, bool, Dict[str, object]]] = {}
+
+    def add(self, name: str, path: str, optional: bool = False, **where) -> "PollPlan":
+        """Add a collector; optional collectors may fail without failing the plan"""
+        self.collectors[name] = (path, optional, where)
+        return self
+
+    def copy(self) -> "PollPlan":
+        plan = PollPlan()
+        plan.collectors = dict(self.collectors)
+        return plan
+
+    async def execute(self, connection: AsyncRouterOSClient) -> PollResult:
+        """Send every query at once and wait for all replies"""
+        started = time.monotonic()
+        names = list(self.collectors)
+        replies = await asyncio.gather(
+            *[connection.query(path, **where)
+              for path, _, where in self.collectors.values()],
+            return_exceptions=True
+        )
+
+        data: Dict[str, List[dict]] = {}
+        errors: Dict[str, Exception] = {}
+        for name, reply in zip(names, replies):
+            if isinstance(reply, BaseException):
+                if not self.collectors[name][1]:
+                    raise reply
+                # Bazı cihazlarda (örn. CHR/x86) /system/routerboard yoktur
+                logger.debug(f"Optional collector {name} failed: {reply}")
+                errors[name] = reply
+                data[name] = []
+            else:
+                data[name] = reply
+
+        return PollResult(data, errors, time.monotonic() - started)
+
+
+# Backoff sonrası ucuz bağlantı denemesi
+CONNECTION_TEST_PLAN = PollPlan().add("identity", "/system/identity")
+
+# Cihaz bilgisi için gereken okumalar
+DEVICE_INFO_PLAN = (
+    PollPlan()
+    .add("identity", "/system/identity")
+    .add("resource", "/system/resource")
+    .add("routerboard", "/system/routerboard", optional=True)
+)
+
+# Monitor döngüsünün her cihaz için çalıştırdığı plan
+MONITOR_POLL_PLAN = DEVICE_INFO_PLAN.copy().add("interfaces", "/interface")
@@ -0,0 +1,381 @@
+"""
+Asyncio tabanlı RouterOS API istemcisi.
+
+RouterOS API protokolü (https://help.mikrotik.com/docs/display/ROS/API):
+- Her kelime (word) uzunluk öneki + içerikten oluşur
+- Bir cümle (sentence) kelimelerden oluşur ve boş kelime (0 uzunluk) ile biter
+- Cevaplar '!re', '!done', '!trap', '!fatal' veya '!empty' ile başlar
+- '.tag' ile birden fazla komut aynı soket üzerinde aynı anda çalışabilir
+"""
+
+import asyncio
+import binascii
+import hashlib
+import itertools
+import logging
+import ssl
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+ENCODING = "utf-8"
+
+
+class RouterOSError(Exception):
+    """Base error for RouterOS API failures"""
+
+
+class TrapError(RouterOSError):
+    """Command returned !trap"""
+
+    def __init__(self, message: str, category: Optional[int] = None):
+        super().__init__(message)
+        self.message = message
+        self.category = category
+
+
+class FatalError(RouterOSError):
+    """Router sent !fatal, connection is unusable"""
+
+
+class ConnectionClosedError(RouterOSError):
+    """Connection was closed while a command was in flight"""
+
+
+class DeviceUnreachableError(RouterOSError):
+    """API port did not accept a TCP connection"""
+
+
+class LoginError(RouterOSError):
+    """Router rejected the login (!trap on /login), e.g. wrong credentials"""
+
+
+async def tcp_probe(host: str, port: int, timeout: float = 2) -> Optional[str]:
+    """
+    Cheap liveness check: open and immediately close a TCP connection.
+
+    Returns None if the port accepted the connection, otherwise the reason.
+    """
+    try:
+        _, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout=timeout)
+    except asyncio.TimeoutError:
+        return f"TCP connect to {host}:{port} timed out after {timeout}s"
+    except OSError as e:
+        return f"TCP connect to {host}:{port} failed: {e.strerror or e}"
+    writer.close()
+    try:
+        await writer.wait_closed()
+    except Exception:
+        pass
+    return None
+
+
+def encode_length(length: int) -> bytes:
+    """Encode word length using RouterOS variable-length prefix"""
+    if length < 0x80:
+        return bytes([length])
+    if length < 0x4000:
+        return (length | 0x8000).to_bytes(2, "big")
+    if length < 0x200000:
+        return (length | 0xC00000).to_bytes(3, "big")
+    if length < 0x10000000:
+        return (length | 0xE0000000).to_bytes(4, "big")
+    if length < 0x100000000:
+        return b"\xf0" + length.to_bytes(4, "big")
+    raise ValueError(f"Word too long: {length} bytes")
+
+
+def decode_length(prefix: bytes) -> int:
+    """Decode a complete length prefix (as returned by length_prefix_size)"""
+    first = prefix[0]
+    if first < 0x80:
+        return first
+    if first < 0xC0:
+        return int.from_bytes(prefix[:2], "big") & 0x3FFF
+    if first < 0xE0:
+        return int.from_bytes(prefix[:3], "big") & 0x1FFFFF
+    if first < 0xF0:
+        return int.from_bytes(prefix[:4], "big") & 0x0FFFFFFF
+    if first == 0xF0:
+        return int.from_bytes(prefix[1:5], "big")
+    raise RouterOSError(f"Invalid length prefix byte: {first:#x}")
+
+
+def length_prefix_size(first: int) -> int:
+    """Number of bytes in a length prefix given its first byte"""
+    if first < 0x80:
+        return 1
+    if first < 0xC0:
+        return 2
+    if first < 0xE0:
+        return 3
+    if first < 0xF0:
+        return 4
+    if first == 0xF0:
+        return 5
+    raise RouterOSError(f"Invalid length prefix byte: {first:#x}")
+
+
+def encode_word(word: str) -> bytes:
+    data = word.encode(ENCODING)
+    return encode_length(len(data)) + data
+
+
+def encode_sentence(words: List[str]) -> bytes:
+    return b"".join(encode_word(word) for word in words) + b"\x00"
+
+
+async def read_word(reader: asyncio.StreamReader) -> str:
+    first = (await reader.readexactly(1))[0]
+    size = length_prefix_size(first)
+    prefix = bytes([first])
+    if size > 1:
+        prefix += await reader.readexactly(size - 1)
+    length = decode_length(prefix)
+    if length == 0:
+        return ""
+    return (await reader.readexactly(length)).decode(ENCODING, errors="replace")
+
+
+async def read_sentence(reader: asyncio.StreamReader) -> List[str]:
+    words = []
+    while True:
+        word = await read_word(reader)
+        if word == "":
+            return words
+        words.append(word)
+
+
+def parse_sentence(words: List[str]) -> Tuple[str, Optional[str], Dict[str, str]]:
+    """Split a reply sentence into (reply_type, tag, attributes)"""
+    reply_type = words[0] if words else ""
+    tag = None
+    attrs: Dict[str, str] = {}
+    for word in words[1:]:
+        if word.startswith(".tag="):
+            tag = word[5:]
+        elif word.startswith("="):
+            key, _, value = word[1:].partition("=")
+            attrs[key] = value
+        elif reply_type == "!fatal":
+            # !fatal mesajı '=' olmadan gelir
+            attrs["message"] = word
+    return reply_type, tag, attrs
+
+
+def command_words(command: str, attributes: Optional[Dict[str, object]] = None,
+                  queries: Optional[Dict[str, object]] = None) -> List[str]:
+    """Build command words: '/path/cmd', '=key=value' attributes and '?key=value' queries"""
+    words = [command]
+    for key, value in (attributes or {}).items():
+        words.append(f"={key}={format_value(value)}")
+    for key, value in (queries or {}).items():
+        words.append(f"?{key}={format_value(value)}")
+    return words
+
+
+def format_value(value: object) -> str:
+    if value is True:
+        return "yes"
+    if value is False:
+        return "no"
+    return str(value)
+
+
+def path_to_command(path: str, action: str) -> str:
+    """'/system/identity' or 'system.identity' -> '/system/identity/print'"""
+    parts = [part for part in path.replace(".", "/").split("/") if part]
+    return "/" + "/".join(parts + [action])
+
+
+class _PendingCommand:
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.replies: List[Dict[str, str]] = []
+        self.trap: Optional[TrapError] = None
+        self.future: asyncio.Future = loop.create_future()
+
+
+class AsyncRouterOSClient:
+    """
+    RouterOS API bağlantısı.
+
+    Tek bir okuyucu task soketten gelen cümleleri '.tag' değerine göre ilgili
+    komuta dağıtır, bu sayede aynı bağlantı üzerinde birden fazla komut aynı
+    anda çalışabilir (thread kullanmadan).
+    """
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+                 timeout: float = 10):
+        self.reader = reader
+        self.writer = writer
+        self.timeout = timeout
+        self._tags = itertools.count(1)
+        self._pending: Dict[str, _PendingCommand] = {}
+        self._write_lock = asyncio.Lock()
+        self._closed = False
+        self._close_reason: Optional[Exception] = None
+        self._reader_task = asyncio.create_task(self._read_loop())
+
+    @classmethod
+    async def connect(cls, host: str, port: int, username: str, password: str,
+                      timeout: float = 10, use_ssl: bool = False) -> "AsyncRouterOSClient":
+        """Open TCP (or TLS) connection and log in"""
+        ssl_context = None
+        if use_ssl:
+            ssl_context = ssl.create_default_context()
+            # RouterOS genelde self-signed sertifika kullanır
+            ssl_context.check_hostname = False
+            ssl_context.verify_mode = ssl.CERT_NONE
+
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(host, port, ssl=ssl_context),
+            timeout=timeout
+        )
+        client = cls(reader, writer, timeout=timeout)
+        try:
+            await client.login(username, password)
+        except TrapError as e:
+            await client.close()
+            # Komut trap'inden ayrı: cihaz cevap veriyor ama kullanılamıyor
+            raise LoginError(f"Login failed: {e.message}") from e
+        except BaseException:
+            await client.close()
+            raise
+        return client
+
+    @property
+    def is_closed(self) -> bool:
+        return self._closed
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._pending)
+
+    async def login(self, username: str, password: str):
+        """Log in (post-6.43 plain login, falls back to legacy MD5 challenge)"""
+        replies = await self.talk(command_words("/login", {"name": username, "password": password}))
+        challenge = replies[-1].get("ret") if replies else None
+        if challenge:
+            digest = hashlib.md5()
+            digest.update(b"\x00")
+            digest.update(password.encode(ENCODING))
+            digest.update(binascii.unhexlify(challenge))
+            response = "00" + digest.hexdigest()
+            await self.talk(command_words("/login", {"name": username, "response": response}))
+
+    async def talk(self, words: List[str], timeout: Optional[float] = None) -> List[Dict[str, str]]:
+        """
+        Send one command and wait for its !done.
+
+        Returns the attributes of all !re replies; a trailing !done carrying
+        attributes (e.g. '=ret=') is appended as the last element.
+        """
+        if self._closed:
+            raise ConnectionClosedError(f"Connection closed: {self._close_reason}")
+
+        tag = str(next(self._tags))
+        pending = _PendingCommand(asyncio.get_running_loop())
+        self._pending[tag] = pending
+
+        try:
+            async with self._write_lock:
+                self.writer.write(encode_sentence(words + [f".tag={tag}"]))
+                await self.writer.drain()
+
+            return await asyncio.wait_for(
+                asyncio.shield(pending.future),
+                timeout=timeout if timeout is not None else self.timeout
+            )
+        except asyncio.TimeoutError:
+            await self._cancel(tag)
+            raise
+        finally:
+            self._pending.pop(tag, None)
+
+    async def query(self, path: str, **where) -> List[Dict[str, str]]:
+        """Run 'print' on a menu path, optionally filtered by ?key=value queries"""
+        return await self.talk(command_words(path_to_command(path, "print"), queries=where))
+
+    async def call(self, path: str, action: str, **attributes) -> List[Dict[str, str]]:
+        """Run an arbitrary command on a menu path (e.g. '/system', 'reboot')"""
+        return await self.talk(command_words(path_to_command(path, action), attributes))
+
+    async def _cancel(self, tag: str):
+        if self._closed:
+            return
+        try:
+            async with self._write_lock:
+                self.writer.write(encode_sentence(["/cancel", f"=tag={tag}"]))
+                await self.writer.drain()
+        except Exception:
+            pass
+
+    async def _read_loop(self):
+        try:
+            while True:
+                words = await read_sentence(self.reader)
+                if not words:
+                    continue
+                self._dispatch(*parse_sentence(words))
+        except asyncio.CancelledError:
+            self._fail_all(ConnectionClosedError("Connection closed"))
+            raise
+        except asyncio.IncompleteReadError:
+            self._fail_all(ConnectionClosedError("Connection closed by router"))
+        except FatalError as e:
+            self._fail_all(e)
+        except Exception as e:
+            self._fail_all(ConnectionClosedError(str(e)))
+        finally:
+            self._closed = True
+            self.writer.close()
+
+    def _dispatch(self, reply_type: str, tag: Optional[str], attrs: Dict[str, str]):
+        if reply_type == "!fatal":
+            raise FatalError(attrs.get("message", "fatal error"))
+
+        pending = self._pending.get(tag) if tag is not None else None
+        if pending is None or pending.future.done():
+            # Zaman aşımına uğramış / iptal edilmiş komutun geç gelen cevabı
+            return
+
+        if reply_type == "!re":
+            pending.replies.append(attrs)
+        elif reply_type == "!trap":
+            category = attrs.get("category")
+            pending.trap = TrapError(
+                attrs.get("message", "trap"),
+                int(category) if category and category.isdigit() else None
+            )
+        elif reply_type == "!done":
+            if pending.trap is not None:
+                pending.future.set_exception(pending.trap)
+            else:
+                if attrs:
+                    pending.replies.append(attrs)
+                pending.future.set_result(pending.replies)
+        # '!empty' (RouterOS 7.18+) gets no special handling; '!done' follows it
+
+    def _fail_all(self, error: Exception):
+        self._closed = True
+        self._close_reason = error
+        for pending in self._pending.values():
+            if not pending.future.done():
+                pending.future.set_exception(error)
+                # Retrieve so unawaited futures don't log "exception never retrieved"
+                pending.future.exception()
+
+    async def close(self):
+        """Close the connection and fail any in-flight commands"""
+        if not self._closed:
+            self._closed = True
+            self.writer.close()
+        self._reader_task.cancel()
+        try:
+            await self._reader_task
+        except (asyncio.CancelledError, Exception):
+            pass
+        try:
+            await self.writer.wait_closed()
+        except Exception:
+            pass
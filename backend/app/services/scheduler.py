@@ -0,0 +1,216 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import random
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, Iterable, List, Optional, Tuple
+
+from ..core.config import settings
+
+logger = logging.getLogger(__name__)
+
+PollFunc = Callable[[int], Awaitable[object]]
+
+
+class PollScheduler:
+    """
+    Cihaz bazlı poll zamanlayıcısı.
+
+    Her cihaz bir sonraki poll zamanına göre bir heap içinde tutulur. Sabit
+    sayıda worker slotu vardır; bir slot boşaldığı anda sırası gelen cihaz
+    başlatılır, böylece yavaş bir cihaz diğerlerini bekletmez.
+    """
+
+    def __init__(self, default_interval: float = 30, max_workers: int = 50,
+                 jitter: float = 0.1, group_intervals: Optional[Dict[str, float]] = None):
+        self.default_interval = default_interval
+        self.max_workers = max_workers
+        self.jitter = jitter
+        self.group_intervals: Dict[str, float] = dict(group_intervals or {})
+
+        # Heap entries: (due_time, token, device_id). Stale entries are
+        # skipped lazily by comparing the token with self._tokens.
+        self._heap: List[Tuple[float, int, int]] = []
+        self._seq = itertools.count()
+        self._tokens: Dict[int, int] = {}
+        self._intervals: Dict[int, float] = {}
+        self._in_flight: Dict[int, asyncio.Task] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._running = False
+
+        # Metrics
+        self._lag_samples: Deque[float] = deque(maxlen=1000)
+        self._duration_samples: Deque[float] = deque(maxlen=1000)
+        self.polls_started = 0
+        self.polls_completed = 0
+        self.polls_failed = 0
+
+    def interval_for(self, group_name: Optional[str] = None, interval: Optional[float] = None) -> float:
+        """Resolve poll interval for a device"""
+        if interval:
+            return float(interval)
+        if group_name and group_name in self.group_intervals:
+            return float(self.group_intervals[group_name])
+        return float(self.default_interval)
+
+    def schedule(self, device_id: int, group_name: Optional[str] = None,
+                 interval: Optional[float] = None, delay: Optional[float] = None):
+        """Add or reschedule a device"""
+        interval = self.interval_for(group_name, interval)
+        is_new = device_id not in self._tokens
+        if not is_new and self._intervals.get(device_id) == interval and delay is None:
+            return
+
+        self._intervals[device_id] = interval
+        if device_id in self._in_flight:
+            # Poll bittiğinde yeni interval ile tekrar planlanacak
+            self._tokens.setdefault(device_id, next(self._seq))
+            return
+
+        if delay is None:
+            # Yeni cihazları interval boyunca rastgele dağıt, hepsi aynı anda başlamasın
+            delay = random.uniform(0, interval) if is_new else interval
+        self._push(device_id, time.monotonic() + delay)
+
+    def remove(self, device_id: int):
+        """Stop polling a device"""
+        self._tokens.pop(device_id, None)
+        self._intervals.pop(device_id, None)
+
+    def sync(self, devices: Iterable[Tuple[int, Optional[str]]]):
+        """Bring the schedule in line with the current (device_id, group_name) list"""
+        seen = set()
+        for device_id, group_name in devices:
+            seen.add(device_id)
+            self.schedule(device_id, group_name)
+        for device_id in list(self._tokens):
+            if device_id not in seen:
+                self.remove(device_id)
+
+    def _push(self, device_id: int, due: float):
+        token = next(self._seq)
+        self._tokens[device_id] = token
+        heapq.heappush(self._heap, (due, token, device_id))
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def _next_due(self, due: float, interval: float, now: float) -> float:
+        next_due = due + interval
+        if next_due < now:
+            # Çok geride kaldıysa birikmiş pollları atla
+            next_due = now
+        if self.jitter:
+            next_due += random.uniform(-self.jitter, self.jitter) * interval
+        return max(next_due, now)
+
+    async def run(self, poll_fn: PollFunc):
+        """Run the scheduling loop until cancelled"""
+        self._wakeup = asyncio.Event()
+        self._slots = asyncio.Semaphore(self.max_workers)
+        self._running = True
+        logger.info(f"Poll scheduler started with {self.max_workers} workers")
+
+        try:
+            while True:
+                if not self._heap:
+                    self._wakeup.clear()
+                    await self._wakeup.wait()
+                    continue
+
+                due, token, device_id = self._heap[0]
+                if self._tokens.get(device_id) != token:
+                    heapq.heappop(self._heap)
+                    continue
+
+                now = time.monotonic()
+                if due > now:
+                    self._wakeup.clear()
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), timeout=due - now)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+
+                await self._slots.acquire()
+
+                # Slot beklenirken heap değişmiş olabilir, tekrar kontrol et
+                if not self._heap or self._heap[0][1] != token or self._tokens.get(device_id) != token:
+                    self._slots.release()
+                    continue
+
+                heapq.heappop(self._heap)
+                started = time.monotonic()
+                self._lag_samples.append(started - due)
+                self.polls_started += 1
+                self._in_flight[device_id] = asyncio.create_task(
+                    self._run_poll(poll_fn, device_id, due, started)
+                )
+        finally:
+            self._running = False
+            for task in list(self._in_flight.values()):
+                task.cancel()
+
+    async def _run_poll(self, poll_fn: PollFunc, device_id: int, due: float, started: float):
+        try:
+            await poll_fn(device_id)
+            self.polls_completed += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.polls_failed += 1
+            logger.error(f"Error polling device {device_id}: {e}")
+        finally:
+            finished = time.monotonic()
+            self._duration_samples.append(finished - started)
+            self._in_flight.pop(device_id, None)
+            self._slots.release()
+
+            interval = self._intervals.get(device_id)
+            if interval is not None and device_id in self._tokens:
+                self._push(device_id, self._next_due(due, interval, finished))
+
+    def stats(self) -> dict:
+        """Scheduler metrics including poll lag"""
+        lags = sorted(self._lag_samples)
+        durations = list(self._duration_samples)
+
+        def percentile(values: List[float], pct: float) -> float:
+            if not values:
+                return 0.0
+            index = min(len(values) - 1, int(round(pct * (len(values) - 1))))
+            return round(values[index], 3)
+
+        return {
+            "running": self._running,
+            "scheduled_devices": len(self._tokens),
+            "in_flight": len(self._in_flight),
+            "max_workers": self.max_workers,
+            "default_interval": self.default_interval,
+            "polls_started": self.polls_started,
+            "polls_completed": self.polls_completed,
+            "polls_failed": self.polls_failed,
+            "lag": {
+                "samples": len(lags),
+                "avg": round(sum(lags) / len(lags), 3) if lags else 0.0,
+                "p50": percentile(lags, 0.5),
+                "p95": percentile(lags, 0.95),
+                "max": round(lags[-1], 3) if lags else 0.0,
+            },
+            "poll_duration": {
+                "samples": len(durations),
+                "avg": round(sum(durations) / len(durations), 3) if durations else 0.0,
+                "max": round(max(durations), 3) if durations else 0.0,
+            },
+        }
+
+
+# Global poll scheduler
+poll_scheduler = PollScheduler(
+    default_interval=settings.POLL_INTERVAL,
+    max_workers=settings.MAX_CONCURRENT_CONNECTIONS,
+    jitter=settings.POLL_JITTER,
+    group_intervals=settings.POLL_GROUP_INTERVALS,
+)
@@ -0,0 +1,323 @@
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from ..core.config import settings
+from ..core.database import SessionLocal, db_writer, grouped_update
+from ..models.mikrotik import DeviceInterface, DeviceLog, MikrotikDevice
+from .device_state import device_state
+from .fleet_stats import fleet_stats
+from .log_writer import publish_logs
+
+logger = logging.getLogger(__name__)
+
+# Çok satırlı INSERT'lerde SQLite parametre sınırının altında kalmak için
+INSERT_CHUNK = 1000
+
+
+class DeviceTarget:
+    """
+    Plain copy of the device fields a poll needs.
+
+    Collectors work on this instead of the ORM object, so no session is open
+    (and nothing can lazy-load) while waiting on the network.
+    """
+
+    FIELDS = (
+        "id", "name", "ip_address", "port", "username", "password", "manual_override",
+        "is_online", "connection_attempts", "last_error", "last_seen",
+        "router_board", "version", "architecture", "build_time",
+    )
+
+    def __init__(self, **values):
+        for field in self.FIELDS:
+            setattr(self, field, values.get(field))
+
+    @classmethod
+    def from_device(cls, device: MikrotikDevice) -> "DeviceTarget":
+        return cls(**{field: getattr(device, field) for field in cls.FIELDS})
+
+    @classmethod
+    def load(cls, db: Session, device_id: int) -> Optional["DeviceTarget"]:
+        device = db.query(MikrotikDevice).filter(MikrotikDevice.id == device_id).first()
+        return cls.from_device(device) if device else None
+
+
+class PollOutcome:
+    """Everything one poll wants written: changed device columns, interfaces and logs"""
+
+    def __init__(self, device_id: int, name: str):
+        self.device_id = device_id
+        self.name = name
+        self.device: Dict[str, Any] = {}
+        self.interfaces: Optional[List[dict]] = None
+        self.logs: List[dict] = []
+        # Okunan sistem bilgisi; yazılmaz, canlı izleyicilere gider
+        self.info: Optional[dict] = None
+
+    def set(self, target: DeviceTarget, field: str, value: Any):
+        """Record a column change (only if it differs) and keep the target in sync"""
+        if getattr(target, field) != value:
+            self.device[field] = value
+            setattr(target, field, value)
+
+    def log(self, level: str, message: str, command: Optional[str] = None, response: Any = None):
+        self.logs.append({
+            "device_id": self.device_id,
+            "log_level": level,
+            "message": message,
+            "command": command,
+            "response": response,
+            "timestamp": datetime.utcnow(),
+        })
+
+    def merge(self, newer: "PollOutcome"):
+        """Fold a later outcome of the same device into this one"""
+        self.device.update(newer.device)
+        if newer.interfaces is not None:
+            self.interfaces = newer.interfaces
+        self.logs.extend(newer.logs)
+
+
+def _insert_many(db: Session, table, rows: List[dict]) -> List[int]:
+    """Multi-row INSERT in chunks; returns the ids given to the rows, in order"""
+    ids: List[int] = []
+    for start in range(0, len(rows), INSERT_CHUNK):
+        chunk = rows[start:start + INSERT_CHUNK]
+        result = db.execute(table.insert().values(chunk))
+        # Tek INSERT'in satırları sırayla max(rowid)+1 alır (yazıcı tek thread)
+        ids.extend(range(result.lastrowid - len(chunk) + 1, result.lastrowid + 1))
+    return ids
+
+
+# Interface satırında karşılaştırılan sütunlar (rate'leri traffic_rates yazar)
+INTERFACE_FIELDS = (
+    "ros_id", "name", "type", "mac_address", "running", "disabled",
+    "rx_bytes", "tx_bytes", "rx_packets", "tx_packets",
+)
+
+
+def _match_interfaces(existing: List[Any], rows: List[dict]):
+    """
+    Pair router rows with stored rows of one device.
+
+    RouterOS .id is tried first so a renamed interface keeps its row, then
+    the name. Returns (pairs of (stored, row), new rows, stored rows to drop).
+    """
+    by_ros_id = {stored.ros_id: stored for stored in existing if stored.ros_id}
+    by_name = {stored.name: stored for stored in existing}
+    claimed = set()
+    pairs, new = [], []
+    for row in rows:
+        stored = by_ros_id.get(row.get("ros_id"))
+        if stored is None or stored.id in claimed:
+            stored = by_name.get(row["name"])
+        if stored is None or stored.id in claimed:
+            new.append(row)
+        else:
+            claimed.add(stored.id)
+            pairs.append((stored, row))
+    stale = [stored for stored in existing if stored.id not in claimed]
+    return pairs, new, stale
+
+
+def apply_interface_snapshots(db: Session, snapshots: Dict[int, List[dict]]) -> Dict[str, int]:
+    """
+    Sync interface rows of several devices to the router's lists.
+
+    Stored rows are loaded with one SELECT, diffed against each device's
+    list, and the result is applied as bulk DELETE / UPDATE / INSERT:
+    unchanged rows are not written, and interfaces gone from the router are
+    deleted. Snapshots must be full /interface prints.
+    """
+    table = DeviceInterface.__table__
+    existing: Dict[int, List[Any]] = {device_id: [] for device_id in snapshots}
+    for stored in db.execute(
+        select(table.c.id, table.c.device_id, *[table.c[field] for field in INTERFACE_FIELDS])
+        .where(table.c.device_id.in_(list(snapshots)))
+    ):
+        existing[stored.device_id].append(stored)
+
+    now = datetime.utcnow()
+    updates: Dict[int, Dict[str, Any]] = {}
+    renamed: List[int] = []
+    inserts: List[dict] = []
+    deletes: List[int] = []
+    for device_id, rows in snapshots.items():
+        pairs, new, stale = _match_interfaces(existing[device_id], rows)
+        for stored, row in pairs:
+            if any(getattr(stored, field) != value for field, value in row.items()):
+                updates[stored.id] = {**row, "last_updated": now}
+                if stored.name != row["name"]:
+                    renamed.append(stored.id)
+        inserts.extend({"device_id": device_id, "last_updated": now, **row} for row in new)
+        deletes.extend(stored.id for stored in stale)
+
+    if deletes:
+        db.execute(table.delete().where(table.c.id.in_(deletes)))
+    if renamed:
+        # (device_id, name) unique; isimler yer değiştirirse ara çakışma olmasın
+        db.execute(table.update().where(table.c.id.in_(renamed)).values(name=None))
+    if updates:
+        grouped_update(db, table, updates)
+    if inserts:
+        # Sütun kümesi aynı olmalı (eksik sayaçlar None değil, hiç yok)
+        by_fields: Dict[tuple, List[dict]] = {}
+        for row in inserts:
+            by_fields.setdefault(tuple(sorted(row)), []).append(row)
+        for rows in by_fields.values():
+            _insert_many(db, table, rows)
+    return {"inserted": len(inserts), "updated": len(updates), "deleted": len(deletes)}
+
+
+class StateWriter:
+    """
+    Poller için unit-of-work.
+
+    Collector'lar sonuçlarını PollOutcome olarak submit() eder; tek bir yazıcı
+    task bekleyen sonuçları batch_size'a ulaşınca veya flush_interval dolunca
+    tek transaction'da yazar: cihaz sütunları, heartbeat'ler, interface'ler ve
+    loglar toplu UPDATE/INSERT ile. Böylece commit sayısı cihaz × çağrı yerine
+    batch sayısı kadardır.
+
+    Aynı cihazın henüz yazılmamış sonuçları birleştirilir, bu yüzden bekleyen
+    kuyruk cihaz sayısıyla sınırlıdır.
+    """
+
+    def __init__(self, batch_size: int = 200, flush_interval: float = 1):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._pending: Dict[int, PollOutcome] = {}
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self.submitted = 0
+        self.commits = 0
+        self.failed_batches = 0
+        self.last_batch_size = 0
+        self.last_batch_duration = 0.0
+        self.interface_changes: Dict[str, int] = {}
+
+    def submit(self, outcome: PollOutcome):
+        existing = self._pending.get(outcome.device_id)
+        if existing is None:
+            self._pending[outcome.device_id] = outcome
+        else:
+            existing.merge(outcome)
+        self.submitted += 1
+        if len(self._pending) >= self.batch_size:
+            self._wakeup.set()
+
+    @staticmethod
+    def _apply(batch: List[PollOutcome], devices: Dict[int, Dict[str, Any]], logs: List[dict]):
+        """Write one batch; returns (interface changes, ids of the inserted logs)"""
+        db = SessionLocal()
+        try:
+            if devices:
+                grouped_update(db, MikrotikDevice.__table__, devices)
+
+            snapshots = {outcome.device_id: outcome.interfaces
+                         for outcome in batch if outcome.interfaces is not None}
+            changes = apply_interface_snapshots(db, snapshots) if snapshots else {}
+
+            log_ids = _insert_many(db, DeviceLog.__table__, logs) if logs else []
+
+            db.commit()
+            return changes, log_ids
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    async def write(self, outcome: PollOutcome):
+        """Submit and flush right away, for API requests that return the new state"""
+        self.submit(outcome)
+        await self.flush()
+
+    async def flush(self) -> int:
+        """Write everything pending in one transaction; returns outcomes written"""
+        async with self._flush_lock:
+            if not self._pending and not device_state.has_pending():
+                return 0
+            pending, self._pending = self._pending, {}
+            heartbeats = device_state.take_pending()
+            devices = {device_id: dict(outcome.device) for device_id, outcome in pending.items() if outcome.device}
+            for device_id, values in heartbeats.items():
+                # Heartbeat sütunları aynı UPDATE'e katılır
+                devices.setdefault(device_id, {}).update(values)
+            logs = [log for outcome in pending.values() for log in outcome.logs]
+            started = time.monotonic()
+            try:
+                changes, log_ids = await db_writer.run(self._apply, list(pending.values()), devices, logs)
+            except Exception:
+                self.failed_batches += 1
+                # Geri koy; bu arada gelen daha yeni sonuçlar öncekilerin üzerine yazar
+                for device_id, newer in self._pending.items():
+                    if device_id in pending:
+                        pending[device_id].merge(newer)
+                    else:
+                        pending[device_id] = newer
+                self._pending = pending
+                device_state.restore_pending(heartbeats)
+                raise
+            self.commits += 1
+            # Yazılan durum /stats özetine yansır
+            fleet_stats.apply_updates(devices)
+            fleet_stats.add_logs(logs, log_ids)
+            publish_logs(logs, log_ids)
+            for kind, count in changes.items():
+                self.interface_changes[kind] = self.interface_changes.get(kind, 0) + count
+            self.last_batch_size = len(pending)
+            self.last_batch_duration = time.monotonic() - started
+            return len(pending)
+
+    async def _flush_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Failed to write poll results: {e}")
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._flush_loop())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self.flush()
+
+    def remove_device(self, device_id: int):
+        self._pending.pop(device_id, None)
+
+    def stats(self) -> dict:
+        return {
+            "pending_devices": len(self._pending),
+            "batch_size": self.batch_size,
+            "flush_interval": self.flush_interval,
+            "submitted": self.submitted,
+            "commits": self.commits,
+            "failed_batches": self.failed_batches,
+            "last_batch_size": self.last_batch_size,
+            "last_batch_ms": round(self.last_batch_duration * 1000, 1),
+            "interface_changes": self.interface_changes,
+        }
+
+
+# Global state writer
+state_writer = StateWriter(
+    batch_size=settings.STATE_WRITER_BATCH_SIZE,
+    flush_interval=settings.STATE_WRITER_FLUSH_INTERVAL,
+)
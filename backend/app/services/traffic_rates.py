@@ -0,0 +1,234 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import and_, bindparam
+
+from ..core.config import settings
+from ..core.database import SessionLocal, db_writer
+from ..models.mikrotik import DeviceInterface
+from .metrics_store import metric_store
+
+logger = logging.getLogger(__name__)
+
+# Sayaç sütunları ve bunlardan türetilen oranlar aynı sırada tutulur
+COUNTER_FIELDS = ("rx_bytes", "tx_bytes", "rx_packets", "tx_packets")
+RATE_FIELDS = ("rx_bps", "tx_bps", "rx_pps", "tx_pps")
+# byte -> bit, paket -> paket
+RATE_SCALE = np.array([8.0, 8.0, 1.0, 1.0])
+WRAP_32 = float(2 ** 32)
+
+InterfaceKey = Tuple[int, str]
+
+
+class TrafficRateEngine:
+    """
+    Interface sayaçlarından rx/tx bps ve pps hesaplar.
+
+    Poll edilen her cihazın sayaç snapshot'ı submit() ile sıraya alınır; her
+    tick'te sıradaki tüm snapshot'lar tek bir NumPy işlemiyle önceki değerlerle
+    karşılaştırılır. Önceki değerler interface başına bir satır olacak şekilde
+    büyüyen dizilerde tutulur.
+
+    Sayaç geriye giderse: önceki ve yeni değer 32-bit aralığındaysa ve sarma
+    sonrası oran makul ise 32-bit wrap kabul edilir, aksi halde sayaç sıfırlanmış
+    sayılır (reboot, 'reset-counters') ve o aralık için oran üretilmez. Cihazın
+    uptime'ı geriye gittiğinde tüm interface'leri reset kabul edilir.
+    """
+
+    def __init__(self, interval: float = 5, max_bps: float = 400e9):
+        self.interval = interval
+        self.max_bps = max_bps
+        # Wrap kabulü için üst sınır: byte/s ve en küçük (64 byte) çerçeveyle paket/s
+        self._max_per_second = np.array([max_bps / 8, max_bps / 8, max_bps / 512, max_bps / 512])
+        self._index: Dict[InterfaceKey, int] = {}
+        self._next_row = 0
+        self._prev = np.full((0, len(COUNTER_FIELDS)), np.nan)
+        self._prev_ts = np.zeros(0)
+        self._uptime: Dict[int, float] = {}
+        self._staged: List[Tuple[int, List[str], np.ndarray, float, bool]] = []
+        self._task: Optional[asyncio.Task] = None
+        # device_id -> interface -> oranlar (son hesaplanan)
+        self.latest: Dict[int, Dict[str, Dict[str, Optional[float]]]] = {}
+        self.wraps = 0
+        self.resets = 0
+        self.last_batch_size = 0
+        self.last_batch_duration = 0.0
+
+    def submit(self, device_id: int, names: List[str], counters: np.ndarray,
+               ts: Optional[float] = None, uptime: Optional[float] = None):
+        """Queue one device's counter snapshot (rows follow names, columns COUNTER_FIELDS)"""
+        previous_uptime = self._uptime.get(device_id)
+        rebooted = uptime is not None and previous_uptime is not None and uptime < previous_uptime
+        if uptime is not None:
+            self._uptime[device_id] = uptime
+        self._staged.append((device_id, names, counters, ts or time.time(), rebooted))
+
+    def _rows_for(self, device_id: int, names: List[str]) -> np.ndarray:
+        rows = np.empty(len(names), dtype=np.intp)
+        for i, name in enumerate(names):
+            row = self._index.get((device_id, name))
+            if row is None:
+                row = self._next_row
+                self._next_row += 1
+                self._index[(device_id, name)] = row
+            rows[i] = row
+        if self._next_row > len(self._prev_ts):
+            grow = max(self._next_row, 2 * len(self._prev_ts)) - len(self._prev_ts)
+            self._prev = np.vstack([self._prev, np.full((grow, len(COUNTER_FIELDS)), np.nan)])
+            self._prev_ts = np.concatenate([self._prev_ts, np.zeros(grow)])
+        return rows
+
+    def compute(self) -> List[Tuple[int, List[str], np.ndarray]]:
+        """Compute rates for everything staged since the last call"""
+        staged, self._staged = self._staged, []
+        results = []
+        while staged:
+            # Aynı cihaz bir tick'te iki kez gelirse (örn. manuel /interfaces
+            # çağrısı) sıradaki snapshot bir sonraki geçişe kalır
+            batch, deferred, seen = [], [], set()
+            for entry in staged:
+                (deferred if entry[0] in seen else batch).append(entry)
+                seen.add(entry[0])
+            staged = deferred
+            results.extend(self._compute_batch(batch))
+        return results
+
+    def _compute_batch(self, batch) -> List[Tuple[int, List[str], np.ndarray]]:
+        started = time.perf_counter()
+        rows = np.concatenate([self._rows_for(device_id, names) for device_id, names, *_ in batch])
+        current = np.vstack([counters for _, _, counters, _, _ in batch])
+        ts = np.concatenate([np.full(len(names), ts) for _, names, _, ts, _ in batch])
+        rebooted = np.concatenate([np.full(len(names), flag) for _, names, _, _, flag in batch])
+
+        previous = self._prev[rows]
+        elapsed = (ts - self._prev_ts[rows])[:, None]
+        delta = current - previous
+
+        # 32-bit sayaç taşması: iki değer de 2^32 altında ve sarılmış fark makul
+        wrapped = delta + WRAP_32
+        max_delta = self._max_per_second * elapsed
+        is_wrap = (delta < 0) & (previous < WRAP_32) & (current < WRAP_32) & (wrapped <= max_delta)
+        delta = np.where(is_wrap, wrapped, delta)
+
+        # Kalan negatif farklar sayaç sıfırlaması, reboot'ta tüm satır geçersiz
+        is_reset = (delta < 0) | rebooted[:, None]
+        valid = ~is_reset & (elapsed > 0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            rates = np.where(valid, delta * RATE_SCALE / elapsed, np.nan)
+
+        self.wraps += int(is_wrap.sum())
+        self.resets += int((is_reset & ~np.isnan(previous)).sum())
+
+        # Eksik gelen sayaç önceki değeri silmesin
+        self._prev[rows] = np.where(np.isnan(current), previous, current)
+        self._prev_ts[rows] = ts
+
+        self.last_batch_size = len(rows)
+        self.last_batch_duration = time.perf_counter() - started
+
+        results = []
+        offset = 0
+        for device_id, names, *_ in batch:
+            results.append((device_id, names, rates[offset:offset + len(names)]))
+            offset += len(names)
+        return results
+
+    def _store(self, results: List[Tuple[int, List[str], np.ndarray]], ts: float) -> List[dict]:
+        """Save rates to DeviceInterface and the metric store, return DB parameter rows"""
+        params = []
+        for device_id, names, rates in results:
+            device_rates = self.latest.setdefault(device_id, {})
+            for name, row in zip(names, rates.tolist()):
+                values = {
+                    field: (None if value != value else round(value, 2))
+                    for field, value in zip(RATE_FIELDS, row)
+                }
+                device_rates[name] = values
+                metric_store.record_many(
+                    device_id, {f"if:{name}:{field}": value for field, value in values.items()}, ts
+                )
+                params.append({"b_device_id": device_id, "b_name": name, **values})
+        return params
+
+    @staticmethod
+    def _write_rates(params: List[dict]):
+        table = DeviceInterface.__table__
+        statement = (
+            table.update()
+            .where(and_(table.c.device_id == bindparam("b_device_id"),
+                        table.c.name == bindparam("b_name")))
+            .values({field: bindparam(field) for field in RATE_FIELDS})
+        )
+        db = SessionLocal()
+        try:
+            # Tek executemany, interface başına ayrı sorgu yok
+            db.execute(statement, params)
+            db.commit()
+        finally:
+            db.close()
+
+    async def tick(self, publish: Optional[Callable[[dict], Awaitable[None]]] = None):
+        results = self.compute()
+        if not results:
+            return
+        now = time.time()
+        params = self._store(results, now)
+        if params:
+            try:
+                await db_writer.run(self._write_rates, params)
+            except Exception as e:
+                logger.error(f"Failed to store interface rates: {e}")
+        if publish is not None:
+            await publish({
+                "type": "interface_rates",
+                "timestamp": now,
+                "devices": {
+                    device_id: {name: self.latest[device_id][name] for name in names}
+                    for device_id, names, _ in results
+                },
+            })
+
+    async def _loop(self, publish):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.tick(publish)
+            except Exception as e:
+                logger.error(f"Error computing interface rates: {e}")
+
+    def start(self, publish: Optional[Callable[[dict], Awaitable[None]]] = None):
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop(publish))
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def remove_device(self, device_id: int):
+        """Forget a deleted device (its rows stay allocated but are never reused)"""
+        for key in [key for key in self._index if key[0] == device_id]:
+            self._prev[self._index.pop(key)] = np.nan
+        self._uptime.pop(device_id, None)
+        self.latest.pop(device_id, None)
+
+    def stats(self) -> dict:
+        return {
+            "interval": self.interval,
+            "interfaces": len(self._index),
+            "staged": len(self._staged),
+            "last_batch_size": self.last_batch_size,
+            "last_batch_ms": round(self.last_batch_duration * 1000, 3),
+            "wraps": self.wraps,
+            "resets": self.resets,
+        }
+
+
+# Global rate engine
+traffic_rates = TrafficRateEngine(
+    interval=settings.RATE_INTERVAL,
+    max_bps=settings.RATE_MAX_BPS,
+)
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Benchmark /devices read latency while a poller-like writer runs.
+
+Runs the same workload against a scratch database twice: once with
+SQLite defaults and once with the configured profile (settings.SQLITE_PRAGMAS,
+separate read pool). The writer commits one batch per cycle the way the state
+writer and log writer do; readers run the /devices query in a loop.
+
+    python benchmark_sqlite.py --devices 1000 --duration 20 --readers 4
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import bindparam
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from app.core.config import settings
+from app.core.database import Base, create_sqlite_engine
+from app.models.mikrotik import DeviceInterface, DeviceLog, MikrotikDevice
+from app.schemas.mikrotik import MikrotikDevice as MikrotikDeviceSchema
+
+INTERFACES_PER_DEVICE = 10
+
+
+def seed(engine, devices: int):
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as connection:
+        connection.execute(MikrotikDevice.__table__.insert(), [
+            {"id": i, "name": f"router-{i}", "ip_address": f"10.{i // 65536}.{i // 256 % 256}.{i % 256}",
+             "username": "admin", "password": "x", "is_online": True, "group_name": "default"}
+            for i in range(1, devices + 1)
+        ])
+        connection.execute(DeviceInterface.__table__.insert(), [
+            {"device_id": i, "name": f"ether{n}", "rx_bytes": 0, "tx_bytes": 0}
+            for i in range(1, devices + 1) for n in range(INTERFACES_PER_DEVICE)
+        ])
+
+
+def writer(engine, devices: int, stop: threading.Event, result: dict):
+    """One transaction per cycle: device heartbeats, interface counters, logs"""
+    Session = sessionmaker(bind=engine)
+    devices_table = MikrotikDevice.__table__
+    interfaces_table = DeviceInterface.__table__
+    update_devices = devices_table.update().where(devices_table.c.id == bindparam("b_id")).values(
+        last_seen=bindparam("last_seen"), cpu_load=bindparam("cpu_load"))
+    update_interfaces = interfaces_table.update().where(interfaces_table.c.id == bindparam("b_id")).values(
+        rx_bytes=bindparam("rx_bytes"))
+    cycle = 0
+    while not stop.is_set():
+        cycle += 1
+        now = datetime.utcnow()
+        db = Session()
+        started = time.perf_counter()
+        try:
+            db.execute(update_devices, [
+                {"b_id": i, "last_seen": now, "cpu_load": f"{(i + cycle) % 100}%"} for i in range(1, devices + 1)
+            ])
+            db.execute(update_interfaces, [
+                {"b_id": i, "rx_bytes": cycle * i} for i in range(1, devices * INTERFACES_PER_DEVICE + 1)
+            ])
+            db.execute(DeviceLog.__table__.insert().values([
+                {"device_id": i % devices + 1, "log_level": "info", "message": f"poll {cycle}", "timestamp": now}
+                for i in range(200)
+            ]))
+            db.commit()
+            result["commits"] += 1
+            result["commit_times"].append(time.perf_counter() - started)
+        except OperationalError:
+            db.rollback()
+            result["errors"] += 1
+        finally:
+            db.close()
+
+
+def reader(engine, stop: threading.Event, result: dict):
+    """The /devices endpoint: first page, serialized like the response model"""
+    Session = sessionmaker(bind=engine)
+    while not stop.is_set():
+        db = Session()
+        started = time.perf_counter()
+        try:
+            devices = db.query(MikrotikDevice).offset(0).limit(100).all()
+            [MikrotikDeviceSchema.model_validate(device) for device in devices]
+            result["latencies"].append(time.perf_counter() - started)
+        except OperationalError:
+            result["errors"] += 1
+        finally:
+            db.close()
+
+
+def percentile(values, p):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def run(name: str, pragmas: dict, read_pool: bool, args) -> dict:
+    directory = tempfile.mkdtemp(prefix="sqlite-bench-")
+    url = f"sqlite:///{os.path.join(directory, 'bench.db')}"
+    write_engine = create_sqlite_engine(url, pragmas)
+    read_engine = create_sqlite_engine(url, pragmas, read_only=True, pool_size=args.readers) if read_pool else write_engine
+    seed(write_engine, args.devices)
+
+    stop = threading.Event()
+    write_result = {"commits": 0, "errors": 0, "commit_times": []}
+    read_results = [{"latencies": [], "errors": 0} for _ in range(args.readers)]
+    threads = [threading.Thread(target=writer, args=(write_engine, args.devices, stop, write_result))]
+    threads += [threading.Thread(target=reader, args=(read_engine, stop, result)) for result in read_results]
+    for thread in threads:
+        thread.start()
+    time.sleep(args.duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    write_engine.dispose()
+    read_engine.dispose()
+
+    latencies = [latency for result in read_results for latency in result["latencies"]]
+    return {
+        "profile": name,
+        "reads": len(latencies),
+        "read_errors": sum(result["errors"] for result in read_results),
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "max_ms": max(latencies, default=float("nan")) * 1000,
+        "commits": write_result["commits"],
+        "write_errors": write_result["errors"],
+        "commit_ms": statistics.mean(write_result["commit_times"]) * 1000 if write_result["commit_times"] else float("nan"),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--devices", type=int, default=1000)
+    parser.add_argument("--duration", type=float, default=10, help="seconds per profile")
+    parser.add_argument("--readers", type=int, default=4, help="concurrent /devices readers")
+    args = parser.parse_args()
+
+    print(f"🔧 {args.devices} devices, {args.devices * INTERFACES_PER_DEVICE} interfaces, "
+          f"{args.readers} readers, {args.duration}s per profile")
+    results = [
+        run("default", {}, False, args),
+        run("configured", settings.SQLITE_PRAGMAS, True, args),
+    ]
+    header = f"{'profile':<12}{'reads':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}" \
+             f"{'r.err':>7}{'commits':>9}{'commit ms':>11}{'w.err':>7}"
+    print(header)
+    for r in results:
+        print(f"{r['profile']:<12}{r['reads']:>8}{r['p50_ms']:>9.2f}{r['p95_ms']:>9.2f}{r['p99_ms']:>9.2f}"
+              f"{r['max_ms']:>9.2f}{r['read_errors']:>7}{r['commits']:>9}{r['commit_ms']:>11.1f}{r['write_errors']:>7}")
+
+
+if __name__ == "__main__":
+    main()
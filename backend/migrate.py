@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""
+Apply pending schema migrations (app/core/migrations.py).
+
+    python migrate.py            # apply pending migrations
+    python migrate.py --status   # list applied and pending versions
+
+The API applies them on startup as well; this is for upgrading a database
+without starting the server.
+"""
+import argparse
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import app.models.mikrotik  # noqa: F401  (tabloları Base'e kaydeder)
+from app.core.database import Base, engine
+from app.core.migrations import MIGRATIONS, applied_versions, run_migrations
+
+def show_status():
+    done = applied_versions(engine)
+    for migration in sorted(MIGRATIONS, key=lambda migration: migration.version):
+        if migration.version in done:
+            print(f"✅ {migration.version:>3} {migration.name:<24} applied {done[migration.version][1]}")
+        else:
+            print(f"⏳ {migration.version:>3} {migration.name:<24} pending")
+
+def migrate():
+    try:
+        Base.metadata.create_all(bind=engine)
+        applied = run_migrations(engine)
+        for migration in applied:
+            print(f"✅ {migration.version:>3} {migration.name} applied")
+        if not applied:
+            print("✅ Database is up to date")
+    except Exception as e:
+        print(f"❌ Error during migration: {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Apply schema migrations")
+    parser.add_argument("--status", action="store_true", help="show applied and pending migrations")
+    args = parser.parse_args()
+    if args.status:
+        show_status()
+    else:
+        migrate()
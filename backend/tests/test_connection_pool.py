@@ -0,0 +1,64 @@
+"""Connection pool: per-key locks don't accumulate, commands are not retried"""
+
+import asyncio
+import gc
+
+import pytest
+
+from app.services.mikrotik_service import MikrotikConnectionPool
+from app.services.routeros_api import ConnectionClosedError
+from app.services.state_writer import DeviceTarget
+from test_routeros_api import FakeRouter
+
+
+def make_target(port, password="secret"):
+    return DeviceTarget(id=3, name="r1", ip_address="127.0.0.1", port=port,
+                        username="admin", password=password)
+
+
+async def never_ends(router):
+    await asyncio.Event().wait()
+
+
+def test_key_locks_released_after_close_device():
+    async def main():
+        pool = MikrotikConnectionPool(tcp_probe_timeout=None)
+        async with FakeRouter(never_ends) as router:
+            # Şifre değişikliği yeni bir anahtar demek
+            for password in ("secret", "changed"):
+                async with pool.acquire(make_target(router.port, password)):
+                    pass
+            await pool.close_device(3)
+        gc.collect()
+        return pool.stats()
+
+    stats = asyncio.run(main())
+    assert stats["open"] == 0
+    assert stats["key_locks"] == 0
+
+
+@pytest.mark.parametrize("retry, calls", [(True, 2), (False, 1)])
+def test_broken_connection_retry(retry, calls):
+    async def main():
+        pool = MikrotikConnectionPool(tcp_probe_timeout=None)
+        attempts = []
+
+        async def operation(connection):
+            attempts.append(connection)
+            if len(attempts) == 1:
+                raise ConnectionClosedError("Connection closed")
+            return "ok"
+
+        # İlk bağlantı koparsa retry için ikinci bir sunucu bağlantısı gerekir
+        async with FakeRouter(never_ends) as router:
+            target = make_target(router.port)
+            try:
+                result = await pool.run(target, operation, retry=retry)
+            except ConnectionClosedError:
+                result = None
+            await pool.close_all()
+        return attempts, result
+
+    attempts, result = asyncio.run(main())
+    assert len(attempts) == calls
+    assert result == ("ok" if retry else None)
@@ -0,0 +1,42 @@
+"""A long write on the DB writer thread must not hold up the event loop"""
+
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core.database import db_writer
+from app.main import app
+
+WRITE_SECONDS = 1.5
+
+
+@pytest.fixture
+def client(monkeypatch):
+    # Monitör, yazıcılar ve init_db başlamasın; sadece HTTP/WS yolu test edilir
+    monkeypatch.setattr(app.router, "on_startup", [])
+    monkeypatch.setattr(app.router, "on_shutdown", [])
+    with TestClient(app) as client:
+        yield client
+
+
+def test_slow_write_does_not_delay_health_or_pong(client):
+    # Yazma, isteklerle aynı event loop'tan kuyruğa verilir
+    write = client.portal.start_task_soon(db_writer.run, time.sleep, WRITE_SECONDS)
+    started = time.monotonic()
+
+    response = client.get("/health")
+    health_seconds = time.monotonic() - started
+    assert response.status_code == 200
+
+    with client.websocket_connect("/ws") as websocket:
+        ping_started = time.monotonic()
+        websocket.send_json({"type": "ping"})
+        assert websocket.receive_json() == {"type": "pong"}
+        pong_seconds = time.monotonic() - ping_started
+
+    # Yazma hâlâ sürüyor olmalı, yoksa test bir şey kanıtlamaz
+    assert not write.done()
+    assert health_seconds < WRITE_SECONDS / 3
+    assert pong_seconds < WRITE_SECONDS / 3
+    write.result(timeout=WRITE_SECONDS * 2)
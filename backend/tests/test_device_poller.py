@@ -0,0 +1,50 @@
+"""A poll that fails at login marks the device offline and trips the breaker"""
+
+import asyncio
+from datetime import datetime
+
+import pytest
+
+from app.services import device_poller
+from app.services.circuit_breaker import BreakerRegistry
+from app.services.device_feed import DeviceFeed
+from app.services.state_writer import DeviceTarget
+from test_routeros_api import FakeRouter
+
+DEVICE_ID = 11
+
+
+@pytest.fixture
+def poller(monkeypatch):
+    """poll_once with its DB and writer ends replaced, the real pool and collectors"""
+    submitted = []
+    monkeypatch.setattr(device_poller.state_writer, "submit", submitted.append)
+    monkeypatch.setattr(device_poller, "device_breakers", BreakerRegistry(failure_threshold=1))
+    monkeypatch.setattr(device_poller, "device_feed", DeviceFeed())
+    return submitted
+
+
+def test_login_trap_marks_device_offline(poller, monkeypatch):
+    async def main():
+        async with FakeRouter(login_trap="invalid user name or password (6)") as router:
+            target = DeviceTarget(
+                id=DEVICE_ID, name="r1", ip_address="127.0.0.1", port=router.port,
+                username="admin", password="wrong", is_online=True, connection_attempts=0,
+                last_seen=datetime(2024, 1, 1),
+            )
+
+            async def run_read(load, device_id):
+                return target
+
+            monkeypatch.setattr(device_poller, "run_read", run_read)
+            return await device_poller.poll_once(DEVICE_ID)
+
+    target, outcome = asyncio.run(main())
+    assert target.is_online is False
+    assert "invalid user name or password" in target.last_error
+    assert outcome.device["is_online"] is False
+    assert outcome.device["connection_attempts"] == 1
+    assert poller == [outcome]
+    # Başarı değil hata sayıldı, eşik 1 olduğu için devre açık
+    assert device_poller.device_breakers.get(DEVICE_ID).state == "open"
+    assert device_poller.device_feed._pending[DEVICE_ID]["is_online"] is False
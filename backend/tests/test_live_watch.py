@@ -0,0 +1,84 @@
+"""Live collectors follow the device's circuit breaker and publish its status"""
+
+import asyncio
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+
+from app.services import device_poller
+from app.services.circuit_breaker import BreakerRegistry
+from app.services.device_feed import DeviceFeed
+from app.services.live_watch import LiveWatch
+from app.services.state_writer import PollOutcome
+
+DEVICE_ID = 7
+
+
+@pytest.fixture
+def router(monkeypatch):
+    """An unreachable device: every collection fails and is counted"""
+    router = SimpleNamespace(
+        target=SimpleNamespace(
+            id=DEVICE_ID, name="r1", router_board=None, version=None, is_online=False,
+            last_seen=datetime(2024, 1, 1), last_error=None,
+        ),
+        attempts=0, submitted=[],
+    )
+
+    async def run_read(load, device_id):
+        return router.target
+
+    async def collect_device(target, plan=None):
+        router.attempts += 1
+        target.is_online = False
+        target.last_error = "TCP connect failed"
+        return PollOutcome(target.id, target.name)
+
+    # Sadece bağlantı ve yazma uçları değişir, kesici ve akış gerçek
+    monkeypatch.setattr(device_poller, "run_read", run_read)
+    monkeypatch.setattr(device_poller, "collect_device", collect_device)
+    monkeypatch.setattr(device_poller.state_writer, "submit", router.submitted.append)
+    monkeypatch.setattr(device_poller, "device_breakers", BreakerRegistry(failure_threshold=3))
+    monkeypatch.setattr(device_poller, "device_feed", DeviceFeed())
+    return router
+
+
+def test_open_breaker_stops_connection_attempts(router):
+    watch = LiveWatch(interval=0)
+
+    async def main():
+        for _ in range(10):
+            await watch.collect(DEVICE_ID)
+
+    asyncio.run(main())
+    # Eşikteki hatalardan sonra devre açılır, kalan tick'ler cihaza gitmez
+    assert router.attempts == 3
+    assert len(router.submitted) == 3
+    assert watch.skipped == 7
+    assert device_poller.device_breakers.get(DEVICE_ID).state == "open"
+
+
+def test_status_goes_to_device_feed(router):
+    asyncio.run(LiveWatch(interval=0).collect(DEVICE_ID))
+    pending = device_poller.device_feed._pending[DEVICE_ID]
+    assert pending["is_online"] is False
+    assert pending["last_error"] == "TCP connect failed"
+
+
+def test_device_over_limit_starts_when_a_slot_frees(router):
+    async def main():
+        watch = LiveWatch(interval=60, max_devices=1)
+        watch.set_watched(1, [DEVICE_ID])
+        watch.set_watched(2, [DEVICE_ID + 1])
+        # Limit dolu, ikinci cihaz sırada bekler
+        assert set(watch._tasks) == {DEVICE_ID}
+        assert watch.stats()["waiting"] == {DEVICE_ID + 1: 1}
+
+        watch.set_watched(1, ())
+        assert set(watch._tasks) == {DEVICE_ID + 1}
+        assert watch.stats()["devices"] == {DEVICE_ID + 1: 1}
+        assert watch.stats()["waiting"] == {}
+        await watch.close()
+
+    asyncio.run(main())
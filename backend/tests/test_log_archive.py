@@ -0,0 +1,127 @@
+"""Expired logs move to the archive per level policy; archived data expires per level"""
+
+import asyncio
+import importlib
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.orm import sessionmaker
+
+from app.core.database import Base, create_sqlite_engine
+from app.core.migrations import run_migrations
+from app.models.mikrotik import DeviceLog
+from app.services.log_archive import LogArchive
+from app.services.log_retention import LogRetentionEngine
+
+# app.services paketi aynı isimli global örnekleri export ediyor, modüllerin kendisi lazım
+log_archive_module = importlib.import_module("app.services.log_archive")
+log_retention_module = importlib.import_module("app.services.log_retention")
+
+NOW = datetime(2024, 6, 1, 12, 0)
+DAY = 86400
+
+
+@pytest.fixture
+def session_factory(tmp_path, monkeypatch):
+    """Scratch database the archive and retention engine write to"""
+    engine = create_sqlite_engine(f"sqlite:///{tmp_path}/logs.db")
+    Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
+    factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    for module in (log_archive_module, log_retention_module):
+        monkeypatch.setattr(module, "SessionLocal", factory)
+    yield factory
+    engine.dispose()
+
+
+def add_logs(factory, *logs):
+    db = factory()
+    for level, age_days in logs:
+        db.add(DeviceLog(device_id=1, log_level=level, message=f"{level} {age_days}d",
+                         timestamp=NOW - timedelta(days=age_days)))
+    db.commit()
+    db.close()
+
+
+def live_messages(factory):
+    db = factory()
+    try:
+        return sorted(db.execute(select(DeviceLog.message)).scalars())
+    finally:
+        db.close()
+
+
+def test_only_expired_levels_are_archived(session_factory, tmp_path):
+    add_logs(session_factory, ("info", 1), ("info", 10), ("error", 10), ("error", 100))
+    archive = LogArchive(str(tmp_path / "archive"), retention={"info": 30 * DAY, "default": 365 * DAY})
+    engine = LogRetentionEngine(retention={"info": 7 * DAY, "error": 90 * DAY, "default": 30 * DAY},
+                                collapse_after=0, archive=archive)
+
+    removed = asyncio.run(engine.prune(NOW))
+
+    # Canlı tabloda her seviye kendi penceresi kadar kalır
+    assert removed == {"info": 1, "error": 1, "default": 0}
+    assert live_messages(session_factory) == ["error 10d", "info 1d"]
+    assert sorted(record["message"] for record in archive.iter_logs(1)) == ["error 100d", "info 10d"]
+    assert {segment["level"] for segment in archive.segments} == {"info", "default"}
+
+
+def test_archived_segments_expire_per_level(session_factory, tmp_path):
+    add_logs(session_factory, ("info", 10), ("error", 100))
+    archive = LogArchive(str(tmp_path / "archive"), retention={"info": 30 * DAY, "default": 365 * DAY})
+    engine = LogRetentionEngine(retention={"info": 7 * DAY, "error": 90 * DAY},
+                                collapse_after=0, archive=archive)
+    asyncio.run(engine.prune(NOW))
+
+    # 25 gün sonra info kaydı 35 günlük (arşiv süresi 30), error 125 günlük (365)
+    assert archive._prune_segments(NOW + timedelta(days=25)) == 1
+    assert [record["message"] for record in archive.iter_logs(1)] == ["error 100d"]
+
+
+def test_without_archive_expired_logs_are_deleted(session_factory):
+    add_logs(session_factory, ("info", 10), ("info", 1))
+    engine = LogRetentionEngine(retention={"info": 7 * DAY}, collapse_after=0)
+    asyncio.run(engine.prune(NOW))
+    assert live_messages(session_factory) == ["info 1d"]
+
+
+def test_chunks_append_to_one_segment_per_day_and_level(session_factory, tmp_path, monkeypatch):
+    add_logs(session_factory, *[("info", 10) for _ in range(5)], ("info", 11))
+    archive = LogArchive(str(tmp_path / "archive"), retention={"info": 30 * DAY})
+    saves = []
+    save_index = archive._save_index
+    monkeypatch.setattr(archive, "_save_index", lambda: (saves.append(1), save_index()))
+    # Parça başına 2 satır: aynı güne 3 ekleme
+    engine = LogRetentionEngine(retention={"info": 7 * DAY}, collapse_after=0, chunk_size=2, pause=0,
+                                archive=archive)
+    asyncio.run(engine.prune(NOW))
+
+    assert sorted((segment["day"], segment["rows"]) for segment in archive.segments) == [
+        ("2024-05-21", 1), ("2024-05-22", 5),
+    ]
+    assert len(saves) == 1
+    assert len(list(archive.iter_logs(1))) == 6
+    assert LogArchive(archive.root).segments == archive.segments
+
+
+def test_reconcile_after_interrupted_run(session_factory, tmp_path):
+    add_logs(session_factory, ("info", 10), ("info", 10))
+    root = str(tmp_path / "archive")
+    archive = LogArchive(root, retention={"info": 30 * DAY})
+    engine = LogRetentionEngine(retention={"info": 7 * DAY}, collapse_after=0, chunk_size=1, pause=0,
+                                archive=archive)
+    asyncio.run(engine.prune(NOW))
+    segment = archive.segments[0]
+
+    # İkinci parça eklenirken kesilmiş gibi: index eski, dosyanın sonunda yarım akış
+    path = tmp_path / "archive" / segment["file"]
+    valid_size = path.stat().st_size
+    with open(path, "ab") as f:
+        f.write(b"\x78\x9c\x01\x02")
+    restarted = LogArchive(root, retention={"info": 30 * DAY})
+
+    assert restarted.reconcile() == 1
+    assert path.stat().st_size == valid_size
+    assert restarted.segments[0]["rows"] == 2
+    assert len(list(restarted.iter_logs(1))) == 2
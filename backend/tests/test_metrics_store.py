@@ -0,0 +1,65 @@
+"""Metric queries combine disk and memory; memory is copied before the thread reads files"""
+
+import asyncio
+
+import numpy as np
+
+from app.services.metrics_store import MetricStore
+
+DEVICE_ID = 5
+
+
+def test_query_range_merges_disk_and_pending(tmp_path):
+    async def main():
+        store = MetricStore(str(tmp_path), ring_size=4)
+        for second in range(6):
+            store.record(DEVICE_ID, "cpu_load", float(second), ts=1000.0 + second)
+        await store.flush(force=True)
+        # Halka 4 örnek tutar, aralığın başı diskten gelir, son örnek bellekte bekler
+        store.record(DEVICE_ID, "cpu_load", 6.0, ts=1006.0)
+        return await store.query_range(DEVICE_ID, "cpu_load", start=1000.0)
+
+    tier, ts, values = asyncio.run(main())
+    assert tier == "raw"
+    assert ts.tolist() == [1000.0 + second for second in range(7)]
+    assert values.tolist() == [float(second) for second in range(7)]
+
+
+def test_query_many_snapshots_memory_on_the_loop(tmp_path):
+    async def main():
+        store = MetricStore(str(tmp_path))
+        for device_id in (1, 2):
+            store.record(device_id, "cpu_load", 10.0 * device_id, ts=1000.0)
+        query = asyncio.ensure_future(store.query_many([1, 2], "cpu_load"))
+        await asyncio.sleep(0)
+        # Sorgu başladıktan sonraki kayıtlar thread'deki okumayı etkilemez
+        for device_id in (1, 2):
+            store.record(device_id, "cpu_load", 99.0, ts=1001.0)
+        store.pending.clear()
+        return await query
+
+    series = asyncio.run(main())
+    assert [values.tolist() for _, _, values in series] == [[10.0], [20.0]]
+
+
+def test_rollup_query_includes_open_bucket(tmp_path):
+    async def main():
+        store = MetricStore(str(tmp_path))
+        for second in range(0, 180, 30):
+            store.record(DEVICE_ID, "cpu_load", float(second), ts=60_000.0 + second)
+        return await store.query_range(DEVICE_ID, "cpu_load", step=60, agg="max")
+
+    tier, ts, values = asyncio.run(main())
+    assert tier == "1m"
+    assert np.array_equal(values, [30.0, 90.0, 150.0])
+
+
+def test_list_metrics(tmp_path):
+    async def main():
+        store = MetricStore(str(tmp_path))
+        store.record(DEVICE_ID, "if:ether1/x:rx_bytes", 1.0, ts=1000.0)
+        await store.flush(force=True)
+        store.record(DEVICE_ID, "cpu_load", 1.0, ts=1001.0)
+        return await store.list_metrics(DEVICE_ID)
+
+    assert asyncio.run(main()) == ["cpu_load", "if:ether1/x:rx_bytes"]
@@ -0,0 +1,74 @@
+"""Hot endpoint queries must use an index (EXPLAIN QUERY PLAN)"""
+
+import re
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import select
+
+from app.core.database import Base, create_sqlite_engine
+from app.core.migrations import MIGRATIONS, applied_versions, run_migrations
+from app.models.mikrotik import DeviceCommand, DeviceInterface, DeviceLog, MikrotikDevice
+
+CUTOFF = datetime(2024, 1, 1)
+
+# Endpoint / servis sorgularının aynısı (parametreler örnek değerler)
+HOT_QUERIES = {
+    "GET /devices/{id}/logs": select(DeviceLog).where(DeviceLog.device_id == 1)
+        .order_by(DeviceLog.timestamp.desc()).limit(100),
+    "GET /devices/{id}/logs?level=&from=": select(DeviceLog).where(
+        DeviceLog.device_id == 1, DeviceLog.log_level == "error", DeviceLog.timestamp >= CUTOFF
+    ).order_by(DeviceLog.timestamp.desc()).limit(100),
+    "fleet stats load (recent logs)": select(DeviceLog)
+        .order_by(DeviceLog.timestamp.desc(), DeviceLog.id.desc()).limit(10),
+    "GET /devices?is_online=": select(MikrotikDevice).where(MikrotikDevice.is_online == True)  # noqa: E712
+        .limit(100),
+    "GET /devices?group_name=": select(MikrotikDevice).where(MikrotikDevice.group_name == "default").limit(100),
+    "GET /groups/{id}/metrics": select(MikrotikDevice.id).where(MikrotikDevice.group_id == 1),
+    "GET /devices/{id}/interfaces": select(DeviceInterface).where(DeviceInterface.device_id == 1),
+    "interface sync": select(DeviceInterface.id, DeviceInterface.device_id, DeviceInterface.name)
+        .where(DeviceInterface.device_id.in_([1, 2, 3])),
+    "rate writer": select(DeviceInterface.id).where(
+        DeviceInterface.device_id == 1, DeviceInterface.name == "ether1"
+    ),
+    "log retention chunk": select(DeviceLog.id).where(
+        DeviceLog.log_level == "info", DeviceLog.timestamp < CUTOFF
+    ).limit(2000),
+    "log archive chunk": select(DeviceLog).where(DeviceLog.timestamp < CUTOFF - timedelta(days=2))
+        .order_by(DeviceLog.timestamp, DeviceLog.id).limit(5000),
+    "command history": select(DeviceCommand).where(DeviceCommand.device_id == 1),
+}
+
+# "SCAN device_logs" (eski sürümlerde "SCAN TABLE device_logs"), index'siz
+FULL_SCAN = re.compile(r"^SCAN (TABLE )?(\w+)$")
+USES_INDEX = re.compile(r"USING (COVERING )?INDEX")
+
+
+@pytest.fixture(scope="module")
+def engine(tmp_path_factory):
+    """Scratch database built the way init_db does: models, then migrations"""
+    path = tmp_path_factory.mktemp("query-plans") / "plans.db"
+    engine = create_sqlite_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
+    yield engine
+    engine.dispose()
+
+
+def explain(connection, statement):
+    compiled = statement.compile(dialect=connection.dialect, compile_kwargs={"render_postcompile": True})
+    params = tuple(compiled.params[name] for name in compiled.positiontup)
+    rows = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}", params).all()
+    return [row[-1] for row in rows]
+
+
+def test_all_migrations_applied(engine):
+    assert set(applied_versions(engine)) == {migration.version for migration in MIGRATIONS}
+
+
+@pytest.mark.parametrize("name", list(HOT_QUERIES))
+def test_hot_query_uses_index(engine, name):
+    with engine.connect() as connection:
+        plan = explain(connection, HOT_QUERIES[name])
+    assert not [line for line in plan if FULL_SCAN.match(line)], plan
+    assert any(USES_INDEX.search(line) for line in plan), plan
@@ -0,0 +1,272 @@
+"""RouterOS API protocol tests against a local fake router"""
+
+import asyncio
+import binascii
+import hashlib
+
+import pytest
+
+from app.services.routeros_api import (
+    AsyncRouterOSClient,
+    ConnectionClosedError,
+    FatalError,
+    LoginError,
+    TrapError,
+    decode_length,
+    encode_length,
+    encode_sentence,
+    encode_word,
+    length_prefix_size,
+    read_sentence,
+    read_word,
+)
+
+
+class FakeRouter:
+    """
+    Tek bağlantı kabul eden sahte RouterOS API sunucusu.
+
+    Login'i kendisi cevaplar (legacy_challenge verilirse eski MD5 akışı,
+    login_trap verilirse login'i o mesajla reddeder), sonraki cümleleri
+    script(router) coroutine'i işler. Hiçbir şey göndermeden kapanan
+    bağlantılar (TCP probe) yok sayılır.
+    """
+
+    def __init__(self, script=None, legacy_challenge=None, login_trap=None):
+        self.script = script
+        self.legacy_challenge = legacy_challenge
+        self.login_trap = login_trap
+        self.logins = []
+        self.reader = None
+        self.writer = None
+        self.server = None
+
+    async def __aenter__(self):
+        self.server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self
+
+    async def __aexit__(self, *exc):
+        if self.writer is not None:
+            self.writer.close()
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def connect(self, username="admin", password="secret"):
+        return await AsyncRouterOSClient.connect("127.0.0.1", self.port, username, password, timeout=5)
+
+    async def receive(self):
+        """Next command sentence as (words, tag)"""
+        words = await read_sentence(self.reader)
+        tag = next(word[5:] for word in words if word.startswith(".tag="))
+        return words, tag
+
+    async def send(self, *words):
+        self.writer.write(encode_sentence(list(words)))
+        await self.writer.drain()
+
+    async def _handle(self, reader, writer):
+        try:
+            words = await read_sentence(reader)
+        except asyncio.IncompleteReadError:
+            writer.close()
+            return
+        self.reader, self.writer = reader, writer
+        tag = next(word[5:] for word in words if word.startswith(".tag="))
+        self.logins.append(words)
+        if self.login_trap:
+            await self.send("!trap", f"=message={self.login_trap}", f".tag={tag}")
+            await self.send("!done", f".tag={tag}")
+            return
+        if self.legacy_challenge:
+            await self.send("!done", f"=ret={self.legacy_challenge}", f".tag={tag}")
+            words, tag = await self.receive()
+            self.logins.append(words)
+        await self.send("!done", f".tag={tag}")
+        if self.script is not None:
+            await self.script(self)
+
+
+@pytest.mark.parametrize("length, size", [
+    (0, 1), (0x7F, 1),
+    (0x80, 2), (0x3FFF, 2),
+    (0x4000, 3), (0x1FFFFF, 3),
+    (0x200000, 4), (0xFFFFFFF, 4),
+    (0x10000000, 5), (0xFFFFFFFF, 5),
+])
+def test_length_prefix_boundaries(length, size):
+    prefix = encode_length(length)
+    assert len(prefix) == size
+    assert length_prefix_size(prefix[0]) == size
+    assert decode_length(prefix) == length
+
+
+def test_length_prefix_too_long():
+    with pytest.raises(ValueError):
+        encode_length(0x100000000)
+
+
+@pytest.mark.parametrize("length", [0x7F, 0x80, 0x3FFF, 0x4000, 0x1FFFFF, 0x200000])
+def test_word_round_trip_across_boundaries(length):
+    async def run():
+        reader = asyncio.StreamReader()
+        reader.feed_data(encode_word("x" * length))
+        reader.feed_eof()
+        return await read_word(reader)
+
+    assert asyncio.run(run()) == "x" * length
+
+
+def test_plain_login():
+    async def run():
+        async with FakeRouter() as router:
+            client = await router.connect("admin", "secret")
+            await client.close()
+            return router.logins
+
+    logins = asyncio.run(run())
+    assert len(logins) == 1
+    assert logins[0][:3] == ["/login", "=name=admin", "=password=secret"]
+
+
+def test_legacy_challenge_login():
+    challenge = "0123456789abcdef0123456789abcdef"
+
+    async def run():
+        async with FakeRouter(legacy_challenge=challenge) as router:
+            client = await router.connect("admin", "secret")
+            await client.close()
+            return router.logins
+
+    logins = asyncio.run(run())
+    digest = hashlib.md5(b"\x00" + b"secret" + binascii.unhexlify(challenge)).hexdigest()
+    assert len(logins) == 2
+    assert logins[1][:3] == ["/login", "=name=admin", f"=response=00{digest}"]
+
+
+def test_login_trap_raises_login_error():
+    async def run():
+        async with FakeRouter(login_trap="invalid user name or password (6)") as router:
+            with pytest.raises(LoginError, match="invalid user name or password") as raised:
+                await router.connect("admin", "wrong")
+            return raised.value
+
+    error = asyncio.run(run())
+    # Komut trap'i gibi "cihaz cevap veriyor" sayılmasın
+    assert not isinstance(error, TrapError)
+    assert isinstance(error.__cause__, TrapError)
+
+
+def test_replies_and_done_attributes():
+    async def script(router):
+        words, tag = await router.receive()
+        assert words[0] == "/interface/print"
+        assert "?type=ether" in words
+        await router.send("!re", "=name=ether1", f".tag={tag}")
+        await router.send("!re", "=name=ether2", f".tag={tag}")
+        await router.send("!done", f".tag={tag}")
+
+    async def run():
+        async with FakeRouter(script) as router:
+            client = await router.connect()
+            try:
+                return await client.query("/interface", type="ether")
+            finally:
+                await client.close()
+
+    assert asyncio.run(run()) == [{"name": "ether1"}, {"name": "ether2"}]
+
+
+def test_trap_raises_trap_error():
+    async def script(router):
+        _, tag = await router.receive()
+        await router.send("!trap", "=category=2", "=message=no such command", f".tag={tag}")
+        await router.send("!done", f".tag={tag}")
+        # Bağlantı trap'ten sonra da kullanılabilir
+        _, tag = await router.receive()
+        await router.send("!done", f".tag={tag}")
+
+    async def run():
+        async with FakeRouter(script) as router:
+            client = await router.connect()
+            try:
+                with pytest.raises(TrapError) as trap:
+                    await client.query("/nope")
+                assert await client.query("/system/identity") == []
+                return trap.value
+            finally:
+                await client.close()
+
+    error = asyncio.run(run())
+    assert error.message == "no such command"
+    assert error.category == 2
+
+
+def test_fatal_fails_pending_and_closes():
+    async def script(router):
+        await router.receive()
+        await router.send("!fatal", "session terminated on request")
+
+    async def run():
+        async with FakeRouter(script) as router:
+            client = await router.connect()
+            try:
+                with pytest.raises(FatalError, match="session terminated"):
+                    await client.query("/system/resource")
+                assert client.is_closed
+                with pytest.raises(ConnectionClosedError):
+                    await client.query("/system/resource")
+            finally:
+                await client.close()
+
+    asyncio.run(run())
+
+
+def test_interleaved_tagged_replies():
+    async def script(router):
+        first, first_tag = await router.receive()
+        second, second_tag = await router.receive()
+        tags = {first[0]: first_tag, second[0]: second_tag}
+        resource, interface = tags["/system/resource/print"], tags["/interface/print"]
+        # Cevaplar komut sırasından bağımsız, karışık gelir
+        await router.send("!re", "=name=ether1", f".tag={interface}")
+        await router.send("!re", "=cpu-load=7", f".tag={resource}")
+        await router.send("!re", "=name=ether2", f".tag={interface}")
+        await router.send("!done", f".tag={resource}")
+        await router.send("!done", f".tag={interface}")
+
+    async def run():
+        async with FakeRouter(script) as router:
+            client = await router.connect()
+            try:
+                return await asyncio.gather(client.query("/system/resource"), client.query("/interface"))
+            finally:
+                await client.close()
+
+    resource, interfaces = asyncio.run(run())
+    assert resource == [{"cpu-load": "7"}]
+    assert interfaces == [{"name": "ether1"}, {"name": "ether2"}]
+
+
+def test_connection_drop_mid_sentence():
+    async def script(router):
+        _, tag = await router.receive()
+        await router.send("!re", "=name=ether1", f".tag={tag}")
+        # Yarım cümle: uzunluk öneki 20 bayt diyor, 5 bayt gelip bağlantı kopuyor
+        router.writer.write(encode_word("!re") + encode_length(20) + b"=name")
+        await router.writer.drain()
+        router.writer.close()
+
+    async def run():
+        async with FakeRouter(script) as router:
+            client = await router.connect()
+            try:
+                with pytest.raises(ConnectionClosedError):
+                    await client.query("/interface")
+                assert client.is_closed
+                with pytest.raises(ConnectionClosedError):
+                    await client.query("/interface")
+            finally:
+                await client.close()
+
+    asyncio.run(run())
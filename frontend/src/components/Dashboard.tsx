@@ -21,18 +21,22 @@ import {
 import { LineChart, Line, XAxis, YAxis, CartesianGrid, Tooltip, ResponsiveContainer } from 'recharts';
 import { useWebSocket } from '../hooks/useWebSocket';
 import { mikrotikApi } from '../services/api';
-import { DeviceStats, WebSocketMessage } from '../types/mikrotik';
+import { DeviceStats, WebSocketMessage, WebSocketSubscription } from '../types/mikrotik';
 import { WS_URL } from '../config';
 
+// Özet sadece cihaz durumu değişince yenilenir
+const STATUS_SUBSCRIPTION: WebSocketSubscription = { events: ['status'] };
+
 const Dashboard: React.FC = () => {
   const [stats, setStats] = useState<DeviceStats | null>(null);
   const [loading, setLoading] = useState(true);
 
   const { isConnected } = useWebSocket({
     url: WS_URL,
+    subscription: STATUS_SUBSCRIPTION,
     onMessage: (message: WebSocketMessage) => {
-      if (message.type === 'device_status') {
-        // Update stats when device status changes
+      if (message.type === 'devices_delta' || message.type === 'devices_snapshot') {
+        // Update stats when device status changes (one frame per tick at most)
         fetchStats();
       }
     },
@@ -45,7 +49,8 @@ const Dashboard: React.FC = () => {
     try {
       setLoading(true);
       const response = await mikrotikApi.getStats();
-      setStats(response.data);
+      // Aynı version'da özet değişmemiştir, yeniden çizmeye gerek yok
+      setStats(prev => (prev && prev.version === response.data.version ? prev : response.data));
     } catch (error) {
       console.error('Error fetching stats:', error);
     } finally {
@@ -183,7 +188,7 @@ const Dashboard: React.FC = () => {
             {stats.high_cpu_devices?.length > 0 ? (
               <Box sx={{ maxHeight: 350, overflow: 'auto' }}>
                 {stats.high_cpu_devices.map((device, index) => {
-                  const cpuLoad = parseFloat(device.cpu_load?.replace('%', '') || '0');
+                  const cpuLoad = device.cpu_load_pct ?? parseFloat(device.cpu_load?.replace('%', '') || '0');
                   return (
                     <Box 
                       key={device.id} 
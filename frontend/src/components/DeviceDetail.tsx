@@ -1,4 +1,4 @@
-import React, { useState } from 'react';
+import React, { useMemo, useState } from 'react';
 import { useParams, useNavigate } from 'react-router-dom';
 import {
   Box,
@@ -45,7 +45,9 @@ import {
 import { useQuery, useMutation, useQueryClient } from 'react-query';
 import { useSnackbar } from 'notistack';
 import { mikrotikApi } from '../services/api';
-import { MikrotikDevice } from '../types/mikrotik';
+import { MikrotikDevice, WebSocketMessage, WebSocketSubscription } from '../types/mikrotik';
+import { useWebSocket } from '../hooks/useWebSocket';
+import { WS_URL } from '../config';
 import { formatDistanceToNow } from 'date-fns';
 import { tr } from 'date-fns/locale';
 
@@ -74,8 +76,10 @@ const TabPanel = ({ children, value, index, ...other }: TabPanelProps) => {
 };
 
 // Sistem Bilgileri Component'i
-const SystemInfoTab: React.FC<{ deviceId: number }> = ({ deviceId }) => {
-  const [systemInfo, setSystemInfo] = useState<any>(null);
+// liveInfo: canlı kanaldan gelen son sistem bilgisi, varken HTTP isteği yapılmaz
+const SystemInfoTab: React.FC<{ deviceId: number; liveInfo?: any }> = ({ deviceId, liveInfo }) => {
+  const [fetchedInfo, setFetchedInfo] = useState<any>(null);
+  const systemInfo = liveInfo ?? fetchedInfo;
   const [loading, setLoading] = useState(false);
   const { enqueueSnackbar } = useSnackbar();
 
@@ -83,7 +87,7 @@ const SystemInfoTab: React.FC<{ deviceId: number }> = ({ deviceId }) => {
     try {
       setLoading(true);
       const response = await mikrotikApi.getDeviceSystemInfo(deviceId);
-      setSystemInfo(response.data.system_info);
+      setFetchedInfo(response.data.system_info);
     } catch (error) {
       console.error('System info error:', error);
       enqueueSnackbar('Sistem bilgileri alınırken hata oluştu', { variant: 'error' });
@@ -93,8 +97,12 @@ const SystemInfoTab: React.FC<{ deviceId: number }> = ({ deviceId }) => {
   };
 
   React.useEffect(() => {
-    fetchSystemInfo();
-  }, [deviceId, fetchSystemInfo]);
+    // Canlı kanal bağlı değilse bir kez getir
+    if (!liveInfo) {
+      fetchSystemInfo();
+    }
+    // eslint-disable-next-line react-hooks/exhaustive-deps
+  }, [deviceId]);
 
   const formatBytes = (bytes: number | string) => {
     if (bytes === 'N/A' || !bytes) return 'N/A';
@@ -112,7 +120,7 @@ const SystemInfoTab: React.FC<{ deviceId: number }> = ({ deviceId }) => {
     return `${numFreq} MHz`;
   };
 
-  if (loading) {
+  if (loading && !systemInfo) {
     return (
       <Box display="flex" justifyContent="center" alignItems="center" minHeight="300px">
         <CircularProgress />
@@ -218,6 +226,44 @@ export const DeviceDetail: React.FC = () => {
   const queryClient = useQueryClient();
 
   const deviceId = parseInt(id || '0', 10);
+  const [liveInfo, setLiveInfo] = useState<any>(null);
+
+  // Sunucu bu cihaz için tek bir canlı toplayıcı çalıştırır ve sonucu
+  // izleyen herkese iter; sayfa periyodik HTTP isteği yapmaz
+  const subscription = useMemo<WebSocketSubscription>(
+    () => ({ devices: [deviceId], events: ['status', 'live', 'logs'] }),
+    [deviceId]
+  );
+
+  useWebSocket({
+    url: WS_URL,
+    subscription,
+    onMessage: (message: WebSocketMessage) => {
+      if (message.type === 'device_live' && message.device_id === deviceId) {
+        if (message.system_info) {
+          setLiveInfo(message.system_info);
+        }
+        if (message.interfaces) {
+          queryClient.setQueryData(['interfaces', deviceId], message.interfaces);
+        }
+      } else if (message.type === 'devices_delta' || message.type === 'devices_snapshot') {
+        const changes = message.devices?.[deviceId];
+        if (changes) {
+          queryClient.setQueryData(['device', deviceId], (old: any) =>
+            old ? { ...old, data: { ...old.data, ...changes } } : old
+          );
+        }
+      } else if (message.type === 'device_logs') {
+        const newLogs: any[] = (message.devices as any)?.[deviceId] || [];
+        if (newLogs.length) {
+          queryClient.setQueryData(['logs', deviceId], (old: any[] = []) => {
+            const known = new Set(old.map(log => log.id));
+            return [...newLogs.filter(log => !known.has(log.id)).reverse(), ...old].slice(0, 100);
+          });
+        }
+      }
+    },
+  });
 
   const { data: deviceResponse, isLoading: deviceLoading } = useQuery(
     ['device', deviceId],
@@ -274,7 +320,9 @@ export const DeviceDetail: React.FC = () => {
     () => mikrotikApi.getDeviceInterfaces(deviceId).then(res => res.data),
     {
       enabled: !!deviceId,
-      refetchInterval: 10000,
+      // İlk yükleme; sonrası canlı kanaldan gelir
+      refetchOnWindowFocus: false,
+      staleTime: Infinity,
     }
   );
 
@@ -283,7 +331,9 @@ export const DeviceDetail: React.FC = () => {
     () => mikrotikApi.getDeviceLogs(deviceId).then(res => res.data),
     {
       enabled: !!deviceId,
-      refetchInterval: 5000,
+      // Yeni loglar device_logs mesajlarıyla eklenir
+      refetchOnWindowFocus: false,
+      staleTime: Infinity,
     }
   );
 
@@ -469,7 +519,7 @@ export const DeviceDetail: React.FC = () => {
                 </TableHead>
                 <TableBody>
                   {interfaces.map((iface: any) => (
-                    <TableRow key={iface.id}>
+                    <TableRow key={iface.id ?? iface.name}>
                       <TableCell>{iface.name}</TableCell>
                       <TableCell>{iface.type}</TableCell>
                       <TableCell>{iface.status}</TableCell>
@@ -508,7 +558,7 @@ export const DeviceDetail: React.FC = () => {
         </TabPanel>
 
         <TabPanel value={tabValue} index={2}>
-          <SystemInfoTab deviceId={deviceId} />
+          <SystemInfoTab deviceId={deviceId} liveInfo={liveInfo} />
         </TabPanel>
 
         <TabPanel value={tabValue} index={3}>
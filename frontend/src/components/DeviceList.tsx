@@ -37,10 +37,13 @@ import { DataGrid, GridColDef, GridActionsCellItem } from '@mui/x-data-grid';
 import { useQuery, useMutation, useQueryClient } from 'react-query';
 import { useSnackbar } from 'notistack';
 import { mikrotikApi } from '../services/api';
-import { MikrotikDevice, DeviceFilters } from '../types/mikrotik';
+import { MikrotikDevice, DeviceFilters, WebSocketMessage, WebSocketSubscription } from '../types/mikrotik';
 import { useWebSocket } from '../hooks/useWebSocket';
 import { WS_URL } from '../config';
 
+// Liste sadece cihaz durumunu kullanır; metrik/arayüz/log akışı gelmez
+const STATUS_SUBSCRIPTION: WebSocketSubscription = { events: ['status'] };
+
 
 export const DeviceList: React.FC = () => {
   const [filters, setFilters] = useState<DeviceFilters>({
@@ -79,12 +82,33 @@ export const DeviceList: React.FC = () => {
   const { enqueueSnackbar } = useSnackbar();
   const queryClient = useQueryClient();
 
+  // Cihaz akışını listeye uygula, /devices'ı yeniden çekme.
+  // Listede olmayan yeni bir cihaz (ip_address ile tam gelir) varsa liste bir kez yeniden çekilir.
+  const applyDeviceFrame = (message: WebSocketMessage) => {
+    const current = queryClient.getQueryData<MikrotikDevice[]>(['devices']);
+    if (!current) return;
+    const changes = message.devices || {};
+    const removed = new Set(message.removed || []);
+    const isSnapshot = message.type === 'devices_snapshot';
+    const known = new Set(current.map((device) => device.id));
+    const added = Object.entries(changes).some(
+      ([id, fields]) => !known.has(Number(id)) && fields.ip_address !== undefined
+    );
+    queryClient.setQueryData<MikrotikDevice[]>(['devices'], current
+      .filter((device) => !removed.has(device.id) && (!isSnapshot || changes[device.id]))
+      .map((device) => (changes[device.id] ? { ...device, ...changes[device.id] } : device))
+    );
+    if (added) {
+      queryClient.invalidateQueries(['devices']);
+    }
+  };
+
   const { isConnected } = useWebSocket({
     url: WS_URL,
-    onMessage: (message: any) => {
-      if (message.type === 'device_status') {
-        // Refresh devices when status changes
-        queryClient.invalidateQueries(['devices']);
+    subscription: STATUS_SUBSCRIPTION,
+    onMessage: (message: WebSocketMessage) => {
+      if (message.type === 'devices_delta' || message.type === 'devices_snapshot') {
+        applyDeviceFrame(message);
       }
     },
     onError: (error) => {
@@ -96,8 +120,8 @@ export const DeviceList: React.FC = () => {
     ['devices'],
     () => mikrotikApi.getDevices().then(res => res.data),
     {
+      // Periyodik yenileme yok, WebSocket snapshot + delta'larıyla güncel kalır
       refetchOnWindowFocus: false,
-      refetchInterval: 30000,
     }
   );
 
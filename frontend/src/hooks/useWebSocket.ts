@@ -1,12 +1,18 @@
 import { useCallback, useEffect, useRef, useState } from 'react';
+import { WebSocketSubscription } from '../types/mikrotik';
 
 interface WebSocketMessage {
   type: string;
   data?: any;
+  epoch?: string;
+  seq?: number;
+  prev_seq?: number;
 }
 
 interface UseWebSocketProps {
   url: string;
+  // Sunucu sadece bu cihaz/grup/olay tiplerini gönderir
+  subscription?: WebSocketSubscription;
   onMessage?: (message: WebSocketMessage) => void;
   onError?: (error: Event) => void;
   onOpen?: () => void;
@@ -15,6 +21,7 @@ interface UseWebSocketProps {
 
 export const useWebSocket = ({
   url,
+  subscription,
   onMessage,
   onError,
   onOpen,
@@ -25,8 +32,55 @@ export const useWebSocket = ({
   const wsRef = useRef<WebSocket | null>(null);
   const reconnectTimeoutRef = useRef<NodeJS.Timeout | null>(null);
   const pingIntervalRef = useRef<NodeJS.Timeout | null>(null);
+  // Cihaz akışında son uygulanan frame; yeniden bağlanınca kaldığı yerden devam eder
+  const epochRef = useRef<string | null>(null);
+  const seqRef = useRef<number | null>(null);
+  const resyncingRef = useRef(false);
+  const subscriptionRef = useRef(subscription);
+  subscriptionRef.current = subscription;
+  const subscriptionKey = JSON.stringify(subscription ?? {});
   const maxReconnectAttempts = 5;
 
+  const subscribe = useCallback(() => {
+    if (wsRef.current?.readyState === WebSocket.OPEN) {
+      wsRef.current.send(JSON.stringify({
+        type: 'subscribe',
+        ...subscriptionRef.current,
+        last_seq: seqRef.current,
+        epoch: epochRef.current,
+      }));
+    }
+  }, []);
+
+  // false: frame zinciri koptu, kaçırılanlar istendi, bu frame uygulanmaz
+  const acceptFrame = useCallback((message: WebSocketMessage) => {
+    if (message.type === 'devices_snapshot') {
+      epochRef.current = message.epoch ?? null;
+      seqRef.current = message.seq ?? null;
+      resyncingRef.current = false;
+      return true;
+    }
+    // Sunucu frame'i aboneliğe göre süzer; prev_seq bu aboneliğe giden son
+    // frame'dir, arada atlanan seq'ler bizi ilgilendirmeyen değişikliklerdir
+    if (
+      message.epoch === epochRef.current &&
+      seqRef.current !== null &&
+      message.prev_seq !== undefined &&
+      message.seq !== undefined &&
+      message.prev_seq <= seqRef.current &&
+      message.seq > seqRef.current
+    ) {
+      seqRef.current = message.seq ?? null;
+      resyncingRef.current = false;
+      return true;
+    }
+    if (!resyncingRef.current) {
+      resyncingRef.current = true;
+      subscribe();
+    }
+    return false;
+  }, [subscribe]);
+
   const startPing = useCallback(() => {
     if (pingIntervalRef.current) {
       clearInterval(pingIntervalRef.current);
@@ -61,11 +115,9 @@ export const useWebSocket = ({
         setReconnectAttempts(0);
         
         // Send subscribe message immediately after connection
-        if (wsRef.current?.readyState === WebSocket.OPEN) {
-          wsRef.current.send(JSON.stringify({ 
-            type: 'subscribe' 
-          }));
-        }
+        // (snapshot the first time, only the missed deltas after a reconnect)
+        resyncingRef.current = true;
+        subscribe();
         
         // Start ping to keep connection alive
         startPing();
@@ -80,6 +132,9 @@ export const useWebSocket = ({
           if (message.type === 'pong') {
             return;
           }
+          if ((message.type === 'devices_delta' || message.type === 'devices_snapshot') && !acceptFrame(message)) {
+            return;
+          }
           onMessage?.(message);
         } catch (error) {
           console.error('Error parsing WebSocket message:', error);
@@ -117,7 +172,7 @@ export const useWebSocket = ({
     } catch (error) {
       console.error('Failed to create WebSocket connection:', error);
     }
-  }, [url, onMessage, onError, onOpen, onClose, reconnectAttempts, maxReconnectAttempts, startPing, stopPing]);
+  }, [url, onMessage, onError, onOpen, onClose, reconnectAttempts, maxReconnectAttempts, startPing, stopPing, subscribe, acceptFrame]);
 
   const disconnect = useCallback(() => {
     if (reconnectTimeoutRef.current) {
@@ -150,6 +205,16 @@ export const useWebSocket = ({
     // eslint-disable-next-line react-hooks/exhaustive-deps
   }, [url]);
 
+  useEffect(() => {
+    // Abonelik değişti: eski seq yeni cihaz kümesini kapsamaz, snapshot iste
+    if (wsRef.current?.readyState === WebSocket.OPEN) {
+      epochRef.current = null;
+      seqRef.current = null;
+      resyncingRef.current = true;
+      subscribe();
+    }
+  }, [subscriptionKey, subscribe]);
+
   const sendMessage = useCallback((message: any) => {
     if (wsRef.current?.readyState === WebSocket.OPEN) {
       wsRef.current.send(JSON.stringify(message));
@@ -18,6 +18,7 @@ export interface MikrotikDevice {
   connection_attempts: number;
   last_error?: string;
   cpu_load?: string;
+  cpu_load_pct?: number | null;
   uptime?: string;
   created_at: string;
   updated_at: string;
@@ -53,6 +54,7 @@ export interface MikrotikDeviceUpdate {
 export interface DeviceInterface {
   id: number;
   device_id: number;
+  ros_id?: string | null;
   name: string;
   type?: string;
   mac_address?: string;
@@ -62,6 +64,10 @@ export interface DeviceInterface {
   tx_bytes: number;
   rx_packets: number;
   tx_packets: number;
+  rx_bps?: number | null;
+  tx_bps?: number | null;
+  rx_pps?: number | null;
+  tx_pps?: number | null;
   last_updated: string;
 }
 
@@ -73,6 +79,7 @@ export interface DeviceLog {
   command?: string;
   response?: any;
   timestamp: string;
+  repeat_count?: number;
 }
 
 export interface DeviceCommand {
@@ -119,12 +126,14 @@ export interface HighCpuDevice {
   name: string;
   ip_address: string;
   cpu_load: string;
+  cpu_load_pct?: number | null;
   group_name: string;
   is_online: boolean;
   last_seen?: string;
 }
 
 export interface DeviceStats {
+  version: number;
   total_devices: number;
   online_devices: number;
   offline_devices: number;
@@ -133,14 +142,35 @@ export interface DeviceStats {
   high_cpu_devices: HighCpuDevice[];
 }
 
+// devices_delta frame'inde bir cihazın sadece değişen alanları (snapshot'ta hepsi)
+export type DeviceDelta = Partial<Pick<
+  MikrotikDevice,
+  'name' | 'ip_address' | 'group_name' | 'location' | 'router_board' | 'version' |
+  'is_online' | 'last_seen' | 'last_error' | 'cpu_load' | 'uptime'
+>>;
+
+// Boş bırakılan alan "hepsi" demektir (bütün filo, bütün olay tipleri)
+export interface WebSocketSubscription {
+  devices?: number[];
+  groups?: (number | string)[];
+  events?: ('status' | 'metrics' | 'interfaces' | 'logs' | 'live')[];
+}
+
 export interface WebSocketMessage {
   type: string;
+  epoch?: string;
+  prev_seq?: number;
+  seq?: number;
+  timestamp?: number;
+  devices?: { [deviceId: string]: DeviceDelta };
+  removed?: number[];
+  message?: string;
+  // device_live: izlenen cihazın paylaşılan toplayıcısından gelen son durum
   device_id?: number;
-  name?: string;
   is_online?: boolean;
-  last_seen?: string;
-  last_error?: string;
-  message?: string;
+  last_error?: string | null;
+  system_info?: any;
+  interfaces?: any[];
 }
 
 export interface DeviceFilters {